@@ -13,6 +13,11 @@ import heapq, itertools
 import operator
 import sys
 
+def sorted_regs(regs):
+    """ Sort registers by type and index. The order of a set of registers
+    depends on their memory addresses and thus changes between runs. """
+    return sorted(regs, key=lambda reg: (reg.reg_type, reg.i))
+
 
 class StraightlineAllocator:
     """Allocate variables in a straightline program using n registers.
@@ -67,7 +72,7 @@ class StraightlineAllocator:
     def process(self, program, alloc_pool):
         for k,i in enumerate(reversed(program)):
             unused_regs = []
-            for j in i.get_def():
+            for j in sorted_regs(i.get_def()):
                 if j.vectorbase in self.alloc:
                     if j in self.defined:
                         raise CompilerError("Double write on register %s " \
@@ -82,9 +87,9 @@ class StraightlineAllocator:
                 print "Register(s) %s never used, assigned by '%s' in %s" % \
                     (unused_regs,i,format_trace(i.caller))
 
-            for j in i.get_used():
+            for j in sorted_regs(i.get_used()):
                 self.alloc_reg(j, alloc_pool)
-            for j in i.get_def():
+            for j in sorted_regs(i.get_def()):
                 self.dealloc_reg(j, i, alloc_pool)
 
             if k % 1000000 == 0 and k > 0:
@@ -150,11 +155,52 @@ def determine_scope(block, options):
     block.used_from_scope = used_from_scope
     block.defined_registers = set(last_def.iterkeys())
 
+def merge_instructions(instructions, n, i):
+    """ Merge the arguments of instruction i into instruction n, removing i """
+    def expand_vector_args(inst):
+        new_args = []
+        for arg in inst.args:
+            if inst.is_vec():
+                arg.create_vector_elements()
+                for reg in arg:
+                    new_args.append(reg)
+            else:
+                new_args.append(arg)
+        return new_args
+
+    if isinstance(instructions[n], startinput_class):
+        instructions[n].args[1] += instructions[i].args[1]
+    elif isinstance(instructions[n], (stopinput, gstopinput)):
+        if instructions[n].get_size() != instructions[i].get_size():
+            raise NotImplemented()
+        else:
+            instructions[n].args += instructions[i].args[1:]
+    else:
+        if instructions[n].get_size() != instructions[i].get_size():
+            # merge as non-vector instruction
+            instructions[n].args = expand_vector_args(instructions[n]) + \
+                expand_vector_args(instructions[i])
+            if instructions[n].is_vec():
+                instructions[n].size = 1
+        else:
+            instructions[n].args += instructions[i].args
+
+    # join arg_formats if not special iterators
+    # if not isinstance(instructions[n].arg_format, (itertools.repeat, itertools.cycle)) and \
+    #     not isinstance(instructions[i].arg_format, (itertools.repeat, itertools.cycle)):
+    #     instructions[n].arg_format += instructions[i].arg_format
+    instructions[i] = None
+
 class Merger:
+    # SparseDiGraph has the same interface
+    graph_class = Compiler.graph.ArrayDiGraph
+
     def __init__(self, block, options):
         self.block = block
         self.instructions = block.instructions
         self.options = options
+        # pairs (n, i) of instructions merged by do_merge in this order
+        self.merged = []
         if options.max_parallel_open:
             self.max_parallel_open = int(options.max_parallel_open)
         else:
@@ -171,40 +217,9 @@ class Merger:
         except StopIteration:
             return mergecount, None
 
-        def expand_vector_args(inst):
-            new_args = []
-            for arg in inst.args:
-                if inst.is_vec():
-                    arg.create_vector_elements()
-                    for reg in arg:
-                        new_args.append(reg)
-                else:
-                    new_args.append(arg)
-            return new_args
-
         for i in merges_iter:
-            if isinstance(instructions[n], startinput_class):
-                instructions[n].args[1] += instructions[i].args[1]
-            elif isinstance(instructions[n], (stopinput, gstopinput)):
-                if instructions[n].get_size() != instructions[i].get_size():
-                    raise NotImplemented()
-                else:
-                    instructions[n].args += instructions[i].args[1:]
-            else:
-                if instructions[n].get_size() != instructions[i].get_size():
-                    # merge as non-vector instruction
-                    instructions[n].args = expand_vector_args(instructions[n]) + \
-                        expand_vector_args(instructions[i])
-                    if instructions[n].is_vec():
-                        instructions[n].size = 1
-                else:
-                    instructions[n].args += instructions[i].args
-                
-            # join arg_formats if not special iterators
-            # if not isinstance(instructions[n].arg_format, (itertools.repeat, itertools.cycle)) and \
-            #     not isinstance(instructions[i].arg_format, (itertools.repeat, itertools.cycle)):
-            #     instructions[n].arg_format += instructions[i].arg_format
-            instructions[i] = None
+            merge_instructions(instructions, n, i)
+            self.merged.append((n, i))
             self.merge_nodes(n, i)
             mergecount += 1
 
@@ -433,7 +448,7 @@ class Merger:
                                 triple='green', square='green', bit='green',\
                                 asm_input='lightgreen')
 
-        G = Compiler.graph.SparseDiGraph(len(block.instructions))
+        G = self.graph_class(len(block.instructions))
         self.G = G
 
         reg_nodes = {}
@@ -555,7 +570,7 @@ class Merger:
                 startopen = last_open.popleft()
                 add_edge(startopen, n)
                 G.set_attr(startopen, 'stop', n)
-                G.set_attr(n, 'start', last_open)
+                G.set_attr(n, 'start', startopen)
                 G.add_node(n, merges=[])
 
             if isinstance(instr, ReadMemoryInstruction):
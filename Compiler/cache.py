@@ -0,0 +1,248 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Compilation cache, enabled with ``compile.py --cache``.
+
+The cache lives in ``Programs/Cache`` and works on two levels:
+
+* :class:`ProgramCache` stores the files written by a whole compilation, i.e. the
+  bytecode, schedule and public input as well as private inputs written at compile time.
+  It is found by the hash of the source, the arguments and the options. It is only used
+  if none of the files read during the compilation changed, including the sources of all
+  imported modules, e.g. of the compiler, the recommender and ``config_mine``.
+  Compilations that seed a random generator from the operating system, e.g. with
+  ``random.seed()``, are not cached because another compilation would give another output.
+* :func:`load_tape` and :func:`save_tape` store the bytecode of single optimized tapes
+  under the hash of the tape before optimization (see :func:`tape_key`).
+  When a program changed, the tapes that are still the same, e.g. the threads
+  of unchanged functions, are not optimized again.
+"""
+
+import __builtin__
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+
+# options that do not change the output of the compiler
+IGNORED_OPTIONS = ('profile', 'jobs', 'cache', 'emulate')
+# options that do not change the bytecode of a tape
+IGNORED_TAPE_OPTIONS = IGNORED_OPTIONS + ('outfile', 'asmoutfile')
+
+# the ProgramCache that tracks the files opened by the compilation
+tracker = None
+
+def file_hash(filename):
+    """ The SHA-1 hash of a file or ``None`` if it doesn't exist. """
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except IOError:
+        return None
+
+def options_repr(options, ignored=IGNORED_OPTIONS):
+    return repr(sorted((k, v) for k, v in vars(options).items() if k not in ignored))
+
+_compiler_hash = []
+
+def compiler_hash():
+    """ The hash of all modules of the compiler. """
+    if not _compiler_hash:
+        h = hashlib.sha1(sys.version)
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.py'):
+                h.update(filename)
+                h.update(file_hash(os.path.join(directory, filename)))
+        _compiler_hash.append(h.hexdigest())
+    return _compiler_hash[0]
+
+def add_input(filename):
+    """ Depend on a file that is not opened by Python, e.g. only checked with ``os.stat``. """
+    if tracker is not None:
+        tracker.inputs.add(filename)
+
+def add_output(filename):
+    """ Cache a file written outside of Python, e.g. by a subprocess. """
+    if tracker is not None:
+        tracker.add_output(filename)
+
+def tape_key(tape, options):
+    """
+    The hash of a tape before optimization. It covers the instructions, the structure
+    of the basic blocks, the offline data requirements and the options.
+    Names of tapes and blocks are ignored because they contain ids of Python objects.
+    """
+    Register = tape.Register
+    index = lambda block: -1 if block is None else block.index
+    h = hashlib.sha1(compiler_hash())
+    h.update(options_repr(options, IGNORED_TAPE_OPTIONS))
+    h.update(repr((tape.merge_opens, sorted(tape.req_tree.aggregate().items()),
+                   sorted(tape.req_bit_length.items()))))
+    for block in tape.basicblocks:
+        h.update(repr((index(block.scope), index(block.exit_block),
+                       index(block.previous_block), index(getattr(block, 'sub_block', None)),
+                       str(block.exit_condition))))
+        for instruction in block.instructions:
+            h.update(str(instruction))
+            for arg in instruction.args:
+                if isinstance(arg, Register):
+                    h.update('%d%d' % (arg.can_eliminate, bool(arg.vector)))
+            h.update('\n')
+    return h.hexdigest()
+
+def _tape_filename(programs_dir, key):
+    return os.path.join(programs_dir, 'Cache', 'tapes', key + '.bc')
+
+def load_tape(programs_dir, key):
+    """ The cached bytecode of a tape or ``None``. """
+    filename = _tape_filename(programs_dir, key)
+    if os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+def save_tape(programs_dir, key, data):
+    _write_file(_tape_filename(programs_dir, key), data)
+
+def _write_file(filename, data):
+    """ Write a file atomically, so concurrent compilations never see a partial file. """
+    directory = os.path.dirname(filename)
+    if not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    tmp = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.rename(tmp, filename)
+
+
+class ProgramCache(object):
+    """
+    Cache of a whole compilation.
+
+    :param programs_dir: the ``Programs`` directory
+    :param args: the arguments of ``compile.py``, starting with the program
+    :param options: the options of ``compile.py``
+    """
+    def __init__(self, programs_dir, args, options):
+        progname = args[0].split('/')[-1]
+        if progname.endswith('.mpc'):
+            progname = progname[:-4]
+        source = programs_dir + '/Source/' + progname + '.mpc'
+        h = hashlib.sha1(sys.version)
+        h.update(repr(args))
+        h.update(options_repr(options))
+        h.update(os.path.abspath(source))
+        h.update(file_hash(source) or '')
+        self.key = h.hexdigest()
+        self.name = progname
+        self.cache_dir = os.path.join(os.path.abspath(programs_dir), 'Cache', '')
+        self.directory = os.path.join(programs_dir, 'Cache', 'programs', self.key)
+        self.inputs = set()
+        self.outputs = []
+        self.files = []
+        self.unseeded = False
+        self._open = None
+        self._urandom = None
+
+    def restore(self):
+        """
+        Restore the output of a previous compilation if none of its input changed.
+        Returns ``True`` on success.
+        """
+        try:
+            with open(os.path.join(self.directory, 'manifest')) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            return False
+        for filename, digest in manifest['inputs']:
+            if file_hash(filename) != digest:
+                print 'Compilation cache of %s is outdated by %s' % (self.name, filename)
+                return False
+        for i, filename in enumerate(manifest['outputs']):
+            directory = os.path.dirname(filename)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            shutil.copyfile(os.path.join(self.directory, str(i)), filename)
+            print 'Restored', filename
+        print 'Using cached compilation of %s from %s' % (self.name, self.directory)
+        return True
+
+    def track(self):
+        """
+        Record the files opened by the compilation until :meth:`save`, and whether random
+        generators are seeded from the operating system.
+        """
+        global tracker
+        tracker = self
+        self._open = __builtin__.open
+        __builtin__.open = self.open
+        self._urandom = os.urandom
+        os.urandom = random._urandom = self.urandom
+
+    def urandom(self, n):
+        self.unseeded = True
+        return self._urandom(n)
+
+    def open(self, name, mode='r', *args):
+        f = self._open(name, mode, *args)
+        if set(mode) & set('wa+'):
+            self.add_output(name)
+            self.files.append(f)
+        else:
+            self.inputs.add(name)
+        return f
+
+    def add_output(self, filename):
+        if filename not in self.outputs:
+            self.outputs.append(filename)
+
+    def _modules(self):
+        """
+        The source files of all loaded modules, wherever they were found on the path.
+        Compiled extension modules are left out.
+        """
+        for module in sys.modules.values():
+            filename = getattr(module, '__file__', None)
+            if filename is None:
+                continue
+            filename = os.path.abspath(filename)
+            if filename.endswith(('.pyc', '.pyo')) and os.path.exists(filename[:-1]):
+                filename = filename[:-1]
+            if filename.endswith(('.py', '.pyc', '.pyo')):
+                yield filename
+
+    def save(self):
+        """ Store the files written by the compilation. """
+        global tracker
+        __builtin__.open = self._open
+        os.urandom = random._urandom = self._urandom
+        tracker = None
+        if self.unseeded:
+            print 'Not caching the compilation of %s because it uses a random seed' % self.name
+            return
+        for f in self.files:
+            if not f.closed:
+                f.flush()
+        # cached tapes are read and written by the compilation as well
+        cached = lambda filename: os.path.abspath(filename).startswith(self.cache_dir)
+        outputs = [filename for filename in self.outputs
+                   if os.path.exists(filename) and not cached(filename)]
+        inputs = set(os.path.abspath(filename) for filename in self.inputs)
+        inputs.update(self._modules())
+        inputs -= set(os.path.abspath(filename) for filename in outputs)
+        inputs = [filename for filename in inputs if not cached(filename)]
+        for i, filename in enumerate(outputs):
+            with open(filename, 'rb') as f:
+                _write_file(os.path.join(self.directory, str(i)), f.read())
+        manifest = {'inputs': sorted((filename, file_hash(filename)) for filename in inputs),
+                    'outputs': outputs}
+        _write_file(os.path.join(self.directory, 'manifest'), json.dumps(manifest, indent=1))
+        print 'Saved compilation of %s in %s' % (self.name, self.directory)
@@ -68,10 +68,11 @@ def divide_by_two(res, x):
     """ Faster clear division by two using a cached value of 2^-1 mod p """
     from program import Program
     import types
-    block = Program.prog.curr_block
-    if len(inverse_of_two) == 0 or block not in inverse_of_two:
-        inverse_of_two[block] = types.cint(1) / 2
-    mulc(res, x, inverse_of_two[block])
+    # blocks can mix vector sizes
+    key = Program.prog.curr_block, x.size
+    if len(inverse_of_two) == 0 or key not in inverse_of_two:
+        inverse_of_two[key] = types.cint(1) / 2
+    mulc(res, x, inverse_of_two[key])
 
 def LTZ(s, a, k, kappa):
     """
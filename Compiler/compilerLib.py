@@ -10,7 +10,7 @@ import time
 import sys
 
 
-def run(args, options, param=-1, merge_opens=True, emulate=True, \
+def run(args, options, param=-1, merge_opens=True, \
             reallocate=True, assemblymode=False, debug=False):
     """ Compile a file and output a Program object.
     
@@ -22,7 +22,6 @@ def run(args, options, param=-1, merge_opens=True, emulate=True, \
     instructions_base.program = prog
     types.program = prog
     comparison.program = prog
-    prog.EMULATE = emulate
     prog.DEBUG = debug
     VARS['program'] = prog
     comparison.set_variant(options)
@@ -48,7 +47,7 @@ def run(args, options, param=-1, merge_opens=True, emulate=True, \
         print 'instructions count', instructions_base.Instruction.count
         instructions_base.Instruction.count = 0
     prog.FIRST_PASS = False
-    prog.reset_values()
+    random.seed(0)
     # make compiler modules directly accessible
     sys.path.insert(0, 'Compiler')
     # create the tapes
@@ -58,15 +57,6 @@ def run(args, options, param=-1, merge_opens=True, emulate=True, \
     for tape in prog.tapes:
         tape.optimize(options)
     
-    # check program still does the same thing after optimizations
-    if emulate:
-        clearmem = list(prog.mem_c)
-        sharedmem = list(prog.mem_s)
-        prog.emulate()
-        if prog.mem_c != clearmem or prog.mem_s != sharedmem:
-            print 'Warning: emulated memory values changed after compiler optimization'
-        #    raise CompilerError('Compiler optimization caused incorrect memory write.')
-    
     if prog.main_thread_running:
         prog.update_req(prog.curr_tape)
     print 'Program requires:', repr(prog.req_num)
@@ -0,0 +1,926 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Emulator for compiled programs, enabled with ``compile.py --emulate``.
+
+The emulator runs the bytecode and schedule written by the compiler locally and without
+players. Secret registers hold the secret values in the clear, so opening is a copy and
+the preprocessing data is random but consistent, e.g. :math:`c = ab` for triples.
+
+Every instruction is decoded once and compiled into a Python function. The functions
+of a tape run with a program counter that follows the jumps of the basic blocks and
+starts other tapes with ``run_tape``. Vector instructions, i.e. instructions with
+``get_size() > 1``, are executed in bulk on slices of NumPy object arrays.
+
+It prints the output of the program like player 0 and reports the executed
+instructions, opens and preprocessing data, which estimates the cost of the
+program in the runtime. Differences to the runtime:
+
+* Threads run one after the other: ``run_tape`` runs the tape to the end and
+  ``join_tape`` does nothing.
+* Clear integers are not truncated to 64 bits.
+* The private input is read from ``Player-Data/Private-Input-<player>`` and the input of
+  ``input`` from the standard input. Shares in ``Persistence/Transactions-P<player>.data``
+  are added up. The emulator writes no files, shares written to file are kept in memory.
+* Private output is not written and communication with external clients is not supported.
+"""
+
+import binascii
+import itertools
+import os
+import random
+import struct
+import sys
+import time
+
+import numpy
+
+from Compiler.config import P_VALUES
+from Compiler.exceptions import *
+from Compiler import instructions
+from Compiler.instructions_base import Instruction, opcodes, format_str_is_reg
+from Compiler.program import Tape, get_programs_dir, get_program_name
+
+class EmulationError(CompilerError):
+    pass
+
+# reduction polynomials x^n + x^t1 (+ x^t2 + x^t3) + 1 of GF(2^n) in the runtime,
+# see Math/gf2n.cpp and Math/gf2nlong.cpp
+GF2N_FIELDS = {4: (1,), 8: (4, 3, 1), 28: (1,), 40: (20, 15, 10), 128: (7, 2, 1)}
+
+FIELDS = {'c': 'modp', 's': 'modp', 'cg': 'gf2n', 'sg': 'gf2n', 'ci': 'int'}
+
+# instructions by operation on their arguments
+UNARY = dict(MOVC='mov', MOVS='mov', MOVINT='mov', LEGENDREC='legendre', CONVINT='conv',
+             GCONVGF2N='mov', EQZC='eqz', LTZC='ltz', GNOTC='not')
+BINARY = dict(ADDC='add', ADDS='add', ADDM='add', SUBC='sub', SUBS='sub', SUBML='sub',
+              SUBMR='sub', MULC='mul', MULM='mul', DIVC='div', MODC='mod', ANDC='and',
+              XORC='xor', ORC='or', SHLC='shl', SHRC='shr', GMULBITC='mulbit',
+              GMULBITM='mulbit', ADDINT='add', SUBINT='sub', MULINT='mul', DIVINT='div',
+              LTC='lt', GTC='gt', EQC='eq')
+IMMEDIATE = dict(ADDCI='add', ADDSI='add', SUBCI='sub', SUBSI='sub', SUBCFI='rsub',
+                 SUBSFI='rsub', MULCI='mul', MULSI='mul', DIVCI='div', MODCI='mod',
+                 ANDCI='and', XORCI='xor', ORCI='or', SHLCI='shl', SHRCI='shr', NOTC='not',
+                 CONVMODP='signed')
+CONSTANT = ('LDI', 'LDSI', 'LDINT')
+# preprocessing data by instruction, generated from the random values of the first arguments
+DATA = dict(TRIPLE='triple', SQUARE='square', BIT='bit', INV='inverse',
+            GBITTRIPLE='bittriple', GBITGF2NTRIPLE='bitgf2ntriple')
+# instructions executed in bulk if vectorized, the others are executed element by element
+BULK = ('LDMC', 'LDMS', 'LDMINT', 'STMC', 'STMS', 'STMINT', 'LDMCI', 'LDMSI', 'LDMINTI',
+        'STMCI', 'STMSI', 'STMINTI', 'STARTOPEN', 'STOPOPEN', 'STARTPRIVATEOUTPUT')
+# instructions without effect in the emulation
+IGNORED = ('REQBL', 'USE', 'USE_INP', 'USE_PREP', 'TIME', 'START', 'STOP', 'JOIN_TAPE',
+           'PROTECTMEMS', 'PROTECTMEMC', 'PROTECTMEMINT', 'STOPPRIVATEOUTPUT', 'RAWOUTPUT')
+
+_opcode_table = {}
+
+def opcode_table():
+    """ The name, argument format and whether it has a variable number of arguments by code. """
+    if not _opcode_table:
+        names = dict((code, name) for name, code in opcodes.items())
+        for key, cls in sorted(vars(instructions).items()):
+            if not (isinstance(cls, type) and issubclass(cls, Instruction) and
+                    isinstance(getattr(cls, 'code', None), int)):
+                continue
+            code = cls.code
+            name = names.get(code) or 'G' + names[code & ~0x100]
+            # some codes are shared by several classes, e.g. GMULBITC and gmodc
+            if code not in _opcode_table or cls.__name__ == name.lower():
+                _opcode_table[code] = (name, cls.arg_format,
+                                       cls.has_var_args.__func__(None))
+    return _opcode_table
+
+def decode(data):
+    """
+    Decode bytecode. Yields the name, vector size, arguments and argument formats
+    of each instruction.
+    """
+    table = opcode_table()
+    pos = 0
+    while pos < len(data):
+        code, = struct.unpack_from('>I', data, pos)
+        pos += 4
+        size = code >> 9 or 1
+        code &= 0x1ff
+        if code not in table:
+            raise EmulationError('Unknown opcode 0x%x at byte %d' % (code, pos - 4))
+        name, arg_format, var_args = table[code]
+        if var_args:
+            n_args, = struct.unpack_from('>i', data, pos)
+            pos += 4
+            formats = list(itertools.islice(iter(arg_format), n_args))
+        else:
+            formats = arg_format
+        if 'str' in formats:
+            args = []
+            for f in formats:
+                if f == 'str':
+                    args.append(data[pos:pos+16].rstrip('\0'))
+                    pos += 16
+                else:
+                    args.append(struct.unpack_from('>i', data, pos)[0])
+                    pos += 4
+        else:
+            args = list(struct.unpack_from('>%di' % len(formats), data, pos))
+            pos += 4 * len(formats)
+        yield name, size, args, formats
+
+def reg_type(format_str):
+    """ The register type of an argument format, e.g. ``'s'`` for ``'sw'``. """
+    return format_str[:-1] if format_str[-1] == 'w' else format_str
+
+def signed(x, p, bit_length):
+    """ Signed integer of ``bit_length`` bits from an element of GF(p), as in the runtime. """
+    if x < (p - 1) // 2:
+        return x & ((1 << bit_length) - 1)
+    else:
+        return -((p - x) & ((1 << bit_length) - 1))
+
+def c_div(x, y):
+    """ Integer division rounding towards zero as in C. """
+    q = abs(x) // abs(y)
+    return q if (x < 0) == (y < 0) else -q
+
+def elementwise(f, n_args=2):
+    """ The scalar function and its vectorization for functions that don't support arrays. """
+    return f, numpy.frompyfunc(f, n_args, 1)
+
+def both(f):
+    """ The scalar function and its vectorization for functions that support arrays. """
+    return f, f
+
+
+class GF2n(object):
+    """ Arithmetic in :math:`GF(2^n)` on integers. """
+    def __init__(self, n):
+        if n not in GF2N_FIELDS:
+            raise EmulationError('GF(2^%d) not supported' % n)
+        self.n = n
+        self.mask = (1 << n) - 1
+        self.poly = (1 << n) | 1
+        for t in GF2N_FIELDS[n]:
+            self.poly |= 1 << t
+
+    def mul(self, x, y):
+        res = 0
+        while y:
+            if y & 1:
+                res ^= x
+            y >>= 1
+            x <<= 1
+        for i in range(res.bit_length() - 1, self.n - 1, -1):
+            if res >> i & 1:
+                res ^= self.poly << (i - self.n)
+        return res
+
+    def inverse(self, x):
+        if x == 0:
+            raise EmulationError('Division by zero')
+        # x^(2^n - 2)
+        res, power = 1, x
+        for i in range(1, self.n):
+            power = self.mul(power, power)
+            res = self.mul(res, power)
+        return res
+
+
+class BinaryFile(object):
+    """
+    Values in the binary format of the runtime, e.g. ``gfp::output`` or ``Share::output``.
+
+    :param filename: the file, which may be missing
+    :param width: number of bytes per value
+    :param convert: function converting the little-endian integer of a value
+    """
+    def __init__(self, filename, width, convert):
+        self.filename = filename
+        self.width = width
+        self.convert = convert
+        self.exists = os.path.exists(filename)
+        self.data = open(filename, 'rb').read() if self.exists else ''
+        self.pos = 0
+
+    def __len__(self):
+        return len(self.data) // self.width
+
+    def get(self, start, n):
+        """ ``n`` values starting from value ``start`` """
+        if start + n > len(self):
+            raise EmulationError('Not enough data in %s' % self.filename)
+        w = self.width
+        return [self.convert(int(binascii.hexlify(self.data[i*w:(i+1)*w][::-1]), 16))
+                for i in range(start, start + n)]
+
+    def read(self, n):
+        """ The next ``n`` values """
+        res = self.get(self.pos, n)
+        self.pos += n
+        return res
+
+
+class EmulatedTape(object):
+    """ A decoded tape with its registers and the functions of its instructions. """
+    def __init__(self, name, filename):
+        self.name = name
+        with open(filename, 'rb') as f:
+            self.instructions = list(decode(f.read()))
+        sizes = dict((t, 0) for t in FIELDS)
+        for _, size, args, formats in self.instructions:
+            for arg, f in zip(args, formats):
+                if format_str_is_reg(f):
+                    t = reg_type(f)
+                    sizes[t] = max(sizes[t], arg + size)
+        self.registers = dict((t, numpy.zeros(n, dtype=object)) for t, n in sizes.items())
+        self.code = None
+
+    def memory_size(self, t):
+        """ The memory of type ``t`` accessed directly by the tape, as in the runtime """
+        direct = ('LDMC', 'STMC') if t in ('c', 'cg') else ('LDMS', 'STMS')
+        res = 0
+        for name, size, args, formats in self.instructions:
+            if t == 'ci' and name in ('LDMINT', 'STMINT') or \
+               name.lstrip('G') in direct and reg_type(formats[0]) == t:
+                res = max(res, args[1] + size)
+        return res
+
+
+class Emulator(object):
+    """
+    Emulator of the compiled program ``name`` in ``programs_dir``.
+
+    :param programs_dir: the ``Programs`` directory
+    :param name: the name of the program including the arguments, as in ``Program.name``
+    :param prime: the prime :math:`p` of :math:`GF(p)`
+    :param galois: the bit length :math:`n` of :math:`GF(2^n)`
+    :param seed: the seed of the preprocessing data and ``rand``
+    """
+    def __init__(self, programs_dir, name, prime=P_VALUES[128], galois=40, seed=0):
+        self.programs_dir = programs_dir
+        self.name = name
+        self.P = prime
+        self.galois = galois
+        self.gf2n = GF2n(galois) if galois in GF2N_FIELDS else None
+        self.random = random.Random(seed)
+        self.output = sys.stdout
+        self.read_schedule()
+        self.tapes = [EmulatedTape(name, '%s/Bytecode/%s.bc' % (programs_dir, name))
+                      for name in self.tape_names]
+        self.memory = {}
+        for t in FIELDS:
+            size = max([tape.memory_size(t) for tape in self.tapes] + [0])
+            self.memory[t] = numpy.zeros(size, dtype=object)
+        self.ops = self.field_ops()
+        self.n_instructions = 0
+        self.n_opens = 0
+        self.n_opened = 0
+        self.usage = Tape.ReqNum()
+        self.thread_number = 0
+        self.arg = 0
+        self.stack = []
+        # the values opened in each field, opens in GF(p) and GF(2^n) can overlap
+        self.opened = {}
+        self.inputs = {}
+        self.input_files = {}
+        self.public_input = None
+        self.stdin = None
+        self.transactions = None
+
+    def read_schedule(self):
+        """ Read the tapes and the order of their execution from the schedule """
+        with open('%s/Schedules/%s.sch' % (self.programs_dir, self.name)) as f:
+            lines = f.read().splitlines()
+        self.tape_names = lines[2].split()
+        self.schedule = []
+        for line in lines[3:]:
+            line = line.split()
+            if line == ['0']:
+                break
+            tapes = []
+            for tape in line[1:]:
+                tape = tape.split(':')
+                tapes.append((int(tape[0]), int(tape[1]) if len(tape) > 1 else 0))
+            self.schedule.append(tapes)
+
+    def field_ops(self):
+        """ The scalar and vectorized functions of the operations by field """
+        p = self.P
+        inverse = lambda y: pow(y, p - 2, p) if y % p else self.error('Division by zero')
+        res = {}
+        res['modp'] = {
+            'mov': both(lambda x: x),
+            'add': both(lambda x, y: (x + y) % p),
+            'sub': both(lambda x, y: (x - y) % p),
+            'rsub': both(lambda x, y: (y - x) % p),
+            'mul': both(lambda x, y: x * y % p),
+            'div': elementwise(lambda x, y: x * inverse(y) % p),
+            'mod': both(lambda x, y: x % y),
+            'legendre': elementwise(lambda x: pow(x, (p - 1) // 2, p), 1),
+            'conv': both(lambda x: x % p),
+            'and': both(lambda x, y: (x & y) % p),
+            'xor': both(lambda x, y: (x ^ y) % p),
+            'or': both(lambda x, y: (x | y) % p),
+            'shl': both(lambda x, y: (x << y) % p),
+            'shr': both(lambda x, y: x >> y),
+            'not': both(lambda x, n: (~x + (1 << n)) % p),
+            'random': lambda: self.random.randrange(p),
+            'inverse': inverse,
+        }
+        if self.gf2n is not None:
+            F = self.gf2n
+            mask = F.mask
+            res['gf2n'] = {
+                'mov': both(lambda x: x),
+                'add': both(lambda x, y: x ^ y),
+                'sub': both(lambda x, y: x ^ y),
+                'rsub': both(lambda x, y: x ^ y),
+                'mul': elementwise(F.mul),
+                'div': elementwise(lambda x, y: F.mul(x, F.inverse(y))),
+                'mulbit': both(lambda x, y: x * (y & 1)),
+                'conv': both(lambda x: x & 0xffffffffffffffff & mask),
+                'and': both(lambda x, y: x & y),
+                'xor': both(lambda x, y: x ^ y),
+                'or': both(lambda x, y: x | y),
+                'shl': both(lambda x, y: (x << y) & mask),
+                'shr': both(lambda x, y: x >> y),
+                'not': both(lambda x: ~x & mask),
+                'random': lambda: self.random.getrandbits(F.n),
+                'inverse': F.inverse,
+            }
+        res['int'] = {
+            'mov': both(lambda x: x),
+            'add': both(lambda x, y: x + y),
+            'sub': both(lambda x, y: x - y),
+            'mul': both(lambda x, y: x * y),
+            'div': elementwise(c_div),
+            'lt': elementwise(lambda x, y: int(x < y)),
+            'gt': elementwise(lambda x, y: int(x > y)),
+            'eq': elementwise(lambda x, y: int(x == y)),
+            'eqz': elementwise(lambda x: int(x == 0), 1),
+            'ltz': elementwise(lambda x: int(x < 0), 1),
+            'signed': elementwise(lambda x, n: signed(x, p, n)),
+        }
+        return res
+
+    def error(self, message):
+        raise EmulationError(message)
+
+    def field(self, t):
+        field = FIELDS[t]
+        if field not in self.ops:
+            self.error('GF(2^%d) not supported' % self.galois)
+        return self.ops[field]
+
+    def immediate(self, t, n):
+        """ The immediate value ``n`` in the field of register type ``t`` """
+        if t in ('cg', 'sg'):
+            return n & 0xffffffff & self.gf2n.mask
+        elif t in ('c', 's'):
+            return n % self.P
+        return n
+
+    def run(self):
+        """ Run the program and print the statistics of the emulation """
+        start = time.time()
+        for tapes in self.schedule:
+            for thread_number, (tape, arg) in enumerate(tapes):
+                self.run_tape(tape, thread_number, arg)
+        self.output.flush()
+        print 'Emulated %s in %.2f seconds' % (self.name, time.time() - start)
+        print 'Executed %d instructions with %d opens of %d values' % \
+            (self.n_instructions, self.n_opens, self.n_opened)
+        print 'Emulation used:', self.usage
+        print 'Cost:', self.usage.cost()
+
+    def run_tape(self, index, thread_number, arg):
+        """ Run tape ``index`` to the end """
+        tape = self.tapes[index]
+        if tape.code is None:
+            tape.code = [self.compile(tape, *instruction) for instruction in tape.instructions]
+        state = self.thread_number, self.arg, self.stack
+        self.thread_number, self.arg, self.stack = thread_number, arg, []
+        code = tape.code
+        n = len(code)
+        pc = 0
+        try:
+            while pc < n:
+                jump = code[pc]()
+                pc += 1
+                self.n_instructions += 1
+                if jump:
+                    pc += jump
+        except Exception as e:
+            if isinstance(e, EmulationError) and getattr(e, 'tape', None):
+                raise
+            name, size, args, formats = tape.instructions[pc]
+            e = EmulationError('%s in instruction %d of tape %s: %s %s%s' %
+                               (e, pc, tape.name, name, '%d, ' % size if size > 1 else '',
+                                ', '.join(str(arg) for arg in args)))
+            e.tape = tape.name
+            raise e
+        self.thread_number, self.arg, self.stack = state
+
+    def compile(self, tape, name, size, args, formats):
+        """ A function executing the instruction. Returns the relative jump if any. """
+        R = tape.registers
+        types = [reg_type(f) if format_str_is_reg(f) else None for f in formats]
+        regs = [R[t] if t else None for t in types]
+        base = name[1:] if name.startswith('G') and name not in opcodes else name
+
+        if name in UNARY or base in UNARY:
+            f = self.field(types[0])[UNARY.get(name) or UNARY[base]]
+            return self.unary(f, size, regs[0], args[0], regs[1], args[1])
+        if name in BINARY or base in BINARY:
+            f = self.field(types[0])[BINARY.get(name) or BINARY[base]]
+            return self.binary(f, size, regs[0], args[0], regs[1], args[1], regs[2], args[2])
+        if base in IMMEDIATE:
+            op = IMMEDIATE[base]
+            n = args[2]
+            if op in ('add', 'sub', 'rsub', 'mul', 'div') or \
+               FIELDS[types[0]] == 'gf2n' and op not in ('shl', 'shr'):
+                n = self.immediate(types[0], n)
+            f = self.field(types[0])[op]
+            return self.immediate_op(f, size, regs[0], args[0], regs[1], args[1], n)
+        if base in CONSTANT:
+            return self.constant(size, regs[0], args[0], self.immediate(types[0], args[1]))
+        if base in DATA:
+            return self.data(DATA[base], size, types[0], regs, args)
+        if base in IGNORED:
+            return lambda: None
+
+        build = getattr(self, 'build_' + name.lower(), None) or \
+            getattr(self, 'build_' + base.lower(), None)
+        if build is None:
+            def unsupported():
+                self.error('Emulation of %s not supported' % name)
+            return unsupported
+        if size == 1 or base in BULK:
+            return build(size, regs, args, types)
+        # execute the elements of the vector one by one
+        elements = [build(1, regs, [arg + i if t else arg for arg, t in zip(args, types)], types)
+                    for i in range(size)]
+        def run():
+            for f in elements:
+                f()
+        return run
+
+    # generic instructions
+
+    def unary(self, f, size, d, i, a, j):
+        f, vf = f
+        if size == 1:
+            def run():
+                d[i] = f(a[j])
+        else:
+            def run():
+                d[i:i+size] = vf(a[j:j+size])
+        return run
+
+    def binary(self, f, size, d, i, a, j, b, k):
+        f, vf = f
+        if size == 1:
+            def run():
+                d[i] = f(a[j], b[k])
+        else:
+            def run():
+                d[i:i+size] = vf(a[j:j+size], b[k:k+size])
+        return run
+
+    def immediate_op(self, f, size, d, i, a, j, n):
+        f, vf = f
+        if size == 1:
+            def run():
+                d[i] = f(a[j], n)
+        else:
+            def run():
+                d[i:i+size] = vf(a[j:j+size], n)
+        return run
+
+    def constant(self, size, d, i, value):
+        if size == 1:
+            def run():
+                d[i] = value
+        else:
+            def run():
+                d[i:i+size] = value
+        return run
+
+    def data(self, data_type, size, t, regs, args):
+        """ Preprocessing data in the registers of ``args`` """
+        field = FIELDS[t]
+        F = self.field(t)
+        mul = F['mul'][0]
+        bit = lambda: self.random.getrandbits(1)
+        random = F['random']
+        if data_type == 'triple':
+            generate = lambda: (lambda a, b: (a, b, mul(a, b)))(random(), random())
+        elif data_type == 'square':
+            generate = lambda: (lambda a: (a, mul(a, a)))(random())
+        elif data_type == 'bit':
+            generate = lambda: (bit(),)
+        elif data_type == 'inverse':
+            def generate():
+                a = random()
+                while a == 0:
+                    a = random()
+                return a, F['inverse'](a)
+        elif data_type == 'bittriple':
+            generate = lambda: (lambda a, b: (a, b, a & b))(bit(), bit())
+        elif data_type == 'bitgf2ntriple':
+            generate = lambda: (lambda a, b: (a, b, a * b))(bit(), random())
+        key = field, data_type
+        regs = zip(regs, args)
+        if size == 1:
+            def run():
+                for (d, i), value in zip(regs, generate()):
+                    d[i] = value
+                self.usage[key] += 1
+        else:
+            def run():
+                for (d, i), values in zip(regs, zip(*[generate() for j in range(size)])):
+                    d[i:i+size] = values
+                self.usage[key] += size
+        return run
+
+    # memory
+
+    def build_ldmc(self, size, regs, args, types):
+        d, i = regs[0], args[0]
+        M, n = self.memory[types[0]], args[1]
+        if size == 1:
+            def run():
+                d[i] = M[n]
+        else:
+            def run():
+                d[i:i+size] = M[n:n+size]
+        return run
+
+    build_ldms = build_ldmint = build_ldmc
+
+    def build_stmc(self, size, regs, args, types):
+        s, i = regs[0], args[0]
+        M, n = self.memory[types[0]], args[1]
+        if size == 1:
+            def run():
+                M[n] = s[i]
+        else:
+            def run():
+                M[n:n+size] = s[i:i+size]
+        return run
+
+    build_stms = build_stmint = build_stmc
+
+    def build_ldmci(self, size, regs, args, types):
+        d, i = regs[0], args[0]
+        ci, j = regs[1], args[1]
+        M = self.memory[types[0]]
+        if size == 1:
+            def run():
+                d[i] = M[ci[j]]
+        else:
+            def run():
+                d[i:i+size] = M[ci[j:j+size].astype(numpy.int64)]
+        return run
+
+    build_ldmsi = build_ldminti = build_ldmci
+
+    def build_stmci(self, size, regs, args, types):
+        s, i = regs[0], args[0]
+        ci, j = regs[1], args[1]
+        M = self.memory[types[0]]
+        if size == 1:
+            def run():
+                M[ci[j]] = s[i]
+        else:
+            def run():
+                M[ci[j:j+size].astype(numpy.int64)] = s[i:i+size]
+        return run
+
+    build_stmsi = build_stminti = build_stmci
+
+    # opening
+
+    def vector_index(self, size, args):
+        """ The indices of the elements of vector registers ``args`` """
+        return numpy.array([arg + i for arg in args for i in range(size)], dtype=numpy.int64)
+
+    def build_startopen(self, size, regs, args, types, field='modp'):
+        S = regs[0] if regs else None
+        index = self.vector_index(size, args)
+        def run():
+            self.opened[field] = S[index] if S is not None else []
+            self.n_opens += 1
+            self.n_opened += len(index)
+        return run
+
+    def build_gstartopen(self, size, regs, args, types):
+        return self.build_startopen(size, regs, args, types, 'gf2n')
+
+    def build_stopopen(self, size, regs, args, types, field='modp'):
+        C = regs[0] if regs else None
+        index = self.vector_index(size, args)
+        def run():
+            if C is not None:
+                C[index] = self.opened[field]
+            self.opened[field] = None
+        return run
+
+    def build_gstopopen(self, size, regs, args, types):
+        return self.build_stopopen(size, regs, args, types, 'gf2n')
+
+    # input and output
+
+    def input_file(self, field, player):
+        """ The private input of ``player`` in ``field`` """
+        key = field, player
+        if key not in self.input_files:
+            filename = 'Player-Data/Private-Input-%d' % player
+            if field == 'modp':
+                limbs = (self.P.bit_length() + 63) // 64
+                montgomery = pow(1 << (64 * limbs), self.P - 2, self.P)
+                convert = lambda x: x * montgomery % self.P
+                self.input_files[key] = BinaryFile(filename, 8 * limbs, convert)
+            else:
+                mask = self.gf2n.mask
+                width = 16 if self.galois > 64 else 8
+                self.input_files[key] = BinaryFile(filename, width, lambda x: x & mask)
+        return self.input_files[key]
+
+    def build_startinput(self, size, regs, args, types, field='modp'):
+        player, n = args
+        def run():
+            self.inputs[field, player] = self.input_file(field, player).read(n)
+            self.usage[field, 'input', player] += n
+        return run
+
+    def build_gstartinput(self, size, regs, args, types):
+        return self.build_startinput(size, regs, args, types, 'gf2n')
+
+    def build_stopinput(self, size, regs, args, types):
+        player = args[0]
+        S = regs[1] if len(regs) > 1 else None
+        index = numpy.array(args[1:], dtype=numpy.int64)
+        field = FIELDS[types[1]] if len(types) > 1 else 'modp'
+        def run():
+            values = self.inputs.pop((field, player))
+            if S is not None:
+                S[index] = values
+        return run
+
+    def read_token(self, name):
+        """ The next integer from the standard input or the public input file """
+        if name == 'stdin':
+            if self.stdin is None:
+                self.stdin = (int(token) for line in sys.stdin for token in line.split())
+            tokens = self.stdin
+        else:
+            if self.public_input is None:
+                filename = '%s/Public-Input/%s' % (self.programs_dir, self.name)
+                self.public_input = iter(open(filename).read().split()) \
+                    if os.path.exists(filename) else iter([])
+            tokens = self.public_input
+        try:
+            return int(next(tokens))
+        except StopIteration:
+            self.error('Not enough %s' % ('input' if name == 'stdin' else 'public input'))
+
+    def build_input(self, size, regs, args, types):
+        d, i = regs[0], args[0]
+        t, player = types[0], args[1]
+        convert = self.field(t)['conv'][0]
+        def run():
+            d[i] = convert(self.read_token('stdin'))
+            self.usage[FIELDS[t], 'input', player] += 1
+        return run
+
+    def build_pubinput(self, size, regs, args, types):
+        d, i = regs[0], args[0]
+        def run():
+            d[i] = self.read_token('public')
+        return run
+
+    def build_inputmask(self, size, regs, args, types):
+        d, i = regs[0], args[0]
+        random = self.field(types[0])['random']
+        def run():
+            d[i] = random()
+        return run
+
+    def build_startprivateoutput(self, size, regs, args, types):
+        # the mask is zero, so the opened value is the output
+        return self.unary(self.field(types[0])['mov'], size, regs[0], args[0], regs[1], args[1])
+
+    def write(self, string):
+        self.output.write(string)
+
+    def format(self, t, value):
+        if t in ('cg', 'sg'):
+            return '0x%x' % value if value else '0'
+        elif t in ('c', 's'):
+            # modp::output prints the signed representative
+            return str(value if value < self.P // 2 else value - self.P)
+        return str(value)
+
+    def build_printreg(self, size, regs, args, types):
+        c, i = regs[0], args[0]
+        t, comment = types[0], struct.pack('<i', args[1])
+        def run():
+            self.write('Reg[%d] = %s # %s\n' % (i, self.format(t, c[i]), comment))
+        return run
+
+    def build_printregplain(self, size, regs, args, types):
+        c, i, t = regs[0], args[0], types[0]
+        def run():
+            self.write(self.format(t, c[i]))
+        return run
+
+    def build_printmem(self, size, regs, args, types):
+        n, t = args[0], types[0]
+        def run():
+            self.write('Mem[%d] = %s\n' % (n, self.format(t, self.memory[t][n])))
+        return run
+
+    def build_printint(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            self.write(str(ci[i]))
+        return run
+
+    def build_printstr(self, size, regs, args, types):
+        string = struct.pack('<i', args[0])
+        return lambda: self.write(string)
+
+    def build_printchr(self, size, regs, args, types):
+        string = chr(args[0] & 0xff)
+        return lambda: self.write(string)
+
+    def build_printchrint(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            self.write(chr(ci[i] & 0xff))
+        return run
+
+    def build_printstrint(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            self.write(struct.pack('<Q', ci[i] & 0xffffffffffffffff)[:4])
+        return run
+
+    def build_printfloatplain(self, size, regs, args, types):
+        C = regs[0]
+        v, p, z, s = args
+        def run():
+            if C[z] not in (0, 1) or C[s] not in (0, 1):
+                self.error('invalid floating point number')
+            if C[z]:
+                res = 0.
+            else:
+                res = float(C[v]) * 2. ** signed(C[p], self.P, 31)
+                if C[s]:
+                    res = -res
+            self.write('%g' % res)
+        return run
+
+    # control flow and threads
+
+    def build_jmp(self, size, regs, args, types):
+        n = args[0]
+        return lambda: n
+
+    def build_jmpnz(self, size, regs, args, types):
+        ci, i, n = regs[0], args[0], args[1]
+        return lambda: n if ci[i] != 0 else 0
+
+    def build_jmpeqz(self, size, regs, args, types):
+        ci, i, n = regs[0], args[0], args[1]
+        return lambda: n if ci[i] == 0 else 0
+
+    def build_jmpi(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        return lambda: ci[i]
+
+    def build_ldtn(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            ci[i] = self.thread_number
+        return run
+
+    def build_ldarg(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            ci[i] = self.arg
+        return run
+
+    def build_starg(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            self.arg = ci[i]
+        return run
+
+    def build_pushint(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            self.stack.append(ci[i])
+        return run
+
+    def build_popint(self, size, regs, args, types):
+        ci, i = regs[0], args[0]
+        def run():
+            ci[i] = self.stack.pop()
+        return run
+
+    def build_run_tape(self, size, regs, args, types):
+        thread_number, arg, tape = args
+        def run():
+            self.run_tape(tape, thread_number, arg)
+        return run
+
+    def build_crash(self, size, regs, args, types):
+        def run():
+            self.error('Crash requested')
+        return run
+
+    def build_rand(self, size, regs, args, types):
+        d, i = regs[0], args[0]
+        ci, j = regs[1], args[1]
+        def run():
+            d[i] = self.random.getrandbits(32) % (1 << ci[j])
+        return run
+
+    # GF(2^n) bits
+
+    def build_gbitdec(self, size, regs, args, types):
+        C = regs[0]
+        a, n, bits = args[0], args[1], args[2:]
+        def run():
+            x = C[a]
+            for i in bits:
+                C[i] = x & 1
+                x >>= n
+        return run
+
+    def build_gbitcom(self, size, regs, args, types):
+        C = regs[0]
+        a, n, bits = args[0], args[1], args[2:]
+        def run():
+            C[a] = reduce(lambda x, (j, i): x ^ (C[i] << (j * n)), enumerate(bits), 0)
+        return run
+
+    # persistence
+
+    def transaction_file(self):
+        """ The sum of the shares in ``Persistence/Transactions-P<player>.data`` """
+        if self.transactions is None:
+            limbs = (self.P.bit_length() + 63) // 64
+            width = 8 * limbs
+            montgomery = pow(1 << (64 * limbs), self.P - 2, self.P)
+            files = []
+            while True:
+                filename = 'Persistence/Transactions-P%d.data' % len(files)
+                if not os.path.exists(filename):
+                    break
+                files.append(BinaryFile(filename, 2 * width, lambda x: x % (1 << (8 * width))))
+            values = [0] * (len(files[0]) if files else 0)
+            for f in files:
+                values = [(x + y) % self.P for x, y in zip(values, f.get(0, len(f)))]
+            self.transactions = bool(files), [x * montgomery % self.P for x in values], 2 * width
+        return self.transactions
+
+    def build_writefileshare(self, size, regs, args, types):
+        S = regs[0] if regs else None
+        index = numpy.array(args, dtype=numpy.int64)
+        def run():
+            exists, values, width = self.transaction_file()
+            self.transactions = True, values + list(S[index] if S is not None else []), width
+        return run
+
+    def build_readfileshare(self, size, regs, args, types):
+        ci, start = regs[0], args[0]
+        stop = args[1]
+        S = regs[2] if len(regs) > 2 else None
+        index = numpy.array(args[2:], dtype=numpy.int64)
+        def run():
+            exists, values, width = self.transaction_file()
+            if not exists:
+                ci[stop] = -2
+                return
+            first = ci[start] // width
+            if first + len(index) > len(values):
+                self.error('Got to EOF when reading from disk')
+            if S is not None:
+                S[index] = values[first:first+len(index)]
+            end = first + len(index)
+            ci[stop] = -1 if end == len(values) else end * width
+        return run
+
+
+def emulate(args, options):
+    """ Emulate the program compiled by ``compile.py`` with ``args`` and ``options`` """
+    param = int(options.param)
+    emulator = Emulator(get_programs_dir(), get_program_name(args),
+                        prime=P_VALUES[128 if param == -1 else param],
+                        galois=int(options.galois))
+    emulator.run()
+    return emulator
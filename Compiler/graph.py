@@ -1,6 +1,7 @@
 # (C) 2018 University of Bristol. See License.txt
 
 import heapq
+from array import array
 from Compiler.exceptions import *
 
 class GraphError(CompilerError):
@@ -105,6 +106,268 @@ class SparseDiGraph(object):
         return len(self.nodes[i]) - len(self.default_attributes)
 
 
+class ArrayDiGraph(object):
+    """ Directed graph in typed arrays with the interface of SparseDiGraph,
+    suitable for the dependency graphs of large basic blocks.
+
+    Every edge is an index into parallel arrays of sources, targets and
+    weights. The edges of a node form doubly linked lists of successors and
+    predecessors, so edges are added at the end and removed in constant time
+    while keeping the order of SparseDiGraph. The arrays of removed edges are
+    reused for new edges.
+
+    Integer and boolean node attributes are stored in arrays, other
+    attributes in dictionaries of the nodes that differ from the default.
+    Boolean attributes are returned as 0 or 1.
+
+    Unlike SparseDiGraph, the weights of the edges of a removed node are
+    removed as well, so G.weights only holds the weights of existing edges.
+    SparseDiGraph keeps them in G.weights, but the Merger never reads them.
+    """
+    def __init__(self, max_nodes, default_attributes=None):
+        """ max_nodes: maximum no of nodes
+        default_attributes: dict of node attributes and default values """
+        if default_attributes is None:
+            default_attributes = { 'merges': None, 'stop': -1, 'start': -1, 'is_source': True }
+        self.default_attributes = default_attributes
+        self.n = max_nodes
+        self.attributes = {}
+        for a, value in default_attributes.items():
+            if isinstance(value, bool):
+                self.attributes[a] = array('b', [value]) * max_nodes
+            elif isinstance(value, int):
+                self.attributes[a] = array('i', [value]) * max_nodes
+            else:
+                self.attributes[a] = _DefaultAttributes(value)
+        # first and last edge of the successors and predecessors of each node
+        self.succ_head = array('i', [-1]) * max_nodes
+        self.succ_tail = array('i', [-1]) * max_nodes
+        self.pred_head = array('i', [-1]) * max_nodes
+        self.pred_tail = array('i', [-1]) * max_nodes
+        self.out_degree = array('i', [0]) * max_nodes
+        self.in_degree = array('i', [0]) * max_nodes
+        # edges, n_edges of them are in use or removed
+        self.source = array('i')
+        self.target = array('i')
+        self.weight = array('i')
+        self.succ_next = array('i')
+        self.succ_prev = array('i')
+        self.pred_next = array('i')
+        self.pred_prev = array('i')
+        # removed edges, linked by succ_next
+        self.n_edges = 0
+        self.free_edge = -1
+        self.pred = _Predecessors(self)
+        self.weights = _EdgeWeights(self)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        """ Get list of the neighbours of node i """
+        res = []
+        target, succ_next = self.target, self.succ_next
+        e = self.succ_head[i]
+        while e != -1:
+            res.append(target[e])
+            e = succ_next[e]
+        return res
+
+    def __contains__(self, i):
+        return i >= 0 and i < self.n
+
+    def add_node(self, i, **attr):
+        if i >= self.n:
+            raise CompilerError('Cannot add node %d to graph of size %d' % (i, self.n))
+        for a,value in attr.items():
+            self.set_attr(i, a, value)
+
+    def set_attr(self, i, attr, value):
+        if attr in self.attributes:
+            self.attributes[attr][i] = value
+        else:
+            raise CompilerError('Invalid attribute %s for graph node' % attr)
+
+    def get_attr(self, i, attr):
+        return self.attributes[attr][i]
+
+    def find_edge(self, i, j):
+        """ Index of the edge from i to j or -1, searching the shorter list """
+        if self.out_degree[i] <= self.in_degree[j]:
+            target, succ_next = self.target, self.succ_next
+            e = self.succ_head[i]
+            while e != -1 and target[e] != j:
+                e = succ_next[e]
+        else:
+            source, pred_next = self.source, self.pred_next
+            e = self.pred_head[j]
+            while e != -1 and source[e] != i:
+                e = pred_next[e]
+        return e
+
+    def remove_node(self, i):
+        """ Remove node i and all its edges """
+        while self.succ_head[i] != -1:
+            self._remove_edge(self.succ_head[i])
+        while self.pred_head[i] != -1:
+            self._remove_edge(self.pred_head[i])
+        for a,values in self.attributes.items():
+            if isinstance(values, _DefaultAttributes):
+                values.pop(i, None)
+            else:
+                values[i] = self.default_attributes[a]
+
+    def add_edge(self, i, j, weight=1):
+        # inlined find_edge, this is the hot spot of the dependency graph
+        if self.out_degree[i] <= self.in_degree[j]:
+            target, succ_next = self.target, self.succ_next
+            e = self.succ_head[i]
+            while e != -1 and target[e] != j:
+                e = succ_next[e]
+        else:
+            source, pred_next = self.source, self.pred_next
+            e = self.pred_head[j]
+            while e != -1 and source[e] != i:
+                e = pred_next[e]
+        if e == -1:
+            self._new_edge(i, j, weight)
+        else:
+            self.weight[e] = weight
+
+    def _new_edge(self, i, j, weight):
+        # append to the successors of i and the predecessors of j
+        succ_last = self.succ_tail[i]
+        pred_last = self.pred_tail[j]
+        e = self.free_edge
+        if e == -1:
+            e = self.n_edges
+            if e == len(self.source):
+                self._grow_edges()
+            self.n_edges += 1
+        else:
+            self.free_edge = self.succ_next[e]
+        self.source[e] = i
+        self.target[e] = j
+        self.weight[e] = weight
+        self.succ_next[e] = -1
+        self.succ_prev[e] = succ_last
+        self.pred_next[e] = -1
+        self.pred_prev[e] = pred_last
+        if succ_last == -1:
+            self.succ_head[i] = e
+        else:
+            self.succ_next[succ_last] = e
+        self.succ_tail[i] = e
+        self.out_degree[i] += 1
+        if pred_last == -1:
+            self.pred_head[j] = e
+        else:
+            self.pred_next[pred_last] = e
+        self.pred_tail[j] = e
+        self.in_degree[j] += 1
+
+    def _grow_edges(self):
+        # double the edge arrays instead of appending every edge
+        extension = array('i', [-1]) * max(len(self.source), 1024)
+        for edge_array in (self.source, self.target, self.weight, self.succ_next,
+                           self.succ_prev, self.pred_next, self.pred_prev):
+            edge_array.extend(extension)
+
+    def _remove_edge(self, e):
+        i, j = self.source[e], self.target[e]
+        prev, next = self.succ_prev[e], self.succ_next[e]
+        if prev == -1:
+            self.succ_head[i] = next
+        else:
+            self.succ_next[prev] = next
+        if next == -1:
+            self.succ_tail[i] = prev
+        else:
+            self.succ_prev[next] = prev
+        self.out_degree[i] -= 1
+        prev, next = self.pred_prev[e], self.pred_next[e]
+        if prev == -1:
+            self.pred_head[j] = next
+        else:
+            self.pred_next[prev] = next
+        if next == -1:
+            self.pred_tail[j] = prev
+        else:
+            self.pred_prev[next] = prev
+        self.in_degree[j] -= 1
+        self.succ_next[e] = self.free_edge
+        self.free_edge = e
+
+    def add_edges_from(self, tuples):
+        for edge in tuples:
+            if len(edge) == 3:
+                # use weight
+                self.add_edge(edge[0], edge[1], edge[2])
+            else:
+                self.add_edge(edge[0], edge[1])
+
+    def remove_edge(self, i, j):
+        e = self.find_edge(i, j)
+        if e == -1:
+            raise GraphError('No edge from %d to %d' % (i, j))
+        self._remove_edge(e)
+
+    def remove_edges_from(self, pairs):
+        for i,j in pairs:
+            self.remove_edge(i, j)
+
+    def degree(self, i):
+        return self.out_degree[i]
+
+class _DefaultAttributes(dict):
+    """ Attribute of the nodes of ArrayDiGraph that differ from the default """
+    def __init__(self, default):
+        dict.__init__(self)
+        self.default = default
+
+    def __missing__(self, i):
+        return self.default
+
+class _Predecessors(object):
+    """ G.pred[j] of ArrayDiGraph is the list of predecessors of j """
+    def __init__(self, G):
+        self.G = G
+
+    def __getitem__(self, j):
+        res = []
+        source, pred_next = self.G.source, self.G.pred_next
+        e = self.G.pred_head[j]
+        while e != -1:
+            res.append(source[e])
+            e = pred_next[e]
+        return res
+
+class _EdgeWeights(object):
+    """ G.weights[(i,j)] of ArrayDiGraph is the weight of the edge from i to j """
+    def __init__(self, G):
+        self.G = G
+
+    def _find(self, edge):
+        e = self.G.find_edge(*edge)
+        if e == -1:
+            raise KeyError(edge)
+        return e
+
+    def __getitem__(self, edge):
+        return self.G.weight[self._find(edge)]
+
+    def __setitem__(self, edge, weight):
+        self.G.weight[self._find(edge)] = weight
+
+    def __contains__(self, edge):
+        return self.G.find_edge(*edge) != -1
+
+    def __iter__(self):
+        for i in xrange(self.G.n):
+            for j in self.G[i]:
+                yield i, j
+
+
 def topological_sort(G, nbunch=None, pref=None):
     seen={}
     order_explored=[] # provide order and 
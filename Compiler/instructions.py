@@ -14,15 +14,11 @@ documentation
 
 import itertools
 import tools
-from random import randint
 from Compiler.config import *
 from Compiler.exceptions import *
 import Compiler.instructions_base as base
 
 
-# avoid naming collision with input instruction
-_python_input = input
-
 ###
 ### Load and store instructions
 ###
@@ -34,9 +30,6 @@ class ldi(base.Instruction):
     __slots__ = []
     code = base.opcodes['LDI']
     arg_format = ['cw','i']
-    
-    def execute(self):
-        self.args[0].value = self.args[1]
 
 @base.gf2n
 @base.vectorize
@@ -45,9 +38,6 @@ class ldsi(base.Instruction):
     __slots__ = []
     code = base.opcodes['LDSI']
     arg_format = ['sw','i']
-    
-    def execute(self):
-        self.args[0].value = self.args[1]
 
 @base.gf2n
 @base.vectorize
@@ -57,9 +47,6 @@ class ldmc(base.DirectMemoryInstruction, base.ReadMemoryInstruction):
     code = base.opcodes['LDMC']
     arg_format = ['cw','int']
 
-    def execute(self):
-        self.args[0].value = program.mem_c[self.args[1]]
-
 @base.gf2n
 @base.vectorize
 class ldms(base.DirectMemoryInstruction, base.ReadMemoryInstruction):
@@ -68,9 +55,6 @@ class ldms(base.DirectMemoryInstruction, base.ReadMemoryInstruction):
     code = base.opcodes['LDMS']
     arg_format = ['sw','int']
 
-    def execute(self):
-        self.args[0].value = program.mem_s[self.args[1]]
-
 @base.gf2n
 @base.vectorize
 class stmc(base.DirectMemoryWriteInstruction):
@@ -79,9 +63,6 @@ class stmc(base.DirectMemoryWriteInstruction):
     code = base.opcodes['STMC']
     arg_format = ['c','int']
 
-    def execute(self):
-        program.mem_c[self.args[1]] = self.args[0].value
-
 @base.gf2n
 @base.vectorize
 class stms(base.DirectMemoryWriteInstruction):
@@ -90,9 +71,6 @@ class stms(base.DirectMemoryWriteInstruction):
     code = base.opcodes['STMS']
     arg_format = ['s','int']
 
-    def execute(self):
-        program.mem_s[self.args[1]] = self.args[0].value
-
 @base.vectorize
 class ldmint(base.DirectMemoryInstruction, base.ReadMemoryInstruction):
     r""" Assigns register $ci_i$ the value in memory \verb+Ci[n]+. """
@@ -100,9 +78,6 @@ class ldmint(base.DirectMemoryInstruction, base.ReadMemoryInstruction):
     code = base.opcodes['LDMINT']
     arg_format = ['ciw','int']
 
-    def execute(self):
-        self.args[0].value = program.mem_i[self.args[1]]
-
 @base.vectorize
 class stmint(base.DirectMemoryWriteInstruction):
     r""" Sets \verb+Ci[n]+ to be the value $ci_i$. """
@@ -110,18 +85,12 @@ class stmint(base.DirectMemoryWriteInstruction):
     code = base.opcodes['STMINT']
     arg_format = ['ci','int']
 
-    def execute(self):
-        program.mem_i[self.args[1]] = self.args[0].value
-
 # must have seperate instructions because address is always modp
 @base.vectorize
 class ldmci(base.ReadMemoryInstruction):
     r""" Assigns register $c_i$ the value in memory \verb+C[cj]+. """
     code = base.opcodes['LDMCI']
     arg_format = ['cw','ci']
-    
-    def execute(self):
-        self.args[0].value = program.mem_c[self.args[1].value]
 
 @base.vectorize
 class ldmsi(base.ReadMemoryInstruction):
@@ -129,53 +98,35 @@ class ldmsi(base.ReadMemoryInstruction):
     code = base.opcodes['LDMSI']
     arg_format = ['sw','ci']
 
-    def execute(self):
-        self.args[0].value = program.mem_s[self.args[1].value]
-
 @base.vectorize
 class stmci(base.WriteMemoryInstruction):
     r""" Sets \verb+C[cj]+ to be the value $c_i$. """
     code = base.opcodes['STMCI']
     arg_format = ['c','ci']
 
-    def execute(self):
-        program.mem_c[self.args[1].value] = self.args[0].value
-
 @base.vectorize
 class stmsi(base.WriteMemoryInstruction):
     r""" Sets \verb+S[cj]+ to be the value $s_i$. """
     code = base.opcodes['STMSI']
     arg_format = ['s','ci']
 
-    def execute(self):
-        program.mem_s[self.args[1].value] = self.args[0].value
-
 @base.vectorize
 class ldminti(base.ReadMemoryInstruction):
     r""" Assigns register $ci_i$ the value in memory \verb+Ci[cj]+. """
     code = base.opcodes['LDMINTI']
     arg_format = ['ciw','ci']
 
-    def execute(self):
-        self.args[0].value = program.mem_i[self.args[1].value]
-
 @base.vectorize
 class stminti(base.WriteMemoryInstruction):
     r""" Sets \verb+Ci[cj]+ to be the value $ci_i$. """
     code = base.opcodes['STMINTI']
     arg_format = ['ci','ci']
 
-    def execute(self):
-        program.mem_i[self.args[1].value] = self.args[0].value
-
 @base.vectorize
 class gldmci(base.ReadMemoryInstruction):
     r""" Assigns register $c_i$ the value in memory \verb+C[cj]+. """
     code = base.opcodes['LDMCI'] + 0x100
     arg_format = ['cgw','ci']
-    
-    def execute(self):
-        self.args[0].value = program.mem_c[self.args[1].value]
 
 @base.vectorize
 class gldmsi(base.ReadMemoryInstruction):
@@ -183,27 +134,18 @@ class gldmsi(base.ReadMemoryInstruction):
     code = base.opcodes['LDMSI'] + 0x100
     arg_format = ['sgw','ci']
 
-    def execute(self):
-        self.args[0].value = program.mem_s[self.args[1].value]
-
 @base.vectorize
 class gstmci(base.WriteMemoryInstruction):
     r""" Sets \verb+C[cj]+ to be the value $c_i$. """
     code = base.opcodes['STMCI'] + 0x100
     arg_format = ['cg','ci']
 
-    def execute(self):
-        program.mem_c[self.args[1].value] = self.args[0].value
-
 @base.vectorize
 class gstmsi(base.WriteMemoryInstruction):
     r""" Sets \verb+S[cj]+ to be the value $s_i$. """
     code = base.opcodes['STMSI'] + 0x100
     arg_format = ['sg','ci']
 
-    def execute(self):
-        program.mem_s[self.args[1].value] = self.args[0].value
-
 @base.gf2n
 @base.vectorize
 class protectmems(base.Instruction):
@@ -233,9 +175,6 @@ class movc(base.Instruction):
     code = base.opcodes['MOVC']
     arg_format = ['cw','c']
 
-    def execute(self):
-        self.args[0].value = self.args[1].value
-
 @base.gf2n
 @base.vectorize
 class movs(base.Instruction):
@@ -244,9 +183,6 @@ class movs(base.Instruction):
     code = base.opcodes['MOVS']
     arg_format = ['sw','s']
 
-    def execute(self):
-        self.args[0].value = self.args[1].value
-
 @base.vectorize
 class movint(base.Instruction):
     r""" Assigns register $ci_i$ the value in the register $ci_j$. """
@@ -424,9 +360,6 @@ class divc(base.Instruction):
     __slots__ = []
     code = base.opcodes['DIVC']
     arg_format = ['cw','c','c']
-    
-    def execute(self):
-        self.args[0].value = self.args[1].value * pow(self.args[2].value, program.P-2, program.P) % program.P
 
 @base.gf2n
 @base.vectorize
@@ -436,9 +369,6 @@ class modc(base.Instruction):
     code = base.opcodes['MODC']
     arg_format = ['cw','c','c']
 
-    def execute(self):
-        self.args[0].value = self.args[1].value % self.args[2].value
-
 @base.vectorize
 class legendrec(base.Instruction):
     r""" Clear Legendre symbol computation, $c_i = (c_j / p)$. """
@@ -464,9 +394,6 @@ class andc(base.Instruction):
     __slots__ = []
     code = base.opcodes['ANDC']
     arg_format = ['cw','c','c']
-    
-    def execute(self):
-        self.args[0].value = (self.args[1].value & self.args[2].value) % program.P
 
 @base.gf2n
 @base.vectorize
@@ -475,9 +402,6 @@ class orc(base.Instruction):
     __slots__ = []
     code = base.opcodes['ORC']
     arg_format = ['cw','c','c']
-    
-    def execute(self):
-        self.args[0].value = (self.args[1].value | self.args[2].value) % program.P
 
 @base.gf2n
 @base.vectorize
@@ -486,9 +410,6 @@ class xorc(base.Instruction):
     __slots__ = []
     code = base.opcodes['XORC']
     arg_format = ['cw','c','c']
-    
-    def execute(self):
-        self.args[0].value = (self.args[1].value ^ self.args[2].value) % program.P
 
 @base.vectorize
 class notc(base.Instruction):
@@ -496,9 +417,6 @@ class notc(base.Instruction):
     __slots__ = []
     code = base.opcodes['NOTC']
     arg_format = ['cw','c', 'int']
-    
-    def execute(self):
-        self.args[0].value = (~self.args[1].value + 2 ** self.args[2]) % program.P
 
 @base.vectorize
 class gnotc(base.Instruction):
@@ -510,9 +428,6 @@ class gnotc(base.Instruction):
     def is_gf2n(self):
         return True
 
-    def execute(self):
-        self.args[0].value = ~self.args[1].value
-
 @base.vectorize
 class gbitdec(base.Instruction):
     r""" Store every $n$-th bit of $cg_i$ in $cg_j, \dots$. """
@@ -638,8 +553,6 @@ class divci(base.ClearImmediate):
     r""" Clear division by immediate value $c_i=c_j/n$. """
     __slots__ = []
     code = base.opcodes['DIVCI']
-    def execute(self):
-        self.args[0].value = self.args[1].value * pow(self.args[2], program.P-2, program.P) % program.P
 
 @base.gf2n
 @base.vectorize
@@ -685,9 +598,6 @@ class shlc(base.Instruction):
     __slots__ = []
     code = base.opcodes['SHLC']
     arg_format = ['cw','c','c']
-    
-    def execute(self):
-        self.args[0].value = (self.args[1].value << self.args[2].value) % program.P
 
 @base.gf2n
 @base.vectorize
@@ -696,9 +606,6 @@ class shrc(base.Instruction):
     __slots__ = []
     code = base.opcodes['SHRC']
     arg_format = ['cw','c','c']
-    
-    def execute(self):
-        self.args[0].value = (self.args[1].value >> self.args[2].value) % program.P
 
 @base.gf2n
 @base.vectorize
@@ -730,11 +637,6 @@ class triple(base.DataInstruction):
     code = base.opcodes['TRIPLE']
     arg_format = ['sw','sw','sw']
     data_type = 'triple'
-    
-    def execute(self):
-        self.args[0].value = randint(0,program.P)
-        self.args[1].value = randint(0,program.P)
-        self.args[2].value = (self.args[0].value * self.args[1].value) % program.P
 
 @base.vectorize
 class gbittriple(base.DataInstruction):
@@ -770,9 +672,6 @@ class bit(base.DataInstruction):
     code = base.opcodes['BIT']
     arg_format = ['sw']
     data_type = 'bit'
-    
-    def execute(self):
-        self.args[0].value = randint(0,1)
 
 @base.gf2n
 @base.vectorize
@@ -783,10 +682,6 @@ class square(base.DataInstruction):
     code = base.opcodes['SQUARE']
     arg_format = ['sw','sw']
     data_type = 'square'
-    
-    def execute(self):
-        self.args[0].value = randint(0,program.P)
-        self.args[1].value = (self.args[0].value * self.args[0].value) % program.P
 
 @base.gf2n
 @base.vectorize
@@ -797,11 +692,6 @@ class inverse(base.DataInstruction):
     code = base.opcodes['INV']
     arg_format = ['sw','sw']
     data_type = 'inverse'
-    
-    def execute(self):
-        self.args[0].value = randint(0,program.P)
-        import gmpy
-        self.args[1].value = int(gmpy.invert(self.args[0].value, program.P))
 
 @base.gf2n
 @base.vectorize
@@ -849,8 +739,6 @@ class asm_input(base.IOInstruction):
     def add_usage(self, req_node):
         req_node.increment((self.field_type, 'input', self.args[1]), \
                                self.get_size())
-    def execute(self):
-        self.args[0].value = _python_input("Enter player %d's input:" % self.args[1]) % program.P
 
 @base.gf2n
 class startinput(base.RawInputInstruction):
@@ -889,9 +777,6 @@ class print_mem(base.IOInstruction):
     __slots__ = []
     code = base.opcodes['PRINTMEM']
     arg_format = ['c']
-    
-    def execute(self):
-        pass
 
 @base.gf2n
 @base.vectorize
@@ -904,9 +789,6 @@ class print_reg(base.IOInstruction):
     def __init__(self, reg, comment=''):
         super(print_reg_class, self).__init__(reg, self.str_to_int(comment))
 
-    def execute(self):
-        pass
-
 @base.gf2n
 @base.vectorize
 class print_reg_plain(base.IOInstruction):
@@ -1184,12 +1066,6 @@ class eqzc(base.UnaryComparisonInstruction):
     r""" Clear comparison $c_i = (c_j \stackrel{?}{==} 0)$. """
     __slots__ = []
     code = base.opcodes['EQZC']
-    
-    def execute(self):
-        if self.args[1].value == 0:
-            self.args[0].value = 1
-        else:
-            self.args[0].value = 0
 
 @base.vectorize
 class ltzc(base.UnaryComparisonInstruction):
@@ -1227,9 +1103,6 @@ class jmp(base.JumpInstruction):
     arg_format = ['int']
     jump_arg = 0
 
-    def execute(self):
-        pass
-
 class jmpi(base.JumpInstruction):
     """ Unconditional relative jump of $c_i+1$ instructions. """
     __slots__ = []
@@ -1249,9 +1122,6 @@ class jmpnz(base.JumpInstruction):
     code = base.opcodes['JMPNZ']
     arg_format = ['ci', 'int']
     jump_arg = 1
-    
-    def execute(self):
-        pass
 
 class jmpeqz(base.JumpInstruction):
     r""" Jump $n+1$ instructions if $c_i == 0$. """
@@ -1259,9 +1129,6 @@ class jmpeqz(base.JumpInstruction):
     code = base.opcodes['JMPEQZ']
     arg_format = ['ci', 'int']
     jump_arg = 1
-    
-    def execute(self):
-        pass
 
 ###
 ### Conversions
@@ -1303,10 +1170,6 @@ class startopen(base.VarArgsInstruction):
     __slots__ = []
     code = base.opcodes['STARTOPEN']
     arg_format = itertools.repeat('s')
-    
-    def execute(self):
-        for arg in self.args[::-1]:
-            program.curr_block.open_queue.append(arg.value)
 
 @base.gf2n
 @base.vectorize
@@ -1315,10 +1178,6 @@ class stopopen(base.VarArgsInstruction):
     __slots__ = []
     code = base.opcodes['STOPOPEN']
     arg_format = itertools.repeat('cw')
-    
-    def execute(self):
-        for arg in self.args:
-            arg.value = program.curr_block.open_queue.pop()
 
 ###
 ### CISC-style instructions
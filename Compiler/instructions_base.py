@@ -1,7 +1,6 @@
 # (C) 2018 University of Bristol. See License.txt
 
 import itertools
-from random import randint
 import time
 import inspect
 import functools
@@ -463,7 +462,7 @@ def format_str_is_writeable(format_str):
 class Instruction(object):
     """
     Base class for a RISC-type instruction. Has methods for checking arguments,
-    getting byte encoding, emulating the instruction, etc.
+    getting byte encoding, etc.
     """
     __slots__ = ['args', 'arg_format', 'code', 'caller']
     count = 0
@@ -479,8 +478,6 @@ class Instruction(object):
                 self.caller = [frame[1:] for frame in inspect.stack()[1:]]
             else:
                 self.caller = None
-            if program.EMULATE:
-                self.execute()
         
         Instruction.count += 1
         if Instruction.count % 100000 == 0:
@@ -501,10 +498,6 @@ class Instruction(object):
     def get_bytes(self):
         return bytearray(self.get_encoding())
     
-    def execute(self):
-        """ Emulate execution of this instruction """
-        raise NotImplementedError('execute method must be implemented')
-    
     def check_args(self):
         """ Check the args match up with that specified in arg_format """
         for n,(arg,f) in enumerate(itertools.izip_longest(self.args, self.arg_format)):
@@ -569,21 +562,12 @@ class Instruction(object):
 class AddBase(Instruction):
     __slots__ = []
 
-    def execute(self):
-        self.args[0].value = (self.args[1].value + self.args[2].value) % program.P
-
 class SubBase(Instruction):
     __slots__ = []
 
-    def execute(self):
-        self.args[0].value = (self.args[1].value - self.args[2].value) % program.P
-
 class MulBase(Instruction):
     __slots__ = []
 
-    def execute(self):
-        self.args[0].value = (self.args[1].value * self.args[2].value) % program.P
-
 ###
 ### Basic arithmetic with immediate values
 ###
@@ -591,9 +575,6 @@ class MulBase(Instruction):
 class ImmediateBase(Instruction):
     __slots__ = ['op']
 
-    def execute(self):
-        exec('self.args[0].value = self.args[1].value.%s(self.args[2]) %% program.P' % self.op)
-
 class SharedImmediate(ImmediateBase):
     __slots__ = []
     arg_format = ['sw', 's', 'i']
@@ -726,9 +707,6 @@ class dummywrite(Instruction):
         self.arg_format = [arg.reg_type + 'w' for arg in args]
         super(dummywrite, self).__init__(*args, **kwargs)
     
-    def execute(self):
-        pass
-    
     def get_encoding(self):
         return []
 
@@ -761,8 +739,6 @@ class CISC(Instruction):
     def __init__(self, *args):
         self.args = args
         self.check_args()
-        #if EMULATE:
-        #    self.expand()
         if not program.FIRST_PASS:
             self.expand()
     
@@ -1380,10 +1380,9 @@ def LinAppSQ(b, k, f, kappa=None):
     w = TruncPr(w, 2*k, f)
     return w
 
-def sfix_sqrt(x, k, f, kappa):
-    """ 
-        Compute reciprocal square root of sfix(x) with Goldschmidt's algorithm 
-        and one round of Newton-Raphson.
+def GoldschmidtSQ(x, k, f, kappa):
+    """
+        Approximate reciprocal square root of sfix(x) with Goldschmidt's algorithm.
     """
     theta = int(ceil(log(k/5.4))) # Number of rounds
     
@@ -1399,7 +1398,14 @@ def sfix_sqrt(x, k, f, kappa):
     r = r = int(1.5*2**f) - gh
     h = TruncPr(h * (1+r), 2*k, f, kappa)
     h = 2 * h # approx. 1/sqrt (x)
-    # End of Goldschmidt
+    return h
+
+def sfix_sqrt(x, k, f, kappa):
+    """ 
+        Compute square root of sfix(x) with Goldschmidt's algorithm 
+        and one round of Newton-Raphson.
+    """
+    h = GoldschmidtSQ(x, k, f, kappa)
     H = int(3 * 2**(3*f)) - h * h * x
     H = TruncPr(H , 3*k, 2*f, kappa)
     g = H * h * x
@@ -1408,6 +1414,22 @@ def sfix_sqrt(x, k, f, kappa):
     
     return g
 
+def sfix_invsqrt(x, k, f, kappa, raw=False):
+    """ 
+        Compute reciprocal square root of sfix(x) with Goldschmidt's algorithm 
+        and one round of Newton-Raphson.
+        With ``raw`` the result is not truncated and has precision 2f+1.
+    """
+    h = GoldschmidtSQ(x, k, f, kappa)
+    H = int(3 * 2**(3*f)) - h * h * x
+    H = TruncPr(H , 3*k, 2*f, kappa)
+    g = H * h # 2/sqrt(x) with precision 2f
+    if raw:
+        return g
+    g = TruncPr(g, 2*k, f + 1, kappa)
+    
+    return g
+
 
 def cfix_invsqrt(a, k, f): 
     """ 
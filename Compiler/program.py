@@ -6,11 +6,14 @@ from Compiler.instructions_base import RegType
 import Compiler.instructions
 import Compiler.instructions_base
 import compilerLib
+import Compiler.cache
 import allocator as al
 import random
 import time
 import sys, os, errno
 import inspect
+import multiprocessing
+import StringIO
 from collections import defaultdict
 import itertools
 import math
@@ -31,6 +34,22 @@ field_types = dict(
 )
 
 
+def get_programs_dir():
+    if 'Programs' in os.listdir(os.getcwd()):
+        # compile prog in ./Programs/Source directory
+        return os.getcwd() + '/Programs'
+    else:
+        # assume source is in main SPDZ directory
+        return sys.path[0] + '/Programs'
+
+def get_program_name(args):
+    """ The name of the compiled program, i.e. the name of the source and the arguments. """
+    progname = args[0].split('/')[-1]
+    if progname.endswith('.mpc'):
+        progname = progname[:-4]
+    return '-'.join([progname] + args[1:])
+
+
 class Program(object):
     """ A program consists of a list of tapes and a scheduled order
     of execution for these tapes.
@@ -53,8 +72,7 @@ class Program(object):
         self.main_ctr = 0
         self.tapes = []
         self._curr_tape = None
-        self.EMULATE = True # defaults
-        self.FIRST_PASS = False
+        self.FIRST_PASS = False # defaults
         self.DEBUG = False
         self.main_thread_running = False
         self.allocated_mem = RegType.create_dict(lambda: USER_MEM)
@@ -68,7 +86,7 @@ class Program(object):
         self.types = {}
         Program.prog = self
         
-        self.reset_values()
+        random.seed(0)
 
     def get_args(self):
         return self.args
@@ -97,12 +115,7 @@ class Program(object):
     
     def init_names(self, args, assemblymode):
         # ignore path to file - source must be in Programs/Source
-        if 'Programs' in os.listdir(os.getcwd()):
-            # compile prog in ./Programs/Source directory
-            self.programs_dir = os.getcwd() + '/Programs'
-        else:
-            # assume source is in main SPDZ directory
-            self.programs_dir = sys.path[0] + '/Programs'
+        self.programs_dir = get_programs_dir()
         print 'Compiling program in', self.programs_dir
         
         # create extra directories if needed
@@ -122,9 +135,7 @@ class Program(object):
         self.name is input file name (minus extension) + any optional arguments.
         Used to generate output filenames
         """
-        self.name = progname
-        if len(args) > 1:
-            self.name += '-' + '-'.join(args[1:])
+        self.name = get_program_name(args)
 
     def new_tape(self, function, args=[], name=None):
         if name is None:
@@ -191,41 +202,6 @@ class Program(object):
         else:
             self.req_num += tape.req_num
     
-    def read_memory(self, filename):
-        """ Read the clear and shared memory from a file """
-        f = open(filename)
-        n = int(f.next())
-        self.mem_c = [0]*n
-        self.mem_s = [0]*n
-        mem = self.mem_c
-        done_c = False
-        for line in f:
-            line = line.split(' ')
-            a = int(line[0])
-            b = int(line[1])
-            if a != -1:
-                mem[a] = b
-            elif done_c:
-                break
-            else:
-                mem = self.mem_s
-                done_c = True
-    
-    def get_memory(self, mem_type, i):
-        if mem_type == 'c':
-            return self.mem_c[i]
-        elif mem_type == 's':
-            return self.mem_s[i]
-        raise CompilerError('Invalid memory type')
-    
-    def reset_values(self):
-        """ Reset register and memory values. """
-        for tape in self.tapes:
-            tape.reset_registers()
-        self.mem_c = range(USER_MEM + TMP_MEM)
-        self.mem_s = range(USER_MEM + TMP_MEM)
-        random.seed(0)
-    
     def write_bytes(self, outfile=None):
         """ Write all non-empty threads and schedule to files. """
         # runtime doesn't support 'new-style' parallelism yet
@@ -260,6 +236,8 @@ class Program(object):
         
         sch_file.write('0\n')
         sch_file.write(' '.join(sys.argv) + '\n')
+        sch_file.close()
+        self.public_input_file.close()
         for tape in self.tapes:
             tape.write_bytes()
     
@@ -287,17 +265,6 @@ class Program(object):
                 tape.write_str(self.options.asmoutfile + '-' + tape.name)
             tape.purge()
     
-    def emulate(self):
-        """ Emulate execution of entire program. """
-        self.reset_values()
-        for sch in self.schedule:
-            if sch[0] == 'start':
-                for tape in sch[1]:
-                    self._curr_tape = tape
-                    for block in tape.basicblocks:
-                        for line in block.instructions:
-                            line.execute()
-    
     def restart_main_thread(self):
         if self.main_thread_running:
             # wait for main thread to finish
@@ -382,6 +349,25 @@ class Program(object):
         self.security = security
         print 'Changed statistical security for comparison etc. to', security
 
+# the tape and options optimized by the workers of Tape.optimize_blocks_parallel
+_parallel_job = None
+
+def _optimize_block_job(i):
+    """ Optimize basic block ``i`` of the tape in ``_parallel_job`` in a worker.
+    Returns the output, the merged instructions and the order of the instructions. """
+    tape, options = _parallel_job
+    block = tape.basicblocks[i]
+    index = dict((id(instruction), j) for j,instruction in enumerate(block.instructions))
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        merger = tape.optimize_block(i, block, options)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    return i, (output, merger.merged, [index[id(instruction)] for instruction in block.instructions])
+
+
 class Tape:
     """ A tape contains a list of basic blocks, onto which instructions are added. """
     def __init__(self, name, program, param=-1):
@@ -403,6 +389,9 @@ class Tape:
         self.function_basicblocks = {}
         self.functions = []
         self.prevent_direct_memory_write = False
+        # bytecode of the optimized tape from the compilation cache
+        self.cache_key = None
+        self.cached_bytes = None
 
     class BasicBlock(object):
         def __init__(self, parent, name, scope, exit_condition=None):
@@ -467,7 +456,7 @@ class Tape:
         blocks with no instructions. However, these are removed when
         optimize is called. """
         if not self.purged:
-            self._is_empty = (len(self.basicblocks) == 0)
+            self._is_empty = (len(self.basicblocks) == 0 and not self.cached_bytes)
         return self._is_empty
 
     def start_new_basicblock(self, scope=False, name=''):
@@ -482,7 +471,6 @@ class Tape:
         print 'Compiling basic block', sub.name
 
     def init_registers(self):
-        self.reset_registers()
         self.reg_counter = RegType.create_dict(lambda: 0)
    
     def init_names(self, name):
@@ -496,8 +484,7 @@ class Tape:
         self.outfile = self.program.programs_dir + '/Bytecode/' + self.name + '.bc'
 
     def purge(self):
-        self._is_empty = (len(self.basicblocks) == 0)
-        del self.reg_values
+        self._is_empty = (len(self.basicblocks) == 0 and not self.cached_bytes)
         del self.basicblocks
         del self.active_basicblock
         self.purged = True
@@ -520,6 +507,15 @@ class Tape:
         if self.if_states:
             raise CompilerError('Unclosed if/else blocks')
 
+        if options.cache and not options.asmoutfile:
+            self.cache_key = Compiler.cache.tape_key(self, options)
+            self.cached_bytes = Compiler.cache.load_tape(self.program.programs_dir, self.cache_key)
+            if self.cached_bytes is not None:
+                print 'Using cached tape', self.name
+                self.req_num = self.req_tree.aggregate()
+                self.basicblocks = []
+                return
+
         print 'Processing tape', self.name, 'with %d blocks' % len(self.basicblocks)
 
         for block in self.basicblocks:
@@ -528,32 +524,11 @@ class Tape:
         # merge open instructions
         # need to do this if there are several blocks
         if (options.merge_opens and self.merge_opens) or options.dead_code_elimination:
-            for i,block in enumerate(self.basicblocks):
-                if len(block.instructions) > 0:
-                    print 'Processing basic block %s, %d/%d, %d instructions' % \
-                        (block.name, i, len(self.basicblocks), \
-                         len(block.instructions))
-                # the next call is necessary for allocation later even without merging
-                merger = al.Merger(block, options)
-                if options.dead_code_elimination:
-                    if len(block.instructions) > 10000:
-                        print 'Eliminate dead code...'
-                    merger.eliminate_dead_code()
-                if options.merge_opens and self.merge_opens:
-                    if len(block.instructions) == 0:
-                        block.used_from_scope = set()
-                        block.defined_registers = set()
-                        continue
-                    if len(block.instructions) > 10000:
-                        print 'Merging open instructions...'
-                    numrounds = merger.longest_paths_merge()
-                    if numrounds > 0:
-                        print 'Program requires %d rounds of communication' % numrounds
-                    numinv = sum(len(i.args) for i in block.instructions if isinstance(i, Compiler.instructions.startopen_class))
-                    if numinv > 0:
-                        print 'Program requires %d invocations' % numinv
-                if options.dead_code_elimination:
-                    block.instructions = filter(lambda x: x is not None, block.instructions)
+            if options.jobs > 1:
+                self.optimize_blocks_parallel(options, options.jobs)
+            else:
+                for i,block in enumerate(self.basicblocks):
+                    self.optimize_block(i, block, options)
         if not (options.merge_opens and self.merge_opens):
             print 'Not merging open instructions in tape %s' % self.name
 
@@ -582,7 +557,7 @@ class Tape:
             print 'Re-allocating...'
             allocator = al.StraightlineAllocator(REG_MAX)
             def alloc_loop(block):
-                for reg in block.used_from_scope:
+                for reg in al.sorted_regs(block.used_from_scope):
                     allocator.alloc_reg(reg, block.alloc_pool)
                 for child in block.children:
                     if child.instructions:
@@ -634,7 +609,82 @@ class Tape:
             print 'Tape requires prime bit length', self.req_bit_length['p']
             print 'Tape requires galois bit length', self.req_bit_length['2']
 
+        if self.cache_key is not None:
+            Compiler.cache.save_tape(self.program.programs_dir, self.cache_key, self.get_bytes())
+
     @unpurged
+    def optimize_block(self, i, block, options):
+        """ Merge the open instructions of a basic block and eliminate its dead code.
+        Returns the Merger. """
+        if len(block.instructions) > 0:
+            print 'Processing basic block %s, %d/%d, %d instructions' % \
+                (block.name, i, len(self.basicblocks), \
+                 len(block.instructions))
+        # the next call is necessary for allocation later even without merging
+        merger = al.Merger(block, options)
+        if options.dead_code_elimination:
+            if len(block.instructions) > 10000:
+                print 'Eliminate dead code...'
+            merger.eliminate_dead_code()
+        if options.merge_opens and self.merge_opens:
+            if len(block.instructions) == 0:
+                block.used_from_scope = set()
+                block.defined_registers = set()
+                return merger
+            if len(block.instructions) > 10000:
+                print 'Merging open instructions...'
+            numrounds = merger.longest_paths_merge()
+            if numrounds > 0:
+                print 'Program requires %d rounds of communication' % numrounds
+            numinv = sum(len(i.args) for i in block.instructions if isinstance(i, Compiler.instructions.startopen_class))
+            if numinv > 0:
+                print 'Program requires %d invocations' % numinv
+        if options.dead_code_elimination:
+            block.instructions = filter(lambda x: x is not None, block.instructions)
+        return merger
+
+    def optimize_blocks_parallel(self, options, jobs):
+        """ Run optimize_block on all non-empty basic blocks in a pool of ``jobs`` processes.
+
+        The workers are forked with a copy of the tape and send back their output,
+        the merged instructions and the new order of the instructions of each block.
+        These are applied in the order of the blocks, so the result is identical to
+        optimizing the blocks one after another. """
+        global _parallel_job
+        _parallel_job = self, options
+        results = {}
+        for i,block in enumerate(self.basicblocks):
+            if len(block.instructions) == 0:
+                results[i] = None
+        # largest blocks first to balance the load
+        blocks = sorted((i for i,block in enumerate(self.basicblocks) if i not in results),
+                        key=lambda i: -len(self.basicblocks[i].instructions))
+        pool = multiprocessing.Pool(min(jobs, max(len(blocks), 1)))
+        try:
+            next_block = 0
+            for i,result in itertools.chain(results.items(),
+                    pool.imap_unordered(_optimize_block_job, blocks)):
+                results[i] = result
+                while next_block in results:
+                    block = self.basicblocks[next_block]
+                    result = results.pop(next_block)
+                    if result is None:
+                        self.optimize_block(next_block, block, options)
+                    else:
+                        output, merged, order = result
+                        sys.stdout.write(output)
+                        for n,j in merged:
+                            al.merge_instructions(block.instructions, n, j)
+                        block.instructions = [block.instructions[j] for j in order]
+                    next_block += 1
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _parallel_job = None
+
     def _get_instructions(self):
         return itertools.chain.\
             from_iterable(b.instructions for b in self.basicblocks)
@@ -647,7 +697,10 @@ class Tape:
     @unpurged
     def get_bytes(self):
         """ Get the byte encoding of the program as an actual string of bytes. """
-        return "".join(str(i.get_bytes()) for i in self._get_instructions() if i is not None)
+        data = "".join(str(i.get_bytes()) for i in self._get_instructions() if i is not None)
+        if self.cached_bytes is not None:
+            data = self.cached_bytes + data
+        return data
     
     @unpurged
     def write_encoding(self, filename):
@@ -695,13 +748,6 @@ class Tape:
         else:
             return self.reg_counter[reg_type]
     
-    def reset_registers(self):
-        """ Reset register values to zero. """
-        self.reg_values = RegType.create_dict(lambda: [0] * INIT_REG_MAX)
-    
-    def get_value(self, reg_type, i):
-        return self.reg_values[reg_type][i]
-    
     def __str__(self):
         return self.name
 
@@ -804,14 +850,12 @@ class Tape:
         """
         Class for creating new registers. The register's index is automatically assigned
         based on the block's  reg_counter dictionary.
-        
-        The 'value' property is for emulation.
         """
-        __slots__ = ["reg_type", "program", "i", "value", "_is_active", \
+        __slots__ = ["reg_type", "program", "i", "_is_active", \
                          "size", "vector", "vectorbase", "caller", \
                          "can_eliminate"]
 
-        def __init__(self, reg_type, program, value=None, size=None, i=None):
+        def __init__(self, reg_type, program, size=None, i=None):
             """ Creates a new register.
                 reg_type must be one of those defined in RegType. """
             if Compiler.instructions_base.get_global_instruction_type() == 'gf2n':
@@ -831,8 +875,6 @@ class Tape:
                 program.reg_counter[reg_type] += size
             self.vector = []
             self.vectorbase = self
-            if value is not None:
-                self.value = value
             self._is_active = False
             self.can_eliminate = True
             if Program.prog.DEBUG:
@@ -893,16 +935,6 @@ class Tape:
             if not self._is_active:
                 self._is_active = True
         
-        @property
-        def value(self):
-            return self.program.reg_values[self.reg_type][self.i]
-        
-        @value.setter
-        def value(self, val):
-            while (len(self.program.reg_values[self.reg_type]) <= self.i):
-                self.program.reg_values[self.reg_type] += [0] * INIT_REG_MAX
-            self.program.reg_values[self.reg_type][self.i] = val
-        
         @property
         def is_active(self):
             return self._is_active
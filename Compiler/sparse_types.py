@@ -4,6 +4,41 @@
 
 from Compiler.library import *
 from Compiler.types import *
+from Compiler.oram import OptimalORAM
+
+def bitonic_merge(columns, bit_length):
+    """
+    Sorts a bitonic sequence of entries by their key with a merge network.
+    
+    All compare-exchanges of a stage are done with one vectorized comparison,
+    so the merge of :math:`n` entries takes :math:`\log n` comparison rounds.
+    
+    :param columns: list of fields, each a list of ``sint``, the first field holds the keys.
+        The keys must be ascending and then descending and the length a power of two.
+    :param bit_length: bit length of the keys
+    
+    Returns the columns sorted by ascending key.
+    """
+    columns = [list(column) for column in columns]
+    n = len(columns[0])
+    if n & (n - 1):
+        raise CompilerError('Length must be a power of 2')
+    pick = lambda column, indices: sint.concat([column[i] for i in indices])
+    step = n / 2
+    while step:
+        lower = [i for i in range(n) if not i & step]
+        upper = [i + step for i in lower]
+        swap = pick(columns[0], upper).less_than(pick(columns[0], lower), bit_length)
+        for column in columns:
+            x = pick(column, lower)
+            y = pick(column, upper)
+            t = swap * (y - x)
+            for i, value in zip(lower, (x + t).split()):
+                column[i] = value
+            for i, value in zip(upper, (y - t).split()):
+                column[i] = value
+        step /= 2
+    return columns
 
 class SparseArray(Array):
     def __init__(self, length, capacity,value_type, address=None):
@@ -79,14 +114,8 @@ class SparseArray(Array):
     @classmethod
     def get_raw_input_from(cls, player, length, capacity,value_type, address=None):
         res = cls(length, capacity, value_type, address)
-        @library.for_range(capacity)
-        def get_entry(i):
-            k = res.value_type.get_raw_input_from(player)
-            r = res.value_type.get_raw_input_from(player)
-            r2 = res.value_type.get_raw_input_from(player)
-            res._setkey(i, k)
-            res._setr(i, r)
-            res._setr2(i,r2)
+        # The input holds (key, r, r2) per entry like the memory layout
+        res.array.raw_input_from(player)
         tailpointer = sint.get_raw_input_from(player).reveal()
         res.writable(tailpointer)
         return res, tailpointer
@@ -157,5 +186,76 @@ class sfixSparseRowMatrix(Matrix):
 
     def __getitem__(self, index):
         return sfixSparseArray(self.columns,self.rowcap, self.matrix[index].address)
+
+
+class ORAMSparseRowMatrix(object):
+    """
+    Sparse rows of ``(key, r, r2)`` entries in one ORAM, like ``SparseRowMatrix`` sorted 
+    by key and padded with the key ``columns``.
+    
+    Each row takes the smallest power of two of slots above its capacity, so the ORAM grows 
+    with the capacity instead of ``columns`` and every row ends with padding. A lookup is a 
+    binary search over the slots of the row with :math:`\log_2` of them plus one ORAM reads 
+    instead of a scan of the row. Keys that are not in the row read as 0 and empty.
+    """
+    def __init__(self, rows, columns, rowcap, value_type=sint):
+        self.rows = rows
+        self.columns = columns
+        self.rowcap = rowcap
+        self.value_type = value_type
+        self.slots = 2 ** rowcap.bit_length()
+        self.key_length = columns.bit_length() + 1
+        self.oram = OptimalORAM(rows * self.slots, value_type=value_type, value_length=3)
+    
+    def __getitem__(self, index):
+        return ORAMSparseArray(self, index)
+
+class ORAMSparseArray(object):
+    def __init__(self, matrix, row):
+        self.matrix = matrix
+        self.offset = row * matrix.slots
+    
+    def _read(self, slot):
+        entry, _ = self.matrix.oram.read(self.offset + slot)
+        return [self.matrix.value_type.conv(x) for x in entry]
+    
+    def get_entry(self, key):
+        """ Returns the rating, squared rating and whether the rating is set. """
+        # The number of smaller keys is the slot of the key if the row contains it
+        slot = sint(0)
+        step = self.matrix.slots / 2
+        while step:
+            k, _, _ = self._read(slot + step - 1)
+            slot += step * k.less_than(key, self.matrix.key_length)
+            step /= 2
+        k, r1, r2 = self._read(slot)
+        found = k.equal(key, self.matrix.key_length)
+        return found * r1, found * r2, found
+    
+    def get_pair(self, key):
+        r1, r2, _ = self.get_entry(key)
+        return r1, r2
+    
+    def get_rating(self, key):
+        return self.get_pair(key)[0]
     
+    def load(self, sparse):
+        """ Copies all entries of ``sparse``, the ``SparseArray`` of the same row, and pads the row. """
+        @library.for_range(sparse.capacity)
+        def f(i):
+            self.matrix.oram[self.offset + i] = (sparse._getkey(i), sparse._getr(i), sparse._getr2(i))
+        @library.for_range(sparse.capacity, self.matrix.slots)
+        def f(i):
+            self.matrix.oram[self.offset + i] = (self.matrix.columns, 0, 0)
 
+class sfixORAMSparseRowMatrix(ORAMSparseRowMatrix):
+    def __getitem__(self, index):
+        return sfixORAMSparseArray(self, index)
+
+class sfixORAMSparseArray(ORAMSparseArray):
+    def get_entry(self, key):
+        r1, r2, b = ORAMSparseArray.get_entry(self, key)
+        return sfix(r1), sfix(r2), b
+    
+    def load(self, sparse):
+        ORAMSparseArray.load(self, sparse.array)
@@ -227,6 +227,41 @@ class _register(Tape.Register, _number):
         else:
             direct_inst(self, address)
 
+    @classmethod
+    def load_vector(cls, address, size, step=1):
+        """ Load the values at ``address``, ``address + step``, ... into one vector of ``size``. """
+        if isinstance(address, (int, long)) and step == 1:
+            return cls.load_mem(address, size=size)
+        return cls.load_mem(cls._vector_addresses(address, size, step), size=size)
+
+    def store_vector(self, address, step=1):
+        """ Store the vector at ``address``, ``address + step``, ... """
+        if isinstance(address, (int, long)) and step == 1:
+            self.store_in_mem(address)
+        else:
+            self.store_in_mem(self._vector_addresses(address, self.size, step))
+
+    @staticmethod
+    def _vector_addresses(address, size, step):
+        # vectorized indirect memory access uses a vector of addresses
+        addresses = regint(size=size)
+        addresses.create_vector_elements()
+        movint(addresses.vector[0], regint.conv(address))
+        step = regint(step)
+        for i in range(1, size):
+            addint(addresses.vector[i], addresses.vector[i - 1], step)
+        return addresses
+
+    @classmethod
+    def load_gather(cls, address, offsets):
+        """ Load the values at ``address + offset`` for all ``offsets`` into one vector. """
+        addresses = regint(size=len(offsets))
+        addresses.create_vector_elements()
+        address = regint.conv(address)
+        for reg, offset in zip(addresses.vector, offsets):
+            addint(reg, address, regint(offset))
+        return cls.load_mem(addresses, size=len(offsets))
+
     @classmethod
     def prep_res(cls, other):
         return cls()
@@ -984,6 +1019,43 @@ class sint(_secret, _int):
         stopinput(player, res)
         return res
 
+    @classmethod
+    def get_raw_inputs_from(cls, player, n):
+        """ Vector of ``n`` raw inputs from ``player``, received in a single round. """
+        res = cls(size=n)
+        res.create_vector_elements()
+        startinput(player, n)
+        stopinput(player, *res.vector)
+        return res
+
+    def sum(self):
+        """ Local sum of the elements of a vector. """
+        if self.size == 1:
+            return self
+        self.create_vector_elements()
+        def add(a, b):
+            res = sint(size=1)
+            adds(res, a, b)
+            return res
+        return util.tree_reduce(add, self.vector)
+
+    @classmethod
+    def concat(cls, items):
+        """ Vector of the scalar values ``items``. """
+        res = cls(size=len(items))
+        res.create_vector_elements()
+        for reg, item in zip(res.vector, items):
+            movs(reg, cls.conv(item))
+        return res
+
+    def split(self):
+        """ The elements of a vector as scalar values. """
+        self.create_vector_elements()
+        res = [sint(size=1) for i in range(self.size)]
+        for reg, element in zip(res, self.vector):
+            movs(reg, element)
+        return res
+
     @classmethod
     def receive_from_client(cls, n, client_id, message_type=ClientMessageType.NoType):
         """ Securely obtain shares of n values input by a client """
@@ -1030,6 +1102,22 @@ class sint(_secret, _int):
         else:
             writesocketshare(client_id, message_type, *values)
 
+    def write_to_file(self):
+        """ Append the shares and MAC shares of all elements to ``Persistence/Transactions-P<player>.data`` """
+        self.create_vector_elements()
+        writesharestofile(*self.vector)
+
+    @classmethod
+    def read_from_file(cls, start, size=1):
+        """ Read ``size`` shares and MAC shares from ``Persistence/Transactions-P<player>.data``
+        at byte position ``start``. Returns the position after them (-1 at the end of the file,
+        -2 if the file is missing) and the shares as vector """
+        res = cls(size=size)
+        res.create_vector_elements()
+        stop = regint()
+        readsharesfromfile(regint.conv(start), stop, *res.vector)
+        return stop, res
+
     @vectorized_classmethod
     def load_mem(cls, address, mem_type=None):
         return cls._load_mem(address, ldms, ldmsi)
@@ -1171,6 +1259,15 @@ class sgf2n(_secret, _gf2n):
         gstopinput(player, res)
         return res
 
+    @classmethod
+    def get_raw_inputs_from(cls, player, n):
+        """ Vector of ``n`` raw inputs from ``player``, received in a single round. """
+        res = cls(size=n)
+        res.create_vector_elements()
+        gstartinput(player, n)
+        gstopinput(player, *res.vector)
+        return res
+
     def add(self, other):
         if isinstance(other, sgf2nint):
             return NotImplemented
@@ -1944,6 +2041,10 @@ class sfix(_number):
     def sqrt(self):
         return sfix(library.sfix_sqrt(self.v, self.k, self.f, self.kappa))
 
+    @vectorize
+    def invsqrt(self):
+        return sfix(library.sfix_invsqrt(self.v, self.k, self.f, self.kappa))
+
     @vectorize
     def compute_reciprocal(self):
         return sfix(library.FPDiv(cint(2) ** self.f, self.v, self.k, self.f, self.kappa, True))
@@ -2239,10 +2340,6 @@ class sfloat(_number):
     def __ne__(self, other):
         return 1 - (self == other)
 
-    def value(self):
-        """ Gets actual floating point value, if emulation is enabled. """
-        return (1 - 2*self.s.value)*(1 - self.z.value)*self.v.value/float(2**self.p.value)
-
     def reveal(self):
         return cfloat(self.v.reveal(), self.p.reveal(), self.z.reveal(), self.s.reveal())
 
@@ -2345,6 +2442,22 @@ class Array(object):
                 self[i] = j
         return self
 
+    def get_vector(self, base=0, size=None):
+        """ Load ``size`` consecutive elements from index ``base`` on into one vector. """
+        if size is None:
+            size = self.length - base
+        return self.value_type.load_vector(self.get_address(base), size)
+
+    def assign_vector(self, vector, base=0):
+        """ Store the elements of ``vector`` from index ``base`` on. """
+        vector.store_vector(self.get_address(base))
+
+    def raw_input_from(self, player):
+        """ Fill the array with raw inputs from ``player`` in a single round. """
+        if self.length:
+            self.value_type.get_raw_inputs_from(player, self.length).store_vector(self.address)
+        return self
+
     def assign_all(self, value):
         mem_value = self.value_type.MemValue(value)
         n_loops = 8 if len(self) > 2**20 else 1
@@ -2373,6 +2486,14 @@ class Matrix(object):
         return Array(self.columns, self.value_type, \
                          self.address + index * self.columns)
 
+    def get_column(self, index):
+        """ Load the column ``index`` into one vector. """
+        return self.value_type.load_vector(self.address + index, self.rows, self.columns)
+
+    def assign_column(self, index, vector):
+        """ Store the elements of ``vector`` in the column ``index``. """
+        vector.store_vector(self.address + index, self.columns)
+
     def __len__(self):
         return self.rows
 
@@ -2488,6 +2609,13 @@ class sfixArray(Array):
     def get_address(self, index):
         return self.array.get_address(index)
 
+    def get_vector(self, base=0, size=None):
+        return sfix(self.array.get_vector(base, size))
+
+    def raw_input_from(self, player):
+        self.array.raw_input_from(player)
+        return self
+
 class sfixMatrix(Matrix):
     def __init__(self, rows, columns, address=None):
         self.rows = rows
@@ -2500,6 +2628,9 @@ class sfixMatrix(Matrix):
     def __getitem__(self, index):
         return sfixArray(self.columns, self.multi_array[index].address)
 
+    def get_column(self, index):
+        return sfix(self.multi_array.get_column(index))
+
     def get_address(self):
         return self.multi_array.get_address()
     
@@ -0,0 +1,111 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Benchmark of the dependency graphs of the Merger in ``Compiler/allocator.py``.
+
+Builds the graph of a synthetic basic block with ``SparseDiGraph`` and ``ArrayDiGraph``,
+merges the opens of every round and sorts it topologically like the Merger.
+Every graph runs in its own process to measure its memory.
+
+    python Scripts/bench_graph.py [instructions] [graphs]
+
+e.g. ``python Scripts/bench_graph.py 10000000 ArrayDiGraph``.
+"""
+
+import itertools
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Compiler.graph import SparseDiGraph, ArrayDiGraph, topological_sort
+
+# Every round has OPENS_PER_ROUND opens after COMPUTE_PER_ROUND other instructions
+OPENS_PER_ROUND = 1000
+COMPUTE_PER_ROUND = 9000
+ROUND = OPENS_PER_ROUND + COMPUTE_PER_ROUND
+
+def is_open(j):
+    return j % ROUND >= COMPUTE_PER_ROUND
+
+def synthetic_block(n, seed=0):
+    """
+    The edges of a block with ``n`` instructions in rounds of computations and opens.
+    The computations mostly read recently defined registers, including the opens of the last round.
+    The opens only read the computations of their round, so they can be merged.
+    Yields the list of predecessors of each instruction.
+    """
+    rand = random.Random(seed)
+    for j in xrange(n):
+        preds = set()
+        first = j - j % ROUND
+        for _ in range(rand.randint(1, 3)):
+            if is_open(j):
+                preds.add(rand.randrange(first, first + COMPUTE_PER_ROUND))
+            elif j > 0:
+                preds.add(max(0, j - int(rand.expovariate(0.05)) - 1))
+        yield sorted(preds)
+
+def merge_nodes(G, i, j):
+    """ Merge node j into i, removing node j, as ``Merger.merge_nodes`` """
+    if j in G[i]:
+        G.remove_edge(i, j)
+    if i in G[j]:
+        G.remove_edge(j, i)
+    G.add_edges_from(zip(itertools.cycle([i]), G[j], [G.weights[(j,k)] for k in G[j]]))
+    G.add_edges_from(zip(G.pred[j], itertools.cycle([i]), [G.weights[(k,j)] for k in G.pred[j]]))
+    G.get_attr(i, 'merges').append(j)
+    G.remove_node(j)
+
+def run(graph_class, n):
+    """
+    Returns the times to build, merge and sort the graph and the memory in MB.
+    """
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    G = graph_class(n)
+    for j, preds in enumerate(synthetic_block(n)):
+        G.add_node(j, is_source=True)
+        for i in preds:
+            G.add_edge(i, j)
+            G.set_attr(j, 'is_source', G.get_attr(i, 'is_source') and G.get_attr(j, 'is_source'))
+        if is_open(j):
+            G.add_node(j, merges=[])
+    built = time.time()
+
+    for first in range(COMPUTE_PER_ROUND, n, ROUND):
+        for j in range(first + 1, min(first + OPENS_PER_ROUND, n)):
+            merge_nodes(G, first, j)
+    merged = time.time()
+
+    topological_sort(G)
+    sorted_ = time.time()
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory) / 1024.
+    return built - start, merged - built, sorted_ - merged, memory
+
+def _worker(args):
+    graph_class, n = args
+    return run(graph_class, n)
+
+def benchmark(n, graph_classes):
+    print "{:14} {:>8} {:>8} {:>8} {:>10}".format("graph", "build", "merge", "sort", "memory")
+    for graph_class in graph_classes:
+        pool = multiprocessing.Pool(1)
+        try:
+            result = pool.apply(_worker, ((graph_class, n),))
+        finally:
+            pool.close()
+            pool.join()
+        print "{:14} {:7.1f}s {:7.1f}s {:7.1f}s {:7.0f} MB".format(graph_class.__name__, *result)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    graphs = {'SparseDiGraph': SparseDiGraph, 'ArrayDiGraph': ArrayDiGraph}
+    names = sys.argv[2:] or ['SparseDiGraph', 'ArrayDiGraph']
+    benchmark(n, [graphs[name] for name in names])
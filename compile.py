@@ -17,6 +17,7 @@
 
 from optparse import OptionParser
 import Compiler
+import Compiler.cache
 
 def main():
     usage = "usage: %prog [options] filename [args]"
@@ -37,7 +38,7 @@ def main():
     parser.add_option("-d", "--debug", action="store_true", dest="debug",
                       help="keep track of trace for debugging")
     parser.add_option("-e", "--emulate", action="store_true", dest="emulate", default=False,
-                      help="emulate register values for debugging")
+                      help="emulate the compiled program in the clear (see Compiler/emulator.py)")
     parser.add_option("-c", "--comparison", dest="comparison", default="log",
                       help="comparison variant: log|plain|inv|sinv")
     parser.add_option("-r", "--noreorder", dest="reorder_between_opens",
@@ -62,20 +63,31 @@ def main():
                       help="continuous computation")
     parser.add_option("-s", "--stop", action="store_true", dest="stop",
                       help="stop on register errors")
+    parser.add_option("-j", "--jobs", type="int", dest="jobs", default=1,
+                      help="number of processes to optimize basic blocks in parallel")
+    parser.add_option("--cache", action="store_true", dest="cache", default=False,
+                      help="reuse the output of previous compilations in Programs/Cache")
     options,args = parser.parse_args()
     if len(args) < 1:
         parser.print_help()
         return
 
     def compilation():
+        if options.cache:
+            cache = Compiler.cache.ProgramCache(Compiler.program.get_programs_dir(), args, options)
+            if cache.restore():
+                return
+            cache.track()
         prog = Compiler.run(args, options, param=int(options.param),
-                            merge_opens=options.merge_opens, emulate=options.emulate,
+                            merge_opens=options.merge_opens,
                             assemblymode=options.assemblymode, debug=options.debug)
         prog.write_bytes(options.outfile)
 
         if options.asmoutfile:
             for tape in prog.tapes:
                 tape.write_str(options.asmoutfile + '-' + tape.name)
+        if options.cache:
+            cache.save()
 
     if options.profile:
         import cProfile
@@ -85,5 +97,9 @@ def main():
     else:
         compilation()
 
+    if options.emulate:
+        from Compiler import emulator
+        emulator.emulate(args, options)
+
 if __name__ == '__main__':
     main()
@@ -3,6 +3,208 @@
 # see https://opensource.org/licenses/MIT
 
 from math import sqrt, isnan
+from itertools import islice, izip
+import numpy
+from scipy.sparse import issparse, csr_matrix
+
+def as_matrix(values, dtype):
+    """
+    Converts ``values`` to a ``numpy.ndarray``, or to a ``scipy.sparse.csr_matrix`` if it is sparse.
+    Both support element access with ``M[u, i]``.
+    """
+    if issparse(values):
+        return csr_matrix(values, dtype=dtype)
+    return numpy.array(values, dtype=dtype)
+
+def cosine_matrix(R, B):
+    """
+    Computes the cosine similarities between all rows of ``R`` at once.
+    
+    The dot products :math:`R R^T` and the masked norms :math:`R^2 B^T` are 
+    evaluated as matrix products. The result equals the row-wise ``cosine`` 
+    of the baseline filters.
+    
+    :param R: matrix with the rating values :math:`r_{ui}`
+    :param B: matrix of boolean values :math:`b_{ui}`
+    
+    Returns a dense ``numpy.ndarray`` with the similarities, or a 
+    ``scipy.sparse.csr_matrix`` if ``R`` and ``B`` are sparse.
+    """
+    if issparse(R):
+        return sparse_cosine_matrix(R, B)
+    R = numpy.asarray(R, dtype=float)
+    B = numpy.asarray(B, dtype=float)
+    D = R.dot(R.T)
+    Su = (R**2).dot(B.T) # su for (u,v), sv is the transposed entry
+    S = numpy.zeros(D.shape)
+    defined = D != 0
+    norm = numpy.sqrt(Su) * numpy.sqrt(Su.T)
+    S[defined] = D[defined] / norm[defined]
+    return S
+
+def sparse_cosine_matrix(R, B):
+    """
+    Computes the cosine similarities between all rows of the sparse matrix ``R``.
+    
+    Only co-rated entries are touched, so memory is proportional to the number 
+    of ratings and co-rating pairs instead of :math:`n \\times m`.
+    
+    :param R: sparse matrix with the rating values :math:`r_{ui}`
+    :param B: sparse matrix of boolean values :math:`b_{ui}`
+    
+    Returns a ``scipy.sparse.csr_matrix`` with the non-zero similarities.
+    """
+    R = csr_matrix(R, dtype=float)
+    B = csr_matrix(B, dtype=float)
+    D = R.dot(R.T).tocsr()
+    Su = R.multiply(R).dot(B.T).tocsr()
+    # su * sv for every co-rated pair
+    norm2 = Su.multiply(Su.T).tocsr()
+    norm2.eliminate_zeros()
+    S = D.multiply(norm2.power(-0.5)).tocsr()
+    S.eliminate_zeros()
+    return S
+
+def neighbour_index(S):
+    """
+    Sorts the positive similarities of every row of ``S`` in descending order.
+    
+    Neighbours with a similarity :math:`\\leq 0` never contribute to a k-NN prediction 
+    and the row itself is skipped, so they are left out of the index. Neighbours with 
+    the same similarity are sorted by id.
+    
+    :param S: dense or CSR similarity matrix
+    
+    Returns two lists with one ``numpy.ndarray`` per row: the neighbours and their similarities.
+    """
+    neighbours = []
+    sims = []
+    for u in range(S.shape[0]):
+        if issparse(S):
+            candidates = S.indices[S.indptr[u]:S.indptr[u+1]]
+            values = S.data[S.indptr[u]:S.indptr[u+1]]
+        else:
+            candidates = numpy.arange(S.shape[1])
+            values = S[u]
+        keep = (values > 0) & (candidates != u)
+        candidates = candidates[keep]
+        values = values[keep]
+        order = numpy.lexsort((candidates, -values)) # ties by neighbour id
+        neighbours.append(candidates[order])
+        sims.append(values[order])
+    return neighbours, sims
+
+def bs_walk(candidates, k, f):
+    """
+    Binary search of precision :math:`f\\,'` for the k-NN threshold on a walk over candidates.
+    
+    Only the top :math:`k+1` candidates decide the search. Afterwards the walk continues 
+    just as long as the similarities exceed the threshold.
+    
+    :param candidates: iterator over pairs :math:`(s, r)` of all peers that rated the target, 
+        in descending order of the similarity :math:`s > 0`
+    :param k: parameter for :math:`k`-nearest neighbour algorithm
+    :param f: precision of the binary search :math:`f\\,'`
+    
+    Returns the prediction :math:`\\hat{r}_{ui}`.
+    """
+    # lowest threshold the search can reach
+    epsilon_min = 2**(-1)
+    for e in range(2, f):
+        epsilon_min -= 2**(-e)
+    
+    top = []
+    for s, r in candidates:
+        if s < epsilon_min:
+            break
+        top.append((s, r))
+        if len(top) > k:
+            break
+    
+    epsilon = 2**(-1)
+    for e in range(2, f):
+        c = 0
+        for s, _ in top:
+            if s >= epsilon:
+                c += 1
+        delta = 2**(-e)
+        if c > k:
+            epsilon += delta
+        if c < k:
+            epsilon -= delta
+    
+    peers = [(s, r) for (s, r) in top if s >= epsilon]
+    if len(peers) == len(top):
+        for s, r in candidates:
+            if s < epsilon:
+                break
+            peers.append((s, r))
+    
+    r = 0
+    n = 0
+    for s, r_v in peers:
+        r += s * r_v
+        n += s
+    if n == 0:
+        return 0
+    else :
+        return r / n
+
+def sort_walk(candidates, k):
+    """
+    :math:`k`-nearest neighbour prediction on a walk over the first :math:`k` candidates.
+    
+    :param candidates: iterator over pairs :math:`(s, r)` of all peers that rated the target, 
+        in descending order of the similarity :math:`s > 0`
+    :param k: parameter for :math:`k`-nearest neighbour algorithm
+    
+    Returns the prediction :math:`\\hat{r}_{ui}`.
+    """
+    rating = 0
+    norm = 0
+    for s, r in islice(candidates, k):
+        rating += r * s
+        norm += s
+    if norm == 0:
+        return 0
+    return rating / norm
+
+def bs_predictions(S, R, k, f):
+    """
+    Vectorized binary search of precision :math:`f\\,'` for several predictions at once.
+    
+    Each row holds the candidates of one prediction. Candidates that must not be 
+    counted (e.g. the target itself) need a similarity of 0.
+    
+    :param S: :math:`p` times :math:`c` matrix with the similarities of the candidates
+    :param R: :math:`p` times :math:`c` matrix with the ratings of the candidates
+    :param k: parameter for :math:`k`-nearest neighbour algorithm
+    :param f: precision of the binary search :math:`f\\,'`
+    
+    Returns a ``numpy.ndarray`` with the :math:`p` predictions.
+    """
+    epsilon = numpy.empty(S.shape[0])
+    epsilon.fill(2**(-1))
+    for e in range(2, f):
+        c = (S >= epsilon[:, None]).sum(axis=1)
+        delta = 2**(-e)
+        epsilon += delta * (c > k)
+        epsilon -= delta * (c < k)
+    peers = S >= epsilon[:, None]
+    r = (S * R * peers).sum(axis=1)
+    n = (S * peers).sum(axis=1)
+    predictions = numpy.zeros(S.shape[0])
+    defined = n != 0
+    predictions[defined] = r[defined] / n[defined]
+    return predictions
+
+def submatrix(M, rows, columns):
+    """
+    Returns ``M[rows][:, columns]`` as dense ``numpy.ndarray`` for dense and sparse ``M``.
+    """
+    if issparse(M):
+        return M[rows][:, columns].toarray()
+    return M[rows][:, columns]
 
 class BaselineUBCF(object):
     """
@@ -13,33 +215,74 @@ class BaselineUBCF(object):
     :param m: number of items :math:`m`
     :type m: int
     :param ratings: :math:`n` times :math:`m` matrix with the rating values :math:`r_{ui}`
-    :type ratings: list of lists
+    :type ratings: list of lists, ``numpy.ndarray`` or ``scipy.sparse`` matrix
     :param bitratings: :math:`n` times :math:`m`  matrix of boolean values :math:`b_{ui}`.
-    :type bitratings: list of lists
+    :type bitratings: list of lists, ``numpy.ndarray`` or ``scipy.sparse`` matrix
+    
+    Sparse matrices are kept in CSR format and yield a sparse similarity model.
     """
     def __init__(self, n, m, ratings, bitratings):
         """
         Constructor
         """
-        self.S = [[0 for _ in range(n)] for _ in range(n)] # Similarity model
+        self.S = numpy.zeros((n, n)) # Similarity model
         self.n = n # Number of users
         self.m = m # Number of items
-        self.R = ratings # Rating matrix
-        self.B = bitratings # Boolean ratings
+        self.R = as_matrix(ratings, float) # Rating matrix
+        self.B = as_matrix(bitratings, int) # Boolean ratings
+        self.neighbours = None # Optional neighbour index
+        self.neighbour_sims = None
     
-    def build_model(self):
+    def build_model_loop(self):
         """
         Builds the user-similarity model.
         
         Call this method before any prediction method.
         """
+        self.neighbours = None
         for u in range(self.n):
             for v in range(u,self.n):
                 s_uv = self.cosine(u,v)
-                self.S[u][v] = s_uv
-                self.S[v][u] = s_uv
+                self.S[u, v] = s_uv
+                self.S[v, u] = s_uv
                 print "{:5d} to {:5d}\r".format(u,v),
             
+    def build_model_numpy(self):
+        """
+        Builds the user-similarity model with matrix products.
+        
+        ``S`` becomes a dense ``numpy.ndarray``, or a ``scipy.sparse.csr_matrix`` 
+        for sparse ratings. The values equal the ones of ``build_model_loop`` 
+        within float tolerance.
+        
+        Call this method before any prediction method.
+        """
+        self.neighbours = None
+        self.S = cosine_matrix(self.R, self.B)
+    
+    # Use vectorized model building per default
+    build_model = build_model_numpy
+    
+    def build_index(self):
+        """
+        Builds the neighbour index with the peers of every user sorted by similarity.
+        
+        Call this method after ``build_model``. The prediction methods then walk 
+        over the top peers instead of scanning all users.
+        """
+        self.neighbours, self.neighbour_sims = neighbour_index(self.S)
+    
+    def rated_peers(self, u, i):
+        """
+        Walks the neighbour index of user :math:`u`.
+        
+        Yields the pairs :math:`(s_{uv}, r_{vi})` of all peers :math:`v` that rated item :math:`i`,
+        most similar peers first.
+        """
+        for v, s in izip(self.neighbours[u], self.neighbour_sims[u]):
+            if self.B[v, i] == 1:
+                yield s, self.R[v, i]
+            
     def print_model(self):
         """
         Prints the first 10 times 10 similarity values :math:`s_{uv}` to console.
@@ -47,7 +290,7 @@ class BaselineUBCF(object):
         print "S"
         for u in range(min(self.n,10)):
             for v in range(min(self.n,10)):
-                print "{: 1.5f}".format(self.S[u][v]),
+                print "{: 1.5f}".format(self.S[u, v]),
             print ""
         
                 
@@ -58,19 +301,19 @@ class BaselineUBCF(object):
         print "R"
         for u in range(min(self.n,10)):
             for i in range(min(self.m,10)):
-                print "{: 1.5f}".format(self.R[u][i]),
+                print "{: 1.5f}".format(self.R[u, i]),
             print ""
         
         print "R2"    
         for u in range(min(self.n,10)):
             for i in range(min(self.m,10)):
-                print "{: 1.5f}".format(self.R[u][i]**2),
+                print "{: 1.5f}".format(self.R[u, i]**2),
             print ""
         
         print "B"    
         for u in range(min(self.n,10)):
             for i in range(min(self.m,10)):
-                print "{: 1.5f}".format(self.B[u][i]),
+                print "{: 1.5f}".format(self.B[u, i]),
             print ""
                 
     def cosine(self, u,v):
@@ -84,9 +327,9 @@ class BaselineUBCF(object):
         su = 0
         sv = 0
         for i in range(self.m):
-            d += self.R[u][i] * self.R[v][i]
-            su += self.R[u][i]**2 * self.B[v][i]
-            sv += self.R[v][i]**2 * self.B[u][i]
+            d += self.R[u, i] * self.R[v, i]
+            su += self.R[u, i]**2 * self.B[v, i]
+            sv += self.R[v, i]**2 * self.B[u, i]
         if d == 0:
             return 0
         else :
@@ -103,6 +346,13 @@ class BaselineUBCF(object):
         :param k: parameter for :math:`k`-nearest neighbour algorithm
 
         Returns the prediction :math:`\hat{r}_{ui}`.
+        
+        .. note:: The comparison in ``find_minpeer`` is inverted: once :math:`k` peers are 
+            selected, the least similar peer seen so far replaces the current minimum. So this 
+            is not a k-NN selection. It is kept unchanged, because the results of earlier 
+            evaluations refer to it. ``nn_prediction_top_k`` selects the :math:`k` most similar 
+            peers. The neighbour index is not used here, since the selection depends on the 
+            order of the peer ids.
         """
         # Find K best peers
         
@@ -111,14 +361,14 @@ class BaselineUBCF(object):
         for v in range(self.n):
             if v == u: # skip target user
                 continue
-            if self.B[v][i] == 1:
+            if self.B[v, i] == 1:
                 candidates.append(v)
         
         peers = []
         def find_minpeer(peers):
             min_peer = peers[0]
             for v in peers:
-                if self.S[u][v] < self.S[u][min_peer]:
+                if self.S[u, v] < self.S[u, min_peer]:
                     min_peer = v
             return min_peer
         
@@ -127,17 +377,48 @@ class BaselineUBCF(object):
                 peers.append(v)
                 min_peer = find_minpeer(peers)
             
-            if self.S[u][v] < self.S[u][min_peer]:
+            if self.S[u, v] < self.S[u, min_peer]:
                 peers.remove(min_peer)
                 peers.append(v)
                 min_peer = find_minpeer(peers)
         #print peers
+        return self._weight_peers(u, i, peers)
+    
+    def nn_prediction_top_k(self,u,i,k):
+        """
+        Predicts the rating :math:`\hat{r}_{ui}` with the :math:`k` most similar peers.
+        
+        :param u: target user :math:`u`
+        :param i: target item :math:`i`
+        :param k: parameter for :math:`k`-nearest neighbour algorithm
+
+        Returns the prediction :math:`\hat{r}_{ui}`.
+        
+        Only peers with a similarity :math:`\geq 0` are weighted. With a neighbour index 
+        (see ``build_index``) the first :math:`k` peers of the walk are used, which gives 
+        the same prediction.
+        """
+        if self.neighbours is not None:
+            return sort_walk(self.rated_peers(u, i), k)
+        
+        candidates = []
+        for v in range(self.n):
+            if v != u and self.B[v, i] == 1:
+                candidates.append(v)
+        # ties by id as in the neighbour index
+        peers = sorted(candidates, key=lambda v: -self.S[u, v])[:k]
+        return self._weight_peers(u, i, peers)
+    
+    def _weight_peers(self, u, i, peers):
+        """
+        Returns the prediction :math:`\hat{r}_{ui}` weighted over the peers with a similarity :math:`\geq 0`.
+        """
         rating = 0
         norm = 0
         for v in peers:
-            if self.S[u][v] >= 0:
-                rating += self.R[v][i] * self.S[u][v]
-                norm += self.S[u][v]
+            if self.S[u, v] >= 0:
+                rating += self.R[v, i] * self.S[u, v]
+                norm += self.S[u, v]
             #print "r: {}, n: {}".format(rating, norm)
         if norm == 0:
             return 0
@@ -155,14 +436,19 @@ class BaselineUBCF(object):
         :param f: precision of the binary search :math:`f\,'`
 
         Returns the prediction :math:`\hat{r}_{ui}`.  
+        
+        With a neighbour index (see ``build_index``) the search only walks over the top peers.
         """
+        if self.neighbours is not None:
+            return bs_walk(self.rated_peers(u, i), k, f)
+        
         epsilon = 2**(-1)
        
         for e in range(2, f):
             c = 0
             for v in range(self.n):
-                if u != v and self.S[u][v] >= epsilon:
-                    c += self.B[v][i]
+                if u != v and self.S[u, v] >= epsilon:
+                    c += self.B[v, i]
             delta = 2**(-e)
             if c > k:
                 epsilon += delta
@@ -172,9 +458,9 @@ class BaselineUBCF(object):
         r = 0
         n = 0 
         for v in range(self.n):
-            if u != v and self.S[u][v] >= epsilon and self.B[v][i] == 1:
-                r += self.S[u][v] * self.R[v][i]
-                n += self.S[u][v]
+            if u != v and self.S[u, v] >= epsilon and self.B[v, i] == 1:
+                r += self.S[u, v] * self.R[v, i]
+                n += self.S[u, v]
                 
         if n == 0:
             return 0
@@ -184,6 +470,32 @@ class BaselineUBCF(object):
         
     # Use approx knn per default 
     nn_prediction=nn_prediction_bs            
+    
+    def predict_many(self, pairs, k, f):
+        """
+        Predicts several ratings :math:`\\hat{r}_{ui}` at once. Same result as ``nn_prediction_bs``.
+        
+        The pairs are grouped by target item :math:`i`. Each group shares the peers 
+        that rated :math:`i` and runs the binary search vectorized.
+        
+        :param pairs: sequence of pairs :math:`(u, i)`
+        :param k: parameter for :math:`k`-nearest neighbour algorithm
+        :param f: precision of the binary search :math:`f\\,'`
+        
+        Returns a ``numpy.ndarray`` with the predictions in the order of ``pairs``.
+        """
+        pairs = numpy.asarray(pairs, dtype=int).reshape(-1, 2)
+        users = pairs[:, 0]
+        items = pairs[:, 1]
+        predictions = numpy.zeros(len(pairs))
+        for i in numpy.unique(items):
+            group = numpy.flatnonzero(items == i)
+            peers = numpy.flatnonzero(submatrix(self.B, slice(None), [i]).ravel() == 1)
+            S = submatrix(self.S, users[group], peers)
+            S[peers == users[group][:, None]] = 0 # skip target user
+            R = submatrix(self.R, peers, [i]).T
+            predictions[group] = bs_predictions(S, R, k, f)
+        return predictions
         
             
 
@@ -197,30 +509,71 @@ class BaselineIBCF(object):
     :param m: number of items :math:`m`
     :type m: int
     :param ratings: :math:`n` times :math:`m` matrix with the rating values :math:`r_{ui}`
-    :type ratings: list of lists
+    :type ratings: list of lists, ``numpy.ndarray`` or ``scipy.sparse`` matrix
     :param bitratings: :math:`n` times :math:`m`  matrix of boolean values :math:`b_{ui}`.
-    :type bitratings: list of lists
+    :type bitratings: list of lists, ``numpy.ndarray`` or ``scipy.sparse`` matrix
+    
+    Sparse matrices are kept in CSR format and yield a sparse similarity model.
     """
     def __init__(self, n, m, ratings, bitratings):
-        self.S = [[0 for _ in range(m)] for _ in range(m)] # Similarity model
+        self.S = numpy.zeros((m, m)) # Similarity model
         self.n = n # Number of users
         self.m = m # Number of items
-        self.R = ratings # Rating matrix
-        self.B = bitratings # Boolean ratings
+        self.R = as_matrix(ratings, float) # Rating matrix
+        self.B = as_matrix(bitratings, int) # Boolean ratings
+        self.neighbours = None # Optional neighbour index
+        self.neighbour_sims = None
     
-    def build_model(self):
+    def build_model_loop(self):
         """
-        Builds the user-similarity model.
+        Builds the item-similarity model.
         
         Call this method before any prediction method.
         """
+        self.neighbours = None
         for i in range(self.m):
             for j in range(i,self.m):
                 s_ij = self.cosine(i,j)
-                self.S[i][j] = s_ij
-                self.S[j][i] = s_ij
+                self.S[i, j] = s_ij
+                self.S[j, i] = s_ij
                 print "{:5d} to {:5d}\r".format(i,j),
             
+    def build_model_numpy(self):
+        """
+        Builds the item-similarity model with matrix products.
+        
+        ``S`` becomes a dense ``numpy.ndarray``, or a ``scipy.sparse.csr_matrix`` 
+        for sparse ratings. The values equal the ones of ``build_model_loop`` 
+        within float tolerance.
+        
+        Call this method before any prediction method.
+        """
+        self.neighbours = None
+        self.S = cosine_matrix(self.R.T, self.B.T)
+    
+    # Use vectorized model building per default
+    build_model = build_model_numpy
+    
+    def build_index(self):
+        """
+        Builds the neighbour index with the peers of every item sorted by similarity.
+        
+        Call this method after ``build_model``. The prediction methods then walk 
+        over the top peers instead of scanning all items.
+        """
+        self.neighbours, self.neighbour_sims = neighbour_index(self.S)
+    
+    def rated_peers(self, u, i):
+        """
+        Walks the neighbour index of item :math:`i`.
+        
+        Yields the pairs :math:`(s_{ij}, r_{uj})` of all peers :math:`j` that user :math:`u` rated,
+        most similar peers first.
+        """
+        for j, s in izip(self.neighbours[i], self.neighbour_sims[i]):
+            if self.B[u, j] == 1:
+                yield s, self.R[u, j]
+            
     def print_model(self):
         """
         Prints the first 10 times 10 similarity values :math:`s_{uv}` to console.
@@ -228,7 +581,7 @@ class BaselineIBCF(object):
         print "S"
         for i in range(min(self.m,10)):
             for j in range(min(self.m,10)):
-                print "{: 1.5f}".format(self.S[i][j]),
+                print "{: 1.5f}".format(self.S[i, j]),
             print ""
                 
     def print_ratings(self):
@@ -238,19 +591,19 @@ class BaselineIBCF(object):
         print "R"
         for u in range(min(self.n,10)):
             for i in range(min(self.m,10)):
-                print "{: 1.5f}".format(self.R[u][i]),
+                print "{: 1.5f}".format(self.R[u, i]),
             print ""
         
         print "R2"    
         for u in range(min(self.n,10)):
             for i in range(min(self.m,10)):
-                print "{: 1.5f}".format(self.R[u][i]**2),
+                print "{: 1.5f}".format(self.R[u, i]**2),
             print ""
         
         print "B"    
         for u in range(min(self.n,10)):
             for i in range(min(self.m,10)):
-                print "{: 1.5f}".format(self.B[u][i]),
+                print "{: 1.5f}".format(self.B[u, i]),
             print ""
                 
     def cosine(self, i,j):
@@ -264,9 +617,9 @@ class BaselineIBCF(object):
         si = 0
         sj = 0
         for u in range(self.n):
-            d += self.R[u][i] * self.R[u][j]
-            si += self.R[u][i]**2 * self.B[u][j]
-            sj += self.R[u][j]**2 * self.B[u][i]
+            d += self.R[u, i] * self.R[u, j]
+            si += self.R[u, i]**2 * self.B[u, j]
+            sj += self.R[u, j]**2 * self.B[u, i]
         if d == 0:
             return 0
         else :
@@ -283,6 +636,13 @@ class BaselineIBCF(object):
         :param k: parameter for :math:`k`-nearest neighbour algorithm
 
         Returns the prediction :math:`\hat{r}_{ui}`.
+        
+        .. note:: The comparison in ``find_minpeer`` is inverted: once :math:`k` peers are 
+            selected, the least similar peer seen so far replaces the current minimum. So this 
+            is not a k-NN selection. It is kept unchanged, because the results of earlier 
+            evaluations refer to it. ``nn_prediction_top_k`` selects the :math:`k` most similar 
+            peers. The neighbour index is not used here, since the selection depends on the 
+            order of the peer ids.
         """
         # Find K best peers
         
@@ -291,14 +651,14 @@ class BaselineIBCF(object):
         for j in range(self.m):
             if j == i: # skip target user
                 continue
-            if self.B[u][j] == 1:
+            if self.B[u, j] == 1:
                 candidates.append(j)
         
         peers = []
         def find_minpeer(peers):
             min_peer = peers[0]
             for j in peers:
-                if self.S[i][j] < self.S[i][min_peer]:
+                if self.S[i, j] < self.S[i, min_peer]:
                     min_peer = j
             return min_peer
         
@@ -307,17 +667,48 @@ class BaselineIBCF(object):
                 peers.append(j)
                 min_peer = find_minpeer(peers)
             
-            if self.S[i][j] < self.S[i][min_peer]:
+            if self.S[i, j] < self.S[i, min_peer]:
                 peers.remove(min_peer)
                 peers.append(j)
                 min_peer = find_minpeer(peers)
         #print peers
+        return self._weight_peers(u, i, peers)
+    
+    def nn_prediction_top_k(self,u,i,k):
+        """
+        Predicts the rating :math:`\hat{r}_{ui}` with the :math:`k` most similar peers.
+        
+        :param u: target user :math:`u`
+        :param i: target item :math:`i`
+        :param k: parameter for :math:`k`-nearest neighbour algorithm
+
+        Returns the prediction :math:`\hat{r}_{ui}`.
+        
+        Only peers with a similarity :math:`\geq 0` are weighted. With a neighbour index 
+        (see ``build_index``) the first :math:`k` peers of the walk are used, which gives 
+        the same prediction.
+        """
+        if self.neighbours is not None:
+            return sort_walk(self.rated_peers(u, i), k)
+        
+        candidates = []
+        for j in range(self.m):
+            if j != i and self.B[u, j] == 1:
+                candidates.append(j)
+        # ties by id as in the neighbour index
+        peers = sorted(candidates, key=lambda j: -self.S[i, j])[:k]
+        return self._weight_peers(u, i, peers)
+    
+    def _weight_peers(self, u, i, peers):
+        """
+        Returns the prediction :math:`\hat{r}_{ui}` weighted over the peers with a similarity :math:`\geq 0`.
+        """
         rating = 0
         norm = 0
         for j in peers:
-            if self.S[i][j] >= 0:
-                rating += self.R[u][j] * self.S[i][j]
-                norm += self.S[i][j]
+            if self.S[i, j] >= 0:
+                rating += self.R[u, j] * self.S[i, j]
+                norm += self.S[i, j]
             #print "r: {}, n: {}".format(rating, norm)
         if norm == 0:
             return 0
@@ -335,14 +726,19 @@ class BaselineIBCF(object):
         :param f: precision of the binary search :math:`f\,'`
 
         Returns the prediction :math:`\hat{r}_{ui}`.  
+        
+        With a neighbour index (see ``build_index``) the search only walks over the top peers.
         """
+        if self.neighbours is not None:
+            return bs_walk(self.rated_peers(u, i), k, f)
+        
         epsilon = 2**(-1)
        
         for e in range(2, f):
             c = 0
             for j in range(self.m):
-                if i != j and self.S[i][j] >= epsilon:
-                    c += self.B[u][j]
+                if i != j and self.S[i, j] >= epsilon:
+                    c += self.B[u, j]
             delta = 2**(-e)
             if c > k:
                 epsilon += delta
@@ -352,9 +748,9 @@ class BaselineIBCF(object):
         r = 0
         n = 0 
         for j in range(self.m):
-            if i != j and self.S[i][j] >= epsilon and self.B[u][j] == 1:
-                r += self.S[i][j] * self.R[u][j]
-                n += self.S[i][j]
+            if i != j and self.S[i, j] >= epsilon and self.B[u, j] == 1:
+                r += self.S[i, j] * self.R[u, j]
+                n += self.S[i, j]
                 
         if n == 0:
             return 0
@@ -365,5 +761,31 @@ class BaselineIBCF(object):
     # Use approx knn per default 
     nn_prediction=nn_prediction_bs  
     
+    def predict_many(self, pairs, k, f):
+        """
+        Predicts several ratings :math:`\\hat{r}_{ui}` at once. Same result as ``nn_prediction_bs``.
+        
+        The pairs are grouped by target user :math:`u`. Each group shares the peers 
+        rated by :math:`u` and runs the binary search vectorized.
+        
+        :param pairs: sequence of pairs :math:`(u, i)`
+        :param k: parameter for :math:`k`-nearest neighbour algorithm
+        :param f: precision of the binary search :math:`f\\,'`
+        
+        Returns a ``numpy.ndarray`` with the predictions in the order of ``pairs``.
+        """
+        pairs = numpy.asarray(pairs, dtype=int).reshape(-1, 2)
+        users = pairs[:, 0]
+        items = pairs[:, 1]
+        predictions = numpy.zeros(len(pairs))
+        for u in numpy.unique(users):
+            group = numpy.flatnonzero(users == u)
+            peers = numpy.flatnonzero(submatrix(self.B, [u], slice(None)).ravel() == 1)
+            S = submatrix(self.S, items[group], peers)
+            S[peers == items[group][:, None]] = 0 # skip target item
+            R = submatrix(self.R, [u], peers)
+            predictions[group] = bs_predictions(S, R, k, f)
+        return predictions
+    
     
     
@@ -13,7 +13,8 @@ similarity model do the follwing:
         - "load_bitratings_from" 
         
        in the appropriate order, to load all private rating values into the memory.
-    2. Use the method "build model" once to compute all similarities.
+    2. Use the method "build model" once to compute all similarities. 
+       Or read a model stored with "save_model" by a previous program with "load_model".
     3. Call the methods
         - "threshold_prediction" with threshold epsilon, or
         - "nn-prediction" with a number k
@@ -27,7 +28,156 @@ from Compiler.types import *
 from Compiler.library import *
 from Compiler.sparse_types import *
 from config_mine import *
-        
+
+def cosine_sums(r_a, r_b, r2_a, r2_b, b_a, b_b):
+    """
+    Computes the three inner products of the cosine similarity of two users or items from vectors.
+    
+    They are computed with vector multiplications and local sums,
+    so the number of rounds does not depend on the length.
+    
+    :param r_a: ratings of :math:`a` as raw ``sint`` vector
+    :param r_b: ratings of :math:`b` as raw ``sint`` vector
+    :param r2_a: squared ratings of :math:`a` as raw ``sint`` vector
+    :param r2_b: squared ratings of :math:`b` as raw ``sint`` vector
+    :param b_a: boolean ratings of :math:`a` as ``sint`` vector
+    :param b_b: boolean ratings of :math:`b` as ``sint`` vector
+    
+    Returns the raw sums :math:`d, s_a, s_b` as ``sint`` with precision :math:`2f`.
+    """
+    return (r_a * r_b).sum(), (r2_a * b_b).sum(), (r2_b * b_a).sum()
+
+def cosine_normalize(d, sa, sb):
+    """
+    Computes :math:`d / \sqrt{s_a s_b}` with one inverse square root and without a division.
+    
+    The inverse square roots of ``sa`` and ``sb`` are computed together in one vector,
+    which keeps the values in the range of ``sfix`` unlike the product :math:`s_a s_b`.
+    They are multiplied with :math:`d` before their truncation to keep their precision.
+    If :math:`s_a` or :math:`s_b` is zero, so is :math:`d` and the result is 0.
+    
+    :param d: the inner product as ``sfix``
+    :param sa: the squared norm of :math:`a` as ``sfix``
+    :param sb: the squared norm of :math:`b` as ``sfix``
+    
+    All arguments can be vectors of the same size.
+    """
+    k, f, kappa = sfix.k, sfix.f, sfix.kappa
+    x = sint.concat(sa.v.split() + sb.v.split())
+    inv = vectorize(sfix_invsqrt)(x, k, f, kappa, raw=True).split()
+    res = vectorize(TruncPr)(d.v * sint.concat(inv[:d.size]), 3 * k, 2 * f + 1, kappa)
+    res = vectorize(TruncPr)(res * sint.concat(inv[d.size:]), 3 * k, 2 * f + 1, kappa)
+    return sfix(res)
+
+def cosine_from_sums(d, sa, sb):
+    """
+    Computes the cosine similarity from the raw sums of ``cosine_sums``.
+    
+    All arguments can be vectors of the same size, then all similarities share their rounds.
+    
+    Returns the cosine similarity. If the cosine similarity is undefined it returns ``sfix(0)``.
+    """
+    # Truncate only once
+    d = sfix(vectorize(TruncPr)(d, 2 * sfix.k, sfix.f, sfix.kappa))
+    return cosine_normalize(d, sfix(sa), sfix(sb))
+
+def batch_cosine(sums):
+    """
+    Computes the cosine similarities of several pairs at once.
+    
+    The sums of all pairs are combined to vectors, so the truncation, square roots
+    and divisions of the whole batch take the rounds of a single pair.
+    
+    :param sums: list of the raw sums :math:`(d, s_a, s_b)` of each pair
+    
+    Returns a list of the cosine similarities.
+    """
+    cos = cosine_from_sums(*[sint.concat(s) for s in zip(*sums)])
+    return [sfix(c) for c in cos.v.split()]
+
+def _batches(n_pairs, pair, batch_size, batch_body):
+    # Calls the body with the pairs pair(0), ..., pair(n_pairs - 1) in batches
+    n_batches, rest = divmod(n_pairs, batch_size)
+    if n_batches:
+        @for_range(n_batches)
+        def batch_loop(t):
+            batch_body([pair(t * batch_size + j) for j in range(batch_size)])
+    if rest:
+        batch_body([pair(n_batches * batch_size + j) for j in range(rest)])
+
+def for_pair_batches(n, batch_size=1, n_threads=1):
+    """
+    Decorator that calls the body for all pairs :math:`a < b` of ``n`` indices,
+    i.e. the upper triangle of the similarity matrix.
+    The body gets a list of up to ``batch_size`` pairs :math:`(a, b)` per call.
+
+    The rows :math:`a` and :math:`n-1-a` of the triangle are handled by the same loop,
+    so every loop covers :math:`n-1` pairs and the loops are spread evenly over ``n_threads`` threads.
+    The row in the middle of an odd ``n`` is handled by the main thread.
+    The loop count is constant, which the runtime requires to assign offline data to the threads.
+
+    :param n: number of indices
+    :param batch_size: number of pairs per call (default: 1)
+    :param n_threads: number of threads (default: 1)
+    """
+    def decorator(batch_body):
+        @for_range_multithread(n_threads, 1, n / 2)
+        def rows_loop(a):
+            c = n - 1 - a
+            def pair(j):
+                # Pairs (a, a+1+j) for j < c, then (c, j+1)
+                first = j < c
+                return c + first * (a - c), j + 1 + first * a
+            _batches(n - 1, pair, batch_size, batch_body)
+        if n % 2:
+            _batches(n / 2, lambda j: (n / 2, n / 2 + 1 + j), batch_size, batch_body)
+        return batch_body
+    return decorator
+
+def for_row_batches(n, a, batch_size=1):
+    """
+    Decorator that calls the body for the pairs :math:`(a, b)` with all :math:`b \neq a` of ``n`` indices,
+    i.e. the row and column :math:`a` of the similarity matrix.
+    The body gets a list of up to ``batch_size`` pairs per call.
+
+    :param n: number of indices
+    :param a: the index :math:`a`, can be a ``regint``
+    :param batch_size: number of pairs per call (default: 1)
+    """
+    def decorator(batch_body):
+        _batches(n - 1, lambda j: (a, j + (j >= a)), batch_size, batch_body)
+        return batch_body
+    return decorator
+
+def save_matrix(matrix):
+    """
+    Appends the shares of a secure integer ``Matrix`` to ``Persistence/Transactions-P<player>.data``.
+    Every row is written as one vector with a single instruction.
+
+    :param matrix: the ``Matrix`` of ``sint``
+    """
+    @for_range(matrix.rows)
+    def row_loop(i):
+        matrix[i].get_vector().write_to_file()
+
+def load_matrix(matrix, position):
+    """
+    Reads the shares of a secure integer ``Matrix`` from ``Persistence/Transactions-P<player>.data``,
+    as written by ``save_matrix``. Every row is read as one vector with a single instruction.
+
+    :param matrix: the ``Matrix`` of ``sint``
+    :param position: the byte position of the first share in the file
+
+    Returns the position after the matrix as ``regint``. It is -1 at the end of the file.
+    """
+    position = MemValue(position)
+    @for_range(matrix.rows)
+    def row_loop(i):
+        stop, row = sint.read_from_file(position.read(), matrix.columns)
+        matrix[i].assign_vector(row)
+        position.write(stop)
+    return position.read()
+
 class UBCosineCF():
     """
     Provides functionality for a user-based collaborative filter with
@@ -35,9 +185,11 @@ class UBCosineCF():
     
     :param n: number of users :math:`n`
     :param m: number of items :math:`m`
+    :param n_threads: number of threads to build the model (default: 1)
+    :param batch_size: number of similarities that are normalized together (default: 1)
     
     """
-    def __init__(self, n, m):
+    def __init__(self, n, m, n_threads=1, batch_size=1):
         """
         Initialize a new instance with n users and m items.
         
@@ -58,6 +210,8 @@ class UBCosineCF():
         self.R = sfixMatrix(n,m) # Rating matrix
         self.R2 = sfixMatrix(n,m) # Squared rating matrix
         self.B = Matrix(n,m,sint) # Boolean ratings                
+        self.n_threads = n_threads # Threads to build the model
+        self.batch_size = batch_size # Pairs per batch to build the model
             
     def load_ratings_from(self, user, player):
         """
@@ -66,11 +220,7 @@ class UBCosineCF():
         :param user: the user for which ratings are loaded
         :param player: the player from which ratings are loaded
         """
-        ratings = self.R[user]
-        @for_range(self.m)
-        def items_loop1(i):
-            r = sint.get_raw_input_from(player)
-            ratings[i] = sfix(*r)
+        self.R[user].raw_input_from(player)
             
     def load_ratings2_from(self, user, player):
         """
@@ -79,11 +229,7 @@ class UBCosineCF():
         :param user: the user for which ratings are loaded
         :param player: the player from which ratings are loaded
         """
-        ratings2 = self.R2[user]
-        @for_range(self.m)
-        def items_loop(i):
-            r2 = sint.get_raw_input_from(player)
-            ratings2[i] = sfix(*r2)
+        self.R2[user].raw_input_from(player)
         
     def load_bitratings_from(self, user, player):
         """
@@ -92,10 +238,7 @@ class UBCosineCF():
         :param user: the user for which ratings are loaded
         :param player: the player from which ratings are loaded
         """
-        bitratings = self.B[user]
-        @for_range(self.m)
-        def items_loop2(i):
-            bitratings[i] = sint.get_raw_input_from(player)
+        self.B[user].raw_input_from(player)
             
     def print_ratings(self):
         """
@@ -137,21 +280,84 @@ class UBCosineCF():
         .. note::
         
             Load all rating values in to the model first with the ``load_*_from`` methods.
+        
+        With ``n_threads`` the pairs are distributed over threads, which requires the vectorized cosine.
+        With ``batch_size`` the square roots and divisions of that many pairs share their rounds.
             
         """
         print_ln("Building secure shared similarity model")
         @for_range(self.n)
         def users_loop1(u):
             self.S[u][u] = sfix(1)
-            @for_range(u+1,self.n)
-            def users_loop2(v):
+        
+        # Function blocks cannot be called from several threads
+        cosine = self.cosine if self.n_threads == 1 else self.cosine_inline
+        @for_pair_batches(self.n, self.batch_size, self.n_threads)
+        def users_loop2(pairs):
+            if len(pairs) == 1:
+                s = [cosine(*pairs[0])]
+            else:
+                s = batch_cosine([self.cosine_sums(u, v) for u, v in pairs])
+            for (u, v), s_uv in zip(pairs, s):
                 print_str("%s to %s     \r", u,v)
-                s_uv = self.cosine(u, v)
                 self.S[u][v] = s_uv
                 self.S[v][u] = s_uv
             
+    def update_user(self, u, player):
+        """
+        Reloads the ratings of user ``u`` from ``player`` and recomputes only the row and column :math:`u` of ``S``.
+        
+        These are :math:`n-1` similarities instead of :math:`n(n-1)/2` for ``build_model``.
+        The input of ``player`` is the new row of ``R``, ``R2`` and ``B`` as for the ``load_*_from`` methods.
+        
+        :param u: the user :math:`u`
+        :param player: the player from which ratings are loaded
+        """
+        self.load_ratings_from(u, player)
+        self.load_ratings2_from(u, player)
+        self.load_bitratings_from(u, player)
+        
+        @for_row_batches(self.n, u, self.batch_size)
+        def users_loop(pairs):
+            if len(pairs) == 1:
+                s = [self.cosine(*pairs[0])]
+            else:
+                s = batch_cosine([self.cosine_sums(u, v) for u, v in pairs])
+            for (u, v), s_uv in zip(pairs, s):
+                self.S[u][v] = s_uv
+                self.S[v][u] = s_uv
+            
+    def cosine_sums(self, u,v):
+        """
+        Computes the raw sums of the cosine similarity with vectors of the rows of ``u`` and ``v``.
+        
+        :param u: one user :math:`u`
+        :param u: another user :math:`v`
+        
+        Returns the sums :math:`d, s_u, s_v`, see ``cosine_sums``.
+        """
+        return cosine_sums(self.R[u].get_vector().conv(), self.R[v].get_vector().conv(),
+                           self.R2[u].get_vector().conv(), self.R2[v].get_vector().conv(),
+                           self.B[u].get_vector(), self.B[v].get_vector())
+    
+    def cosine_inline(self, u,v):
+        """
+        Computes the cosine similarity with vectors of the rows of ``u`` and ``v``.
+        
+        The code is emitted at every call. Unlike the function block ``cosine_vector``
+        it can therefore be called from threads.
+        
+        :param u: one user :math:`u`
+        :param u: another user :math:`v`
+        
+        Returns the cosine similarity between u and v. If the cosine similarity is undefined it returns ``sfix(0)``.
+        """
+        return cosine_from_sums(*self.cosine_sums(u, v))
+    
+    cosine_vector = method_block(cosine_inline)
+    
     @method_block
-    def cosine(self, u,v):
+    def cosine_loop(self, u,v):
         """
         Computes the cosine similarity.
         
@@ -177,6 +383,9 @@ class UBCosineCF():
         cos = not_zero.if_else(d/norm, sfix(0))             
         return cos
     
+    # Use vectorized cosine per default
+    cosine = cosine_vector
+    
     def print_model(self):
         """
         Prints the first 10 times 10 elements of ``S``.
@@ -193,6 +402,38 @@ class UBCosineCF():
             def user_loop(v):
                 print_str('%s ', self.S[u][v].reveal())
             print_ln(' ')
+    
+    def save_model(self, ratings=False):
+        """
+        Appends the shares of the similarity model ``S`` to ``Persistence/Transactions-P<player>.data``
+        of every player. The directory ``Persistence`` must exist.
+        
+        :param ratings: also append ``R``, ``R2`` and ``B``, which the predictions and 
+            ``update_user`` require (default: ``False``)
+        """
+        save_matrix(self.S.multi_array)
+        if ratings:
+            save_matrix(self.R.multi_array)
+            save_matrix(self.R2.multi_array)
+            save_matrix(self.B)
+    
+    def load_model(self, position=0, ratings=False):
+        """
+        Reads the similarity model ``S`` as written by ``save_model`` instead of building it.
+        
+        The runtime appends all shares to the same file, so several models are told apart by their position.
+        
+        :param position: the byte position of the model in the file (default: 0)
+        :param ratings: also read ``R``, ``R2`` and ``B`` (default: ``False``)
+        
+        Returns the position after the model, where the next saved model starts. It is -1 at the end of the file.
+        """
+        position = load_matrix(self.S.multi_array, position)
+        if ratings:
+            position = load_matrix(self.R.multi_array, position)
+            position = load_matrix(self.R2.multi_array, position)
+            position = load_matrix(self.B, position)
+        return position
             
     @method_block
     def threshold_prediction(self, u, i, epsilon):
@@ -205,19 +446,31 @@ class UBCosineCF():
         
         Returns a prediction :math:`\hat{r}_{ui}`. Or ``sfix(0)`` if the prediction is undefined.
         """
-        r = MemValue(sint(0))
-        n = MemValue(sint(0))
-        
-        @for_range(self.n)
-        def user_loop(v):
-            if_then(u != v)
-            c = sint(self.S[u][v] >= epsilon) * self.B[v][i]
-            r.write(r.read() + c * self.S[u][v].conv() * self.R[v][i].conv() )
-            n.write(n.read() + c * self.S[u][v].conv())
-            end_if()
+        S_u, B_i = self.get_neighbourhood(u, i)
+        return self._threshold_prediction(epsilon, S_u, self.R.get_column(i), B_i)
+    
+    def get_neighbourhood(self, u, i):
+        """
+        Loads the similarities :math:`s_{uv}` and the boolean ratings :math:`b_{vi}` of all users :math:`v` as vectors.
+        The boolean rating of :math:`u` itself is set to 0, so :math:`u` is never its own neighbour.
         
-        r = sfix(TruncPr(r.read(), 2 * sfix.k, sfix.f, sfix.kappa))
-        n = sfix(n.read())
+        :param u: the target user :math:`u`
+        :param i: the target item :math:`i`
+        """
+        B_i = Array(self.n, sint)
+        B_i.assign_vector(self.B.get_column(i))
+        B_i[u] = sint(0)
+        return self.S[u].get_vector(), B_i.get_vector()
+    
+    def _neighbours(self, epsilon, S_u, B_i):
+        # Compares all similarities with epsilon in one vectorized comparison
+        epsilon = sint.concat([parse_type(epsilon).v] * self.n)
+        return S_u.v.greater_equal(epsilon, sfix.k, sfix.kappa) * B_i
+    
+    def _threshold_prediction(self, epsilon, S_u, R_i, B_i):
+        c = self._neighbours(epsilon, S_u, B_i) * S_u.v
+        r = sfix(TruncPr((c * R_i.v).sum(), 2 * sfix.k, sfix.f, sfix.kappa))
+        n = sfix(c.sum())
 
         prediction = sint(n != 0).if_else(r / n, sfix(0))  
         return prediction 
@@ -227,27 +480,26 @@ class UBCosineCF():
         """
         Predict a rating with a k-nearest-neighbours approach.
         
+        The neighbours are counted with vectors, so each round of the search
+        takes a constant number of communication rounds.
+        
         :param u: the target user :math:`u`
         :param i: the target item :math:`i`
         :param k: the parameter :math:`k`
         
         Returns a prediction :math:`\hat{r}_{ui}`. Or ``sfix(0)`` if the prediction is undefined.
         """
+        S_u, B_i = self.get_neighbourhood(u, i)
         epsilon = sfix.MemValue(sfix(sint(2**(sfix.f-1)))) # 0.5
         
         @for_range(2,f)
         def search_loop(round):
-            c = sint.MemValue(sint(0))
-            @for_range(self.n)
-            def user_loop(v):
-                if_then(u != v)
-                c.write(c + (self.S[u][v] >= epsilon.read()) * self.B[v][i])
-                end_if()
+            c = self._neighbours(epsilon.read(), S_u, B_i).sum()
             delta = cfix(cint(2**(sfix.f-(round))))
             epsilon.write( epsilon.read() + (c > k) * delta)
             epsilon.write( epsilon.read() - (c < k) * delta)
             
-        return self.threshold_prediction(u, i, epsilon.read())
+        return self._threshold_prediction(epsilon.read(), S_u, self.R.get_column(i), B_i)
             
     def delete(self):
         """
@@ -271,14 +523,21 @@ class SparseUBCosineCF():
     :param n: number of users :math:`n`
     :param m: number of items :math:`m`
     :param c: capacity of the sparse representation :math:`c`
+    :param n_threads: number of threads to build the model (default: 1)
+    :param batch_size: number of similarities that are normalized together (default: 1)
+    :param oram: also store the ratings in an ORAM for lookups by item (default: ``False``)
     
     """
-    def __init__(self, n, m, capacity):
+    def __init__(self, n, m, capacity, n_threads=1, batch_size=1, oram=False):
         """
         Initialize a new instance with n users and m items and matrix capacity.
         
         ``R`` is a sparse fixed-point Matrix that stores the ratings and their squared values
         in a compressed format. 
+        
+        ``R_oram`` stores the same entries in an ORAM. It is only created with ``oram`` and
+        finds the rating of a user for an item with a binary search instead of a scan of the row. 
+        The predictions require it.
     
         ``S`` is a secure fixed-point Matrix. It stores the computed cosine similarity values :math:`s_{uv}^2`.
         """
@@ -287,15 +546,32 @@ class SparseUBCosineCF():
         self.m = m # Number of items
         self.capacity = capacity
         self.R = sfixSparseRowMatrix(n,m,capacity) # Rating matrix  
+        self.R_oram = sfixORAMSparseRowMatrix(n,m,capacity) if oram else None # Rating lookup by item
+        self.n_threads = n_threads # Threads to build the model
+        self.batch_size = batch_size # Pairs per batch to build the model
         
     def load_ratings_from(self, user, player):
         """
         Load the sparse rating vector for ``user`` from ``player`` and store it in ``R``.
         
+        The entries must be sorted by item and padded with the key :math:`m` for ``cosine_sums_merge``.
+        
         :param user: the user for which ratings are loaded
         :param player: the player from which ratings are loaded
         """
         sfixSparseArray.get_raw_input_from(player, self.n, self.capacity, address=self.R[user].address)
+        if self.R_oram is not None:
+            self.R_oram[user].load(self.R[user])
+    
+    def get_row(self, user):
+        """
+        The sparse ratings of ``user`` for lookups by item, from ``R_oram`` if it exists.
+        
+        :param user: the user :math:`u`
+        """
+        if self.R_oram is not None:
+            return self.R_oram[user]
+        return self.R[user]
     
     def print_ratings(self):
         """
@@ -311,7 +587,7 @@ class SparseUBCosineCF():
         def user_loop(u):
             @for_range(min(self.m,10))
             def user_loop(i):
-                print_str('%s ', self.R[u].get_rating(i).reveal())
+                print_str('%s ', self.get_row(u).get_rating(i).reveal())
             print_ln(' ')
         
         print_ln("R2")    
@@ -319,7 +595,7 @@ class SparseUBCosineCF():
         def user_loop(u):
             @for_range(min(self.m,10))
             def user_loop(i):
-                _, r2 = self.R[u].get_pair(i)
+                _, r2 = self.get_row(u).get_pair(i)
                 print_str('%s ', r2.reveal())
             print_ln(' ')
     
@@ -330,22 +606,110 @@ class SparseUBCosineCF():
         .. note::
         
             Load all rating values in to the model first with the ``load_ratings_from`` method.
+        
+        With ``n_threads`` the pairs are distributed over threads, which requires the vectorized cosine.
+        With ``batch_size`` the square roots and divisions of that many pairs share their rounds.
             
         """
         print_ln("Building secure shared similarity model")
         @for_range(self.n)
         def users_loop1(u):
             self.S[u][u] = sfix(1.0)
-            @for_range(u+1,self.n)
-            def users_loop2(v):
+        
+        # Function blocks cannot be called from several threads
+        cosine = self.cosine if self.n_threads == 1 else self.cosine_inline
+        @for_pair_batches(self.n, self.batch_size, self.n_threads)
+        def users_loop2(pairs):
+            if len(pairs) == 1:
+                s = [cosine(*pairs[0])]
+            else:
+                s = batch_cosine([self.cosine_sums(u, v) for u, v in pairs])
+            for (u, v), s_uv in zip(pairs, s):
                 print_str("%s to %s     \r", u,v)
-                s_uv = self.cosine(u, v)
                 self.S[u][v] = s_uv
                 self.S[v][u] = s_uv
     
     
+    def cosine_sums_pairwise(self, u,v):
+        """
+        Computes the raw sums of the cosine similarity by comparing all keys of ``u`` and ``v`` at once.
+        
+        Each of the :math:`c^2` pairs of entries is one element of a vector, so
+        the comparison and the inner products take a constant number of rounds.
+        
+        :param u: one user :math:`u`
+        :param u: another user :math:`v`
+        
+        Returns the sums :math:`d, s_u, s_v`, see ``cosine_sums``.
+        """
+        c = self.capacity
+        # Entries are stored as (key, r, r2), entry k of u meets entry l of v at k*c+l
+        offsets_u = [3 * (kl / c) for kl in range(c * c)]
+        offsets_v = [3 * (kl % c) for kl in range(c * c)]
+        load_u = lambda j: sint.load_gather(self.R[u].address, [o + j for o in offsets_u])
+        load_v = lambda j: sint.load_gather(self.R[v].address, [o + j for o in offsets_v])
+        match = load_u(0) == load_v(0)
+        return cosine_sums(load_u(1), match * load_v(1), load_u(2), load_v(2), match, match)
+    
+    def cosine_sums_merge(self, u,v):
+        """
+        Computes the raw sums of the cosine similarity by merging the entries of ``u`` and ``v``.
+        
+        The entries of both rows are sorted by key, so ``u`` followed by the reversed ``v`` 
+        is merged with ``bitonic_merge``. Afterwards common keys are adjacent
+        and only neighbours are compared. This takes :math:`O(c \log c)` comparisons
+        instead of :math:`c^2`, but :math:`O(\log c)` rounds.
+        
+        :param u: one user :math:`u`
+        :param u: another user :math:`v`
+        
+        Returns the sums :math:`d, s_u, s_v`, see ``cosine_sums``.
+        """
+        c = self.capacity
+        length = 2 ** (c - 1).bit_length() # Pad to a power of two
+        bit_length = self.m.bit_length() + 1
+        zeros = [sint(0)] * length
+        def entries(x):
+            # Fields (key, r, r2) of x, padded with keys behind all items
+            fields = [sint.load_vector(self.R[x].address + j, c, 3).split() for j in range(3)]
+            return [fields[0] + [sint(self.m)] * (length - c)] + \
+                   [field + zeros[c:] for field in fields[1:]]
+        key_u, r_u, r2_u = entries(u)
+        key_v, r_v, r2_v = entries(v)
+        # The squared ratings of u and v are kept in separate fields
+        key, r, r2_u, r2_v = bitonic_merge([key_u + key_v[::-1], r_u + r_v[::-1], 
+                                            r2_u + zeros, zeros + r2_v[::-1]], bit_length)
+        # A common key meets itself at one of 2*length-1 neighbours
+        head = lambda field: sint.concat(field[:-1])
+        tail = lambda field: sint.concat(field[1:])
+        match = head(key).equal(tail(key), bit_length)
+        return ((head(r) * tail(r)) * match).sum(), \
+               (match * (head(r2_u) + tail(r2_u))).sum(), \
+               (match * (head(r2_v) + tail(r2_v))).sum()
+    
+    # Use the merge intersection per default
+    cosine_sums = cosine_sums_merge
+    
+    def cosine_inline(self, u,v):
+        """
+        Computes the cosine similarity from the sums of ``cosine_sums``. Per default these are 
+        the sums of ``cosine_sums_merge``, i.e. a bitonic merge of ``u`` and ``v`` followed by 
+        comparisons of adjacent keys.
+        
+        The code is emitted at every call. Unlike the function block ``cosine_vector``
+        it can therefore be called from threads.
+        
+        :param u: one user :math:`u`
+        :param u: another user :math:`v`
+        
+        Returns the cosine similarity between u and v. If the cosine similarity is undefined it returns ``sfix(0)``.
+        """
+        return cosine_from_sums(*self.cosine_sums(u, v))
+    
+    cosine_vector = method_block(cosine_inline)
+    
     @method_block
-    def cosine(self, u,v):
+    def cosine_loop(self, u,v):
         """
         Computes the cosine similarity.
         
@@ -374,6 +738,8 @@ class SparseUBCosineCF():
         cos = not_zero.if_else(d/norm, sfix(0))             
         return cos    
     
+    # Use vectorized cosine per default
+    cosine = cosine_vector
     
     def print_model(self):
         """
@@ -391,7 +757,123 @@ class SparseUBCosineCF():
             def user_loop(v):
                 print_str('%s ', self.S[u][v].reveal())
             print_ln(' ')
+    
+    def save_model(self, ratings=False):
+        """
+        Appends the shares of the similarity model ``S`` to ``Persistence/Transactions-P<player>.data``
+        of every player. The directory ``Persistence`` must exist.
+        
+        :param ratings: also append the sparse ratings ``R`` including the squared ratings, 
+            which the predictions require (default: ``False``)
+        """
+        save_matrix(self.S.multi_array)
+        if ratings:
+            save_matrix(self.R.matrix)
+    
+    def load_model(self, position=0, ratings=False):
+        """
+        Reads the similarity model ``S`` as written by ``save_model`` instead of building it.
+        With ``ratings`` the sparse ratings ``R`` are read and copied to ``R_oram`` if it exists.
+        
+        :param position: the byte position of the model in the file (default: 0)
+        :param ratings: also read ``R`` (default: ``False``)
+        
+        Returns the position after the model, where the next saved model starts. It is -1 at the end of the file.
+        """
+        position = load_matrix(self.S.multi_array, position)
+        if ratings:
+            position = load_matrix(self.R.matrix, position)
+            if self.R_oram is not None:
+                @for_range(self.n)
+                def user_loop(u):
+                    self.R_oram[u].load(self.R[u])
+        return position
             
+    def get_column(self, i):
+        """
+        Looks up the ratings :math:`r_{vi}` and whether they are defined for all users :math:`v` in ``R_oram``.
+        
+        :param i: the target item :math:`i`
+        
+        Returns the ratings as ``sfixArray`` and the boolean ratings as ``Array``.
+        """
+        if self.R_oram is None:
+            raise CompilerError('Predictions on sparse ratings require oram=True')
+        R_i = sfixArray(self.n)
+        B_i = Array(self.n, sint)
+        @for_range(self.n)
+        def user_loop(v):
+            r, _, b = self.R_oram[v].get_entry(i)
+            R_i[v] = r
+            B_i[v] = b
+        return R_i, B_i
+    
+    def get_neighbourhood(self, u, i):
+        """
+        Loads the similarities :math:`s_{uv}`, the ratings :math:`r_{vi}` and the boolean ratings 
+        :math:`b_{vi}` of all users :math:`v` as vectors. The ratings of item :math:`i` are looked up 
+        once in ``R_oram``. The boolean rating of :math:`u` itself is set to 0, so :math:`u` is never 
+        its own neighbour.
+        
+        :param u: the target user :math:`u`
+        :param i: the target item :math:`i`
+        """
+        R_i, B_i = self.get_column(i)
+        B_i[u] = sint(0)
+        return self.S[u].get_vector(), R_i.get_vector(), B_i.get_vector()
+    
+    def _neighbours(self, epsilon, S_u, B_i):
+        # Compares all similarities with epsilon in one vectorized comparison
+        epsilon = sint.concat([parse_type(epsilon).v] * self.n)
+        return S_u.v.greater_equal(epsilon, sfix.k, sfix.kappa) * B_i
+    
+    def _threshold_prediction(self, epsilon, S_u, R_i, B_i):
+        c = self._neighbours(epsilon, S_u, B_i) * S_u.v
+        r = sfix(TruncPr((c * R_i.v).sum(), 2 * sfix.k, sfix.f, sfix.kappa))
+        n = sfix(c.sum())
+
+        prediction = sint(n != 0).if_else(r / n, sfix(0))  
+        return prediction 
+    
+    @method_block
+    def threshold_prediction(self, u, i, epsilon):
+        """
+        Predict a rating with a threshold approach.
+        
+        :param u: the target user :math:`u`
+        :param i: the target item :math:`i`
+        :param epsilon: the threshold :math:`\epsilon`
+        
+        Returns a prediction :math:`\hat{r}_{ui}`. Or ``sfix(0)`` if the prediction is undefined.
+        """
+        return self._threshold_prediction(epsilon, *self.get_neighbourhood(u, i))
+    
+    @method_block
+    def nn_prediction(self, u, i, k, f):
+        """
+        Predict a rating with a k-nearest-neighbours approach.
+        
+        The neighbours are counted with vectors like in ``UBCosineCF``, so each round of 
+        the search takes a constant number of communication rounds.
+        
+        :param u: the target user :math:`u`
+        :param i: the target item :math:`i`
+        :param k: the parameter :math:`k`
+        
+        Returns a prediction :math:`\hat{r}_{ui}`. Or ``sfix(0)`` if the prediction is undefined.
+        """
+        S_u, R_i, B_i = self.get_neighbourhood(u, i)
+        epsilon = sfix.MemValue(sfix(sint(2**(sfix.f-1)))) # 0.5
+        
+        @for_range(2,f)
+        def search_loop(round):
+            c = self._neighbours(epsilon.read(), S_u, B_i).sum()
+            delta = cfix(cint(2**(sfix.f-(round))))
+            epsilon.write( epsilon.read() + (c > k) * delta)
+            epsilon.write( epsilon.read() - (c < k) * delta)
+            
+        return self._threshold_prediction(epsilon.read(), S_u, R_i, B_i)
+    
     def delete(self):
         """
         Destructor
@@ -411,12 +893,14 @@ class IBCosineCF(object):
     
     :param n: number of users :math:`n`
     :param m: number of items :math:`m`
+    :param n_threads: number of threads to build the model (default: 1)
+    :param batch_size: number of similarities that are normalized together (default: 1)
     
     It is maybe safe to reveal the similarity values because they contain no more 
     information about the users. 
     """
 
-    def __init__(self, n, m):
+    def __init__(self, n, m, n_threads=1, batch_size=1):
         """
         Initialize a new instance with n users and m items.
         
@@ -437,6 +921,8 @@ class IBCosineCF(object):
         self.B = Matrix(n,m,sint)
         self.n = n # Number of users
         self.m = m # Number of items
+        self.n_threads = n_threads # Threads to build the model
+        self.batch_size = batch_size # Pairs per batch to build the model
 
         
     def load_ratings_from(self, user, player):
@@ -446,11 +932,7 @@ class IBCosineCF(object):
         :param user: the user for which ratings are loaded
         :param player: the player from which ratings are loaded
         """
-        ratings = self.R[user]
-        @for_range(self.m)
-        def items_loop(i):
-            r = sint.get_raw_input_from(player)
-            ratings[i] = sfix(*r)
+        self.R[user].raw_input_from(player)
             
     def load_ratings2_from(self, user, player):
         """
@@ -459,11 +941,7 @@ class IBCosineCF(object):
         :param user: the user for which ratings are loaded
         :param player: the player from which ratings are loaded
         """
-        ratings2 = self.R2[user]
-        @for_range(self.m)
-        def items_loop(i):
-            r2 = sint.get_raw_input_from(player)
-            ratings2[i] = sfix(*r2)
+        self.R2[user].raw_input_from(player)
         
     def load_bitratings_from(self, user, player):
         """
@@ -472,10 +950,7 @@ class IBCosineCF(object):
         :param user: the user for which ratings are loaded
         :param player: the player from which ratings are loaded
         """
-        bitratings = self.B[user]
-        @for_range(self.m)
-        def items_loop2(i):
-            bitratings[i] = sint.get_raw_input_from(player)
+        self.B[user].raw_input_from(player)
             
     def print_ratings(self):
         """
@@ -521,21 +996,89 @@ class IBCosineCF(object):
         .. warning::
         
             The similarity values are opened and therefore deanonymization is probably possible.
+        
+        With ``n_threads`` the pairs are distributed over threads, which requires the vectorized cosine.
+        With ``batch_size`` the square roots and divisions of that many pairs share their rounds.
             
         """
         print_ln("Building secure shared similarity model")
         @for_range(self.m)
         def item_loop1(i):
             self.S[i][i] = cfix(1.0)
-            @for_range(i+1,self.m)
-            def item_loop2(j):
+        
+        # Function blocks cannot be called from several threads
+        cosine = self.cosine if self.n_threads == 1 else self.cosine_inline
+        @for_pair_batches(self.m, self.batch_size, self.n_threads)
+        def item_loop2(pairs):
+            if len(pairs) == 1:
+                s = [cosine(*pairs[0])]
+            else:
+                s = batch_cosine([self.cosine_sums(i, j) for i, j in pairs])
+            for (i, j), s_ij in zip(pairs, s):
                 print_str("%s to %s     \r", i,j)
-                s_ij = self.cosine(i,j).reveal()
+                s_ij = s_ij.reveal()
+                self.S[i][j] = s_ij
+                self.S[j][i] = s_ij
+            
+    def update_item(self, i, player):
+        """
+        Reloads the ratings of item ``i`` from ``player`` and recomputes only the row and column :math:`i` of ``S``.
+        
+        These are :math:`m-1` similarities instead of :math:`m(m-1)/2` for ``build_model``.
+        The input of ``player`` is the new column :math:`i` of ``R``, ``R2`` and ``B``, i.e. :math:`n` values each.
+        
+        .. warning::
+        
+            The similarity values are opened and therefore deanonymization is probably possible.
+        
+        :param i: the item :math:`i`
+        :param player: the player from which ratings are loaded
+        """
+        for ratings in self.R.multi_array, self.R2.multi_array, self.B:
+            ratings.assign_column(i, sint.get_raw_inputs_from(player, self.n))
+        
+        @for_row_batches(self.m, i, self.batch_size)
+        def item_loop(pairs):
+            if len(pairs) == 1:
+                s = [self.cosine(*pairs[0])]
+            else:
+                s = batch_cosine([self.cosine_sums(i, j) for i, j in pairs])
+            for (i, j), s_ij in zip(pairs, s):
+                s_ij = s_ij.reveal()
                 self.S[i][j] = s_ij
                 self.S[j][i] = s_ij
             
+    def cosine_sums(self, i,j):
+        """
+        Computes the raw sums of the cosine similarity with vectors of the columns of ``i`` and ``j``.
+        
+        :param i: one item :math:`i`
+        :param j: another item :math:`j`
+        
+        Returns the sums :math:`d, s_i, s_j`, see ``cosine_sums``.
+        """
+        return cosine_sums(self.R.get_column(i).conv(), self.R.get_column(j).conv(),
+                           self.R2.get_column(i).conv(), self.R2.get_column(j).conv(),
+                           self.B.get_column(i), self.B.get_column(j))
+    
+    def cosine_inline(self, i,j):
+        """
+        Computes the cosine similarity with vectors of the columns of ``i`` and ``j``.
+        
+        The code is emitted at every call. Unlike the function block ``cosine_vector``
+        it can therefore be called from threads.
+        
+        :param i: one item :math:`i`
+        :param j: another item :math:`j`
+        
+        Returns the cosine similarity between i and j. If the cosine similarity is undefined it returns ``sfix(0)``.
+        """
+        return cosine_from_sums(*self.cosine_sums(i, j))
+    
+    cosine_vector = method_block(cosine_inline)
+    
     @method_block
-    def cosine(self, i,j):
+    def cosine_loop(self, i,j):
         """
         Computes the cosine similarity.
         
@@ -560,6 +1103,9 @@ class IBCosineCF(object):
         not_zero = sint(norm != 0)
         cos = not_zero.if_else(d/norm, sfix(0))             
         return cos
+    
+    # Use vectorized cosine per default
+    cosine = cosine_vector
             
     def print_model(self):
         """
@@ -3,7 +3,11 @@
 # see https://opensource.org/licenses/MIT
 
 import csv
-from scipy.sparse import lil_matrix
+import os
+import shutil
+import numpy
+from array import array
+from scipy.sparse import lil_matrix, csr_matrix
 
 class Dataset:
     """
@@ -14,8 +18,17 @@ class Dataset:
     :param quotechar: deliminator for longer strings. (default: ``"``)
     :param ratings_file_name: filename of the ratings file (default: ``ratings.csv``)
     :param movies_file_name: filename of the movie file (default: ``movies.csv``)
+    :param cache: keep the parsed ratings in binary ``.npy`` files next to the ratings file (default: ``True``)
+    :param columns: store the ratings in three typed arrays ``users``, ``items`` and ``ratings`` 
+        instead of the list ``rating_list`` (default: ``False``)
+    
+    The cache stores the canonicalized :math:`(u, i, r)` triples and the movie IDs. 
+    It is rebuilt whenever the size or modification time of a source file changes.
+    
+    With ``columns=True`` the arrays are memory-mapped from the cache, so even the 
+    largest MovieLens datasets only occupy the pages that ``get`` touches.
     """
-    def __init__(self, folder, separator=',', quotechar='"', ratings_file_name="ratings.csv", movies_file_name="movies.csv"):
+    def __init__(self, folder, separator=',', quotechar='"', ratings_file_name="ratings.csv", movies_file_name="movies.csv", cache=True, columns=False):
         self.ratings_file_name=ratings_file_name
         self.movies_file_name=movies_file_name
         
@@ -24,16 +37,91 @@ class Dataset:
         
         self.ratings_file_path=folder+"/"+ratings_file_name
         self.movies_file_path=folder+"/"+movies_file_name
+        self.cache_path=self.ratings_file_path+".cache"
         
-        # mid -> i    i -> mid
-        self.i_to_mid,self.mid_to_i = self.__canonicalize_movieids()
+        self.columns=columns
         
-        self.rating_list = self.__list_ratings()
+        if not (cache and self.__load_cache()):
+            # mid -> i    i -> mid
+            self.i_to_mid,self.mid_to_i = self.__canonicalize_movieids()
+            
+            if columns:
+                self.users, self.items, self.ratings = self.__column_ratings()
+            else:
+                self.rating_list = self.__list_ratings()
+            
+            if cache and self.__write_cache() and columns:
+                # continue on the memory-mapped arrays
+                self.__load_cache()
         
         self.n_max = self.__count_userids()
         
         self.m_max = len(self.mid_to_i)
     
+    def __cache_key(self):
+        """
+        Identifies the source files and the parser settings the cache was built from.
+        """
+        key = [ord(self.delimiter), ord(self.quotechar)]
+        for path in (self.movies_file_path, self.ratings_file_path):
+            stat = os.stat(path)
+            key += [stat.st_size, int(stat.st_mtime * 1000)]
+        return numpy.array(key, dtype=numpy.int64)
+    
+    def __load_cache(self):
+        """
+        Loads movie IDs and ratings from the binary cache.
+        
+        Returns ``False`` if there is no cache or it is outdated.
+        """
+        if not os.path.exists(self.cache_path):
+            return False
+        load = lambda name, mmap_mode=None: numpy.load(os.path.join(self.cache_path, name + ".npy"), mmap_mode=mmap_mode)
+        if not numpy.array_equal(load('key'), self.__cache_key()):
+            return False
+        self.i_to_mid = load('i_to_mid').tolist()
+        self.mid_to_i = dict((mid, i) for (i, mid) in enumerate(self.i_to_mid))
+        if self.columns:
+            self.users = load('users', 'r')
+            self.items = load('items', 'r')
+            self.ratings = load('ratings', 'r')
+        else:
+            self.rating_list = zip(load('users').tolist(), load('items').tolist(), load('ratings').tolist())
+        return True
+    
+    def __write_cache(self):
+        """
+        Writes movie IDs and ratings to the binary cache. 
+        The cache is skipped if the folder is not writable.
+        
+        Returns ``True`` if the cache was written.
+        """
+        if self.columns:
+            users, items, ratings = self.users, self.items, self.ratings
+        else:
+            users = numpy.array([u for (u,i,r) in self.rating_list], dtype=numpy.int32)
+            items = numpy.array([i for (u,i,r) in self.rating_list], dtype=numpy.int32)
+            ratings = numpy.array([r for (u,i,r) in self.rating_list], dtype=numpy.float64)
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+            os.mkdir(tmp_path)
+            save = lambda name, values: numpy.save(os.path.join(tmp_path, name + ".npy"), values)
+            save('i_to_mid', numpy.array(self.i_to_mid, dtype=numpy.int64))
+            save('users', users)
+            save('items', items)
+            save('ratings', ratings)
+            # the key comes last and marks the cache as complete
+            save('key', self.__cache_key())
+            if os.path.exists(self.cache_path):
+                shutil.rmtree(self.cache_path)
+            os.rename(tmp_path, self.cache_path)
+        except (IOError, OSError):
+            print("Cannot write dataset cache {}.".format(self.cache_path))
+            return False
+        return True
+    
     def __canonicalize_movieids(self):
         """
         Enumerates the movie IDs (mid) canonically to item IDs (i) and builds a dictionary in both directions
@@ -74,10 +162,35 @@ class Dataset:
                 ratings.append((u,i,r))
         return ratings
     
+    def __column_ratings(self):
+        """
+        Produces three typed arrays with all ratings::
+        
+            [u1, u2, ...], [i1, i2, ...], [r1, r2, ...]
+        """
+        users = array('i')
+        items = array('i')
+        ratings = array('d')
+        with open(self.ratings_file_path, 'r') as ratings_file:
+            reader = csv.reader(ratings_file, delimiter=self.delimiter, quotechar=self.quotechar)
+            header = next(reader)    
+            assert(header[0] == 'userId')
+            assert(header[1] == 'movieId')
+            assert(header[2] == 'rating')
+            for rating in reader:
+                users.append(int(rating[0])-1)
+                items.append(self.mid_to_i[int(rating[1])])
+                ratings.append(float(rating[2]))
+        return (numpy.frombuffer(users, dtype=numpy.int32), 
+                numpy.frombuffer(items, dtype=numpy.int32), 
+                numpy.frombuffer(ratings, dtype=numpy.float64))
+    
     def __count_userids(self):
         """
         Counts the number of users ``n``.
         """
+        if self.columns:
+            return max(int(self.users.max()), 0)+1 if len(self.users) else 1
         highest_id=0;
         for (u,i,r) in self.rating_list:
             if u > highest_id:
@@ -87,12 +200,13 @@ class Dataset:
     
     
     
-    def get(self, n=None, m=None):
+    def get(self, n=None, m=None, sparse=False):
         """
         Get the specified rating matrix out of the file. 
         
         :param n: a number of users (default: ``None`` - load maximum possible)
         :param m: a number of items (default: ``None`` - load maximum possible)
+        :param sparse: return the matrices in ``scipy.sparse.csr_matrix`` format instead of dense arrays (default: ``False``)
         
         Returns 
         
@@ -108,6 +222,12 @@ class Dataset:
         if m == None or m >= self.m_max:
             m = self.m_max
         
+        if self.columns:
+            return self.__get_columns(n, m, sparse)
+        
+        if sparse:
+            return self.__get_sparse(n, m)
+        
         R = lil_matrix((n, m))
         Rb = lil_matrix((n, m), dtype=int)
         Rlist = []                        
@@ -118,5 +238,35 @@ class Dataset:
                 Rb[u,i] = 1
         return R.toarray(), Rb.toarray(), Rlist, n, m
     
-
-    
\ No newline at end of file
+    def __get_sparse(self, n, m):
+        """
+        Builds the rating matrices of dimension ``n`` times ``m`` directly in CSR format.
+        Memory is proportional to the number of ratings.
+        """
+        Rlist = [(u,i,r) for (u,i,r) in self.rating_list if u < n and i < m]
+        users = [u for (u,i,r) in Rlist]
+        items = [i for (u,i,r) in Rlist]
+        ratings = [r for (u,i,r) in Rlist]
+        R = csr_matrix((ratings, (users, items)), shape=(n, m), dtype=float)
+        Rb = csr_matrix(([1]*len(Rlist), (users, items)), shape=(n, m), dtype=int)
+        return R, Rb, Rlist, n, m
+    
+    def __get_columns(self, n, m, sparse):
+        """
+        Builds the rating matrices of dimension ``n`` times ``m`` from the typed arrays 
+        by vectorized masking.
+        """
+        mask = (self.users < n) & (self.items < m)
+        users = self.users[mask]
+        items = self.items[mask]
+        ratings = self.ratings[mask]
+        Rlist = zip(users.tolist(), items.tolist(), ratings.tolist())
+        if sparse:
+            R = csr_matrix((ratings, (users, items)), shape=(n, m), dtype=float)
+            Rb = csr_matrix((numpy.ones(len(users), dtype=int), (users, items)), shape=(n, m), dtype=int)
+            return R, Rb, Rlist, n, m
+        R = numpy.zeros((n, m))
+        Rb = numpy.zeros((n, m), dtype=int)
+        R[users, items] = ratings
+        Rb[users, items] = 1
+        return R, Rb, Rlist, n, m
@@ -2,8 +2,62 @@
 # MIT Licence
 # see https://opensource.org/licenses/MIT
 
+import os
 import subprocess
+import threading
+import Queue
+import binascii
+import numpy
+from Compiler.config import P_VALUES
+from Compiler.cache import add_output
 
+# Values per buffer of the runtime, see Processor/Buffer.h
+BUFFER_SIZE = 101
+
+def get_prime(lgp=128, nparties=2, lg2=40):
+    """
+    The prime of the field :math:`GF(p)` with bit length ``lgp``.
+    
+    Prefers the prime in ``Player-Data/<nparties>-<lgp>-<lg2>/Params-Data`` 
+    as set up for the runtime and falls back to ``P_VALUES`` in ``Compiler/config.py``.
+    """
+    params = "Player-Data/{}-{}-{}/Params-Data".format(nparties, lgp, lg2)
+    if os.path.exists(params):
+        with open(params) as params_file:
+            return int(params_file.readline())
+    return P_VALUES[lgp]
+
+def fp_bytes(values, prime):
+    """
+    Converts integers to the binary format of ``gfp::output``, i.e. the Montgomery form 
+    :math:`x \\cdot 2^{64t} \\bmod p` in :math:`t` little-endian 64-bit limbs.
+    
+    Every distinct value is converted once, the output is assembled with NumPy.
+    
+    :param values: list of integers
+    :param prime: the prime :math:`p`
+    """
+    if len(values) == 0:
+        return ''
+    limbs = (prime.bit_length() + 63) // 64
+    width = 8 * limbs
+    montgomery = (1 << (64 * limbs)) % prime
+    try:
+        values = numpy.asarray(values, dtype=numpy.int64)
+    except OverflowError:
+        values = numpy.asarray(values, dtype=object)
+    distinct, inverse = numpy.unique(values, return_inverse=True)
+    table = ''.join(binascii.unhexlify('%0*x' % (2 * width, int(x) * montgomery % prime))[::-1] 
+                    for x in distinct)
+    table = numpy.frombuffer(table, dtype=numpy.uint8).reshape(len(distinct), width)
+    return table[inverse].tobytes()
+
+def fp_padding(n, prime):
+    """
+    The zeros ``gen_input_fp.x`` appends to ``n`` values to fill the last buffer.
+    """
+    width = 8 * ((prime.bit_length() + 63) // 64)
+    return '\0' * (width * (BUFFER_SIZE - n % BUFFER_SIZE))
 
 class InputFp:
     """
@@ -11,18 +65,38 @@ class InputFp:
     
     Buffers and generates the private input for the specified ``player``.
     
+    In streaming mode the buffer is converted in chunks of ``chunk_size`` values
+    as soon as they are appended. A background thread pipes each chunk through
+    ``gen_input_fp.x`` and appends the result to the private input file, so at most
+    a few chunks are held in memory and the conversion overlaps with compilation.
+    
     :param player: the player
+    :param stream: convert the input in chunks while it is appended (default: ``False``)
+    :param chunk_size: number of values per chunk, rounded down to a multiple of ``BUFFER_SIZE``
+    :param native: write the binary format directly instead of calling ``gen_input_fp.x`` (default: ``False``)
+    :param lgp: bit length of the prime for the native writer (default: 128)
     """
-    def __init__(self,player):
+    def __init__(self,player, stream=False, chunk_size=10000*BUFFER_SIZE, native=False, lgp=128):
         self.input_fp = []
         self.player = player
+        self.stream = stream
+        self.chunk_size = max(chunk_size - chunk_size % BUFFER_SIZE, BUFFER_SIZE)
+        self.writer = None
+        self.prime = get_prime(lgp) if native else None
         
     def clear(self):
         """
         Reset the input buffer.
+        
+        In streaming mode this also discards everything written so far.
         """
         self.input_fp = []
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
     
+    def _filename(self):
+        return "Player-Data/Private-Input-{}".format(self.player)
         
     def gen_input_fp(self):
         """
@@ -32,14 +106,39 @@ class InputFp:
         
             Call it exactly once and at the end, because it overwrites previous files.
         """
-        args = ("./gen_input_fp.x", "-i", "-", "-o", "Player-Data/Private-Input-{}".format(self.player))
+        if self.stream:
+            self._flush(last=True)
+            self.writer.close()
+            self.writer = None
+            return
+        if self.prime is not None:
+            with open(self._filename(), 'wb') as input_file:
+                input_file.write(fp_bytes(self.input_fp, self.prime))
+                input_file.write(fp_padding(len(self.input_fp), self.prime))
+            return
+        args = ("./gen_input_fp.x", "-i", "-", "-o", self._filename())
         proc = subprocess.Popen(args, stdin=subprocess.PIPE)
         proc.stdin.write("{}\n".format(len(self.input_fp)))
         for value in self.input_fp:
             proc.stdin.write("{}\n".format(value))
         proc.wait()
+        add_output(self._filename())
         #print("Integers written to input %s: %s" % ( player, len(values)) )
     
+    def _flush(self, last=False):
+        """
+        Hand all complete chunks of the buffer to the writer thread.
+        With ``last`` the remainder is handed over as the final chunk.
+        """
+        if self.writer is None:
+            self.writer = _ChunkWriter(self._filename(), self.prime)
+        while len(self.input_fp) >= self.chunk_size:
+            self.writer.put(self.input_fp[:self.chunk_size])
+            del self.input_fp[:self.chunk_size]
+        if last:
+            self.writer.put(self.input_fp, last=True)
+            self.input_fp = []
+    
     def append_fp(self, *values): 
         """
         Append an integer to the buffer.
@@ -47,6 +146,8 @@ class InputFp:
         :param values: one or more integers
         """
         self.input_fp += values
+        if self.stream and len(self.input_fp) >= self.chunk_size:
+            self._flush()
         
     def append_fp_array(self, values):
         """
@@ -55,3 +156,65 @@ class InputFp:
         :param values: a list of values.
         """
         self.append_fp(*values)
+
+
+class _ChunkWriter(threading.Thread):
+    """
+    Background thread that converts chunks with ``gen_input_fp.x`` and appends them to ``filename``.
+    With a ``prime`` the chunks are converted natively by ``fp_bytes`` instead.
+    
+    ``gen_input_fp.x`` pads its output with zeros to a multiple of ``BUFFER_SIZE``.
+    Full chunks are multiples of ``BUFFER_SIZE``, so their padding is exactly one buffer
+    and gets cut off. Only the padding of the last chunk is kept, which makes the file
+    identical to a single conversion of all values.
+    """
+    def __init__(self, filename, prime=None):
+        threading.Thread.__init__(self)
+        self.prime = prime
+        self.daemon = True
+        self.file = open(filename, 'wb')
+        self.queue = Queue.Queue(maxsize=2)
+        self.error = None
+        self.start()
+    
+    def put(self, chunk, last=False):
+        self._check()
+        self.queue.put((chunk, last))
+    
+    def close(self):
+        self.queue.put((None, True))
+        self.join()
+        self.file.close()
+        self._check()
+    
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("Failed to write private input: {}".format(self.error))
+    
+    def run(self):
+        while True:
+            chunk, last = self.queue.get()
+            if chunk is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.file.write(self._convert(chunk, last))
+            except Exception as e:
+                self.error = e
+    
+    def _convert(self, chunk, last):
+        if self.prime is not None:
+            output = fp_bytes(chunk, self.prime)
+            if last:
+                output += fp_padding(len(chunk), self.prime)
+            return output
+        args = ("./gen_input_fp.x", "-i", "-", "-o", "-")
+        proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        text = "{}\n".format(len(chunk)) + "".join("{}\n".format(value) for value in chunk)
+        output, _ = proc.communicate(text)
+        if proc.returncode != 0:
+            raise RuntimeError("gen_input_fp.x exited with {}".format(proc.returncode))
+        if not last:
+            output = output[:len(output) * len(chunk) // (len(chunk) + BUFFER_SIZE)]
+        return output
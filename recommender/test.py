@@ -31,18 +31,23 @@ from recommender.collaborative_filter import UBCosineCF, IBCosineCF, SparseUBCos
 
 from Compiler.types import sfix
 from Compiler.library import *
+from Compiler.cache import add_input
 
 
 import timeit
 import time
 import sys
+import multiprocessing
+import numpy
+from scipy.sparse import issparse, csr_matrix
 from math import sqrt, floor, ceil
 
 
-# Fix constant seed from compiler
+# The compiler fixes the seed of the global generator, so the samples have their own.
+# SPDZTest seeds it with the program name and the test id, which keeps compilations 
+# reproducible for compile.py --cache. BaselineTest seeds it from the system.
 import random as random2
-random = random2.Random()
-random.seed()
+random = random2.Random(0)
 
 # Enlarge python recursion limit for large code.
 sys.setrecursionlimit(1000000)
@@ -84,12 +89,17 @@ class Test():
         
         return self
     
-    def eval_data(self, n=None, m=None): 
+    def eval_data(self, n=None, m=None, sparse=False): 
         """
         Loads the MovieLens Dataset from file in the specified dimension n x m.
+        
+        With ``sparse=True`` the matrices are kept in CSR format. This is only supported by ``BaselineTest``.
         """
-        D = Dataset(folder)
-        self.R, self.B, self.Rlist, self.n, self.m = D.get(n,m)
+        D = Dataset(folder, columns=True)
+        # the binary cache of the dataset only checks the size and time of the source files
+        add_input(D.ratings_file_path)
+        add_input(D.movies_file_path)
+        self.R, self.B, self.Rlist, self.n, self.m = D.get(n,m, sparse)
         return self
     
     def mean_centered(self):
@@ -98,6 +108,9 @@ class Test():
         
         Transforms the dataset to a mean-centered version.
         """
+        if issparse(self.R):
+            return self._mean_centered_sparse()
+        
         self.mean = [0 for _ in range(self.n)]
         for u in range(self.n):
             count = 0
@@ -115,6 +128,24 @@ class Test():
         
         return self
     
+    def _mean_centered_sparse(self):
+        """
+        Mean-centering for ratings in CSR format. Only the stored ratings are shifted.
+        """
+        self.R = csr_matrix(self.R)
+        sums = numpy.asarray(self.R.sum(axis=1)).ravel()
+        counts = numpy.asarray(self.B.sum(axis=1)).ravel()
+        self.mean = [0 for _ in range(self.n)]
+        for u in range(self.n):
+            if counts[u] == 0:
+                print "No ratings for user ",u
+                self.mean[u] = 2.5
+            else:
+                self.mean[u] = sums[u]/counts[u]
+        rows = numpy.repeat(numpy.arange(self.n), numpy.diff(self.R.indptr))
+        self.R.data = self.R.data - numpy.asarray(self.mean)[rows]
+        return self
+    
     def compute_rowcap(self):
         """
         Decduces an optimal row capacity c for the sparse representation.
@@ -134,15 +165,20 @@ class SPDZTest(Test):
     This class builds an SPDZ test when called in an MPC Program. Do not use it in pure Python.
     """
     
-    def __init__(self, id, IO):
+    def __init__(self, id, IO, n_threads=1, batch_size=1):
         """
         Create a new Test instance.
         
         id: unique identifier for the timer objects.
         IO: gen_input_fp connector, which should be used for private input.
+        n_threads: number of threads to build the similarity models.
+        batch_size: number of similarities that are normalized together.
         """
         Test.__init__(self, id)
+        random.seed('%s-%s' % (get_program().name, id))
         self.IO = IO
+        self.n_threads = n_threads
+        self.batch_size = batch_size
 
     
     def _prep_private_plain_input(self):
@@ -208,7 +244,7 @@ class SPDZTest(Test):
                         break;
             
             for _ in range(tailpointer, cap):
-                input += [-1,0,0] # Padding
+                input += [self.m,0,0] # Padding behind all item keys
             input += [tailpointer]
             self.IO.append_fp_array(input)
             
@@ -234,7 +270,7 @@ class SPDZTest(Test):
         print_ln("n = %s\nm = %s", self.n, self.m)
         print_ln("")
         
-        self.CF = UBCosineCF(self.n,self.m)
+        self.CF = UBCosineCF(self.n,self.m, self.n_threads, self.batch_size)
         
         self._prep_private_plain_input()
         self._private_plain_input()
@@ -246,16 +282,18 @@ class SPDZTest(Test):
         self.CF.build_model()
         stop_timer(self.id*10+2)
 
-    def buildUBsparse(self, cap):
+    def buildUBsparse(self, cap, oram=False):
         """
         Compiles to bytecode that reads a sparse rating matrix and and builds a user-based similarity model.
+        
+        oram: also store the ratings in an ORAM, which is required for predictions.
         """
         print_ln("############################\nNEW TEST RUN")
         print_ln("Sparse User-based CF")
         print_ln("n = %s\nm = %s, cap = %s", self.n, self.m, cap)
         print_ln("")
         
-        self.CF = SparseUBCosineCF(self.n,self.m, cap)
+        self.CF = SparseUBCosineCF(self.n,self.m, cap, self.n_threads, self.batch_size, oram)
         
         self._prep_private_sparse_input(cap)
         self._private_sparse_input()
@@ -276,7 +314,7 @@ class SPDZTest(Test):
         print_ln("n = %s\nm = %s", self.n, self.m)
         print_ln("")
         
-        self.CF = IBCosineCF(self.n, self.m)
+        self.CF = IBCosineCF(self.n, self.m, self.n_threads, self.batch_size)
         
         self._prep_private_plain_input()
         self._private_plain_input()
@@ -294,6 +332,9 @@ class SPDZTest(Test):
         Samples a specified number of ratings.
         For each knn-parameter combination sampsize predictions are made. Then it computes the MAE and RMSE.
         
+        The samples are written to the public input of the program and the predictions run in a 
+        loop at runtime, so the size of the bytecode does not depend on sampsize.
+        
         sampsize: sampling size, e.g. 5000
         knn_params: array of parameter pairs (k,f') , e.g.
         [(5,14), (6,14)]
@@ -308,23 +349,26 @@ class SPDZTest(Test):
         for (k, f) in knn_params:
             start_timer(self.id*100+timer_count)
             
-            mae = cfix(0)
-            rmse = cfix(0)
+            mae = cfix.MemValue(0)
+            rmse = cfix.MemValue(0)
             
             sampling = random.sample(self.Rlist,sampsize)
+            # Public input is integer, so the rating relative to the mean is a raw fixed-point value
+            sampling = [(u, i, int(round((r - self.mean[u]) * 2**cfix.f))) for (u,i,r) in sampling]
             
-            for (u,i,r) in sampling:
+            @foreach_enumerate(sampling)
+            def sample_loop(j, u, i, r):
                 print_str("%s to %s    \r", u, i)
-                prediction = self.CF.nn_prediction(u,i, k, f) + cfix(self.mean[u])
+                prediction = self.CF.nn_prediction(u,i, k, f)
                 if isinstance(prediction, sfix):
                     prediction = prediction.reveal()
-                error = prediction - cfix(r)
+                error = prediction - cfix(cint(r))
                 error = cint(error>=0).if_else(error, -error)
-                mae += error
-                rmse += (error)**2
+                mae.write(mae.read() + error)
+                rmse.write(rmse.read() + (error)**2)
             
-            mae = mae / sampsize
-            rmse = (rmse / sampsize).sqrt()
+            mae = mae.read() / sampsize
+            rmse = (rmse.read() / sampsize).sqrt()
             
             print_ln("%s   %s   %s %s",k, f, mae, rmse)
             stop_timer(self.id*100+timer_count)
@@ -351,9 +395,16 @@ class BaselineTest(Test):
     """
     This class tests the baseline implementation. Do not call it from MPC, neither compile it with SPDZ.
     """
-    def buildUBbaseline(self):
+    def __init__(self, id):
+        Test.__init__(self, id)
+        random.seed()
+    
+    def buildUBbaseline(self, index=False):
         """
         Builds a user-based similarity model and measures the time.
+        
+        index: also build the neighbour index. Only the single predictions of 
+        ``debugPredictions`` use it, which builds it on demand otherwise.
         """
         print("############################\nNEW TEST RUN")
         print("User-based baseline CF")
@@ -364,15 +415,21 @@ class BaselineTest(Test):
         
         print "BUILD MODEL"
         tmodel=timeit.timeit(self.CF.build_model, number=1)
+        tindex = 0
+        if index:
+            tindex=timeit.timeit(self.CF.build_index, number=1)
         
-        print "{:4} {:4}  {:8}".format("n","m", "tmodel")
-        print "{:<4d} {:<4d} {:8.4f}".format(self.n,self.m, tmodel)
+        print "{:4} {:4}  {:8} {:8}".format("n","m", "tmodel", "tindex")
+        print "{:<4d} {:<4d} {:8.4f} {:8.4f}".format(self.n,self.m, tmodel, tindex)
         
 
     
-    def buildIBbaseline(self):
+    def buildIBbaseline(self, index=False):
         """
         Builds an item-based similarity model and measures the time.
+        
+        index: also build the neighbour index. Only the single predictions of 
+        ``debugPredictions`` use it, which builds it on demand otherwise.
         """
         print("############################\nNEW TEST RUN")
         print("Item-based baseline CF")
@@ -383,14 +440,17 @@ class BaselineTest(Test):
         
         print "BUILD MODEL"
         tmodel=timeit.timeit(self.CF.build_model, number=1)
-        print "{:4} {:4}  {:8}".format("n","m", "tmodel")
-        print "{:<4d} {:<4d} {:8.4f}".format(self.n,self.m, tmodel)
+        tindex = 0
+        if index:
+            tindex=timeit.timeit(self.CF.build_index, number=1)
+        print "{:4} {:4}  {:8} {:8}".format("n","m", "tmodel", "tindex")
+        print "{:<4d} {:<4d} {:8.4f} {:8.4f}".format(self.n,self.m, tmodel, tindex)
     
     def testPredictions(self, knn_params, sampsize): 
         """
         Evaluate the accuracy of the baseline
         Samples a specified number of ratings.
-        For each knn-parameter combination sampsize predictions are made. Then it computes the MAE and RMSE.
+        For each knn-parameter combination sampsize predictions are made in one batch. Then it computes the MAE and RMSE.
         
         sampsize: sampling size, e.g. 5000
         knn_params: array of parameter pairs (k,f') , e.g.
@@ -404,27 +464,66 @@ class BaselineTest(Test):
         print "{:4} {:4}  {:8} {:8} {:8} {:8}".format("k","f", "mae", "rmse", "var", "tpred")
         
         for (k, f) in knn_params:
-            stats = []
-            start_time = time.clock()
-            mae = 0
-            rmse = 0
-            
             sampling = random.sample(self.Rlist,sampsize)
-            
-            for (u,i,r) in sampling:
-                    prediction = self.CF.nn_prediction(u,i, k, f)
-                    error = abs(prediction + self.mean[u] - r)
-                    mae += error
-                    rmse += (error)**2
-                    stats.append(error)
-            
-            mae = mae / sampsize
-            rmse = sqrt(rmse / sampsize)
-            end_time = time.clock()
-            tpred = end_time-start_time
-            from numpy import var
-            v = var(stats)
-            print "{:<4d} {:<4d}  {:8.6f} {:8.6f} {:8.6f} {:8.4f}".format(k,f, mae, rmse, v, tpred)
+            print "{:<4d} {:<4d}  {:8.6f} {:8.6f} {:8.6f} {:8.4f}".format(*self._evaluate(k, f, sampling))
+    
+    def sweepPredictions(self, knn_params, sampsize, processes=None):
+        """
+        Evaluate the accuracy of the baseline like testPredictions, but for all knn-parameter 
+        combinations in parallel. The model is built once and shared read-only with the 
+        worker processes by forking.
+        
+        sampsize: sampling size, e.g. 5000
+        knn_params: array of parameter pairs (k,f') , e.g.
+        [(5,14), (6,14)]
+        processes: number of worker processes (default: number of cores)
+        """
+        global _sweep_test
+        
+        if self.CF == None:
+            raise RuntimeError("Call another test to build model first!")
+        
+        tasks = [(k, f, random.sample(self.Rlist,sampsize)) for (k, f) in knn_params]
+        
+        _sweep_test = self
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_sweep_worker, tasks)
+        finally:
+            pool.close()
+            pool.join()
+            _sweep_test = None
+        
+        print "PREDICTIONS"
+        print "{:4} {:4}  {:8} {:8} {:8} {:8}".format("k","f", "mae", "rmse", "var", "tpred")
+        for result in results:
+            print "{:<4d} {:<4d}  {:8.6f} {:8.6f} {:8.6f} {:8.4f}".format(*result)
+    
+    def _evaluate(self, k, f, sampling):
+        """
+        Predicts all sampled ratings with the parameters k and f'.
+        
+        Returns k, f, mae, rmse, var and the prediction time.
+        """
+        stats = []
+        start_time = time.clock()
+        mae = 0
+        rmse = 0
+        
+        pairs = [(u,i) for (u,i,r) in sampling]
+        predictions = self.CF.predict_many(pairs, k, f)
+        for (u,i,r), prediction in zip(sampling, predictions):
+                error = abs(prediction + self.mean[u] - r)
+                mae += error
+                rmse += (error)**2
+                stats.append(error)
+        
+        mae = mae / len(sampling)
+        rmse = sqrt(rmse / len(sampling))
+        end_time = time.clock()
+        tpred = end_time-start_time
+        v = numpy.var(stats)
+        return k, f, mae, rmse, v, tpred
 
     def debugPredictions(self, k, f):
         """
@@ -432,6 +531,8 @@ class BaselineTest(Test):
         """
         if self.CF == None:
             raise RuntimeError("Call another test to build model first!")
+        if self.CF.neighbours is None:
+            self.CF.build_index()
         print "PREDICTIONS"
         for u in range(min(self.n,10)):
             for i in range(min(self.m,10)):
@@ -439,4 +540,14 @@ class BaselineTest(Test):
                 prediction += self.mean[u]
                 print "{: 1.5f}".format(prediction),
             print ' '
-            
\ No newline at end of file
+
+
+# Test shared with the forked workers of BaselineTest.sweepPredictions
+_sweep_test = None
+
+def _sweep_worker(task):
+    """
+    Evaluates one knn-parameter combination of a sweep in a worker process.
+    """
+    k, f, sampling = task
+    return _sweep_test._evaluate(k, f, sampling)
@@ -16,11 +16,11 @@ def estimate_ubk():
          
     T = BaselineTest(1).eval_data().mean_centered() # Maximum Size
     T.buildUBbaseline()
-    T.testPredictions(knn_params, NPREDICTIONS)
+    T.sweepPredictions(knn_params, NPREDICTIONS)
              
     T = BaselineTest(2).eval_data().mean_centered() # Maximum Size
     T.buildIBbaseline()
-    T.testPredictions(knn_params, NPREDICTIONS)
+    T.sweepPredictions(knn_params, NPREDICTIONS)
     
 def estimate_ibk():
     """
@@ -34,7 +34,7 @@ def estimate_ibk():
              
     T = BaselineTest(2).eval_data().mean_centered() # Maximum Size
     T.buildIBbaseline()
-    T.testPredictions(knn_params, NPREDICTIONS)
+    T.sweepPredictions(knn_params, NPREDICTIONS)
 
 def estimate_ubf():
     """
@@ -47,7 +47,7 @@ def estimate_ubf():
       
     T = BaselineTest(10).eval_data().mean_centered() # Maximum Size
     T.buildUBbaseline()
-    T.testPredictions(knn_params, NPREDICTIONS)
+    T.sweepPredictions(knn_params, NPREDICTIONS)
     
 def estimate_ibf():
     """
@@ -60,7 +60,7 @@ def estimate_ibf():
       
     T = BaselineTest(10).eval_data().mean_centered() # Maximum Size
     T.buildUBbaseline()
-    T.testPredictions(knn_params, NPREDICTIONS)
+    T.sweepPredictions(knn_params, NPREDICTIONS)
           
 
 def eval_ub():
@@ -0,0 +1,101 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Base class for tests that compile programs with ``compile.py`` and run them with the emulator.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from optparse import Values
+from StringIO import StringIO
+
+# the main directory with compile.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from Compiler import emulator
+
+class ProgramTestCase(unittest.TestCase):
+    """
+    Compiles programs in a temporary directory with its own ``Programs`` and ``Player-Data``.
+
+    The directory also holds an empty ``config_mine.py``, which the compiler imports if it exists
+    and ``recommender/collaborative_filter.py`` requires.
+    """
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        for directory in ['Programs/Source', 'Player-Data']:
+            os.makedirs(os.path.join(self.directory, directory))
+        open(os.path.join(self.directory, 'config_mine.py'), 'w').close()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def write_source(self, name, source):
+        with open('Programs/Source/%s.mpc' % name, 'w') as f:
+            f.write(source)
+
+    def compile(self, name, source=None, options=(), args=(), setup=None):
+        """
+        Compiles program ``name`` with ``source`` in a new process, as ``compile.py options name args``.
+        The Python statements ``setup`` are run before the compiler, for example to replace parts of it.
+
+        Returns the output of the compiler.
+        """
+        if source is not None:
+            self.write_source(name, source)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([ROOT, self.directory] +
+                                            filter(None, [env.get('PYTHONPATH')]))
+        compiler = os.path.join(ROOT, 'compile.py')
+        if setup is None:
+            command = [sys.executable, compiler]
+        else:
+            command = [sys.executable, '-c', '%s\nexecfile(%r)' % (setup, compiler)]
+        command += list(options) + [name] + list(args)
+        process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            self.fail('Compilation of %s failed:\n%s' % (name, output[-5000:]))
+        return output
+
+    def read_outputs(self, name):
+        """
+        Returns the contents of the files written by the compilation of ``name`` by filename:
+        bytecode, schedule, public and private inputs.
+        """
+        filenames = glob.glob('Programs/Bytecode/%s-*.bc' % name) + \
+                    glob.glob('Player-Data/Private-Input-*') + \
+                    ['Programs/Schedules/%s.sch' % name, 'Programs/Public-Input/%s' % name]
+        outputs = {}
+        for filename in filenames:
+            with open(filename, 'rb') as f:
+                outputs[filename] = f.read()
+        return outputs
+
+    def emulate(self, name, args=(), param=-1, galois=40):
+        """
+        Runs the compiled program ``name`` with ``Compiler.emulator.emulate``.
+
+        Returns the emulator and the output of the program.
+        """
+        options = Values({'param': param, 'galois': galois})
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            res = emulator.emulate([name] + list(args), options)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        return res, output[:output.rfind('Emulated %s in' % res.name)]
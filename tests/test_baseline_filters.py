@@ -0,0 +1,98 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Tests of the baseline filters in ``recommender/baseline.py``.
+
+Run from the main directory with ``python -m unittest discover tests``.
+"""
+
+import unittest
+import numpy
+from scipy.sparse import csr_matrix
+
+from recommender.baseline import BaselineUBCF, BaselineIBCF
+
+def random_ratings(n, m, density=0.3, seed=0):
+    """ Mean-centered random ratings, so that there are negative similarities. """
+    rand = numpy.random.RandomState(seed)
+    B = (rand.random_sample((n, m)) < density).astype(int)
+    R = rand.randint(1, 6, size=(n, m)) * B
+    counts = numpy.maximum(B.sum(axis=1), 1)
+    means = R.sum(axis=1) / counts.astype(float)
+    return (R - means[:, None]) * B, B
+
+
+class NeighbourIndexTest(unittest.TestCase):
+    """ Predictions with the neighbour index equal the ones of the scan over all peers. """
+    N = 40
+    M = 200
+    KNN_PARAMS = [(1, 4), (3, 14), (9, 4), (11, 14)]
+    # similarities and ratings of the peers of user 0, which has not rated item 0
+    S = numpy.array([[1., 0.9, -0.5, 0.2, 0.7],
+                     [0.9, 1., 0., 0., 0.],
+                     [-0.5, 0., 1., 0., 0.],
+                     [0.2, 0., 0., 1., 0.],
+                     [0.7, 0., 0., 0., 1.]])
+    R = numpy.array([[0.], [1.], [-2.], [2.], [-1.]])
+    B = numpy.array([[0], [1], [1], [1], [1]])
+
+    def check(self, cls, sparse):
+        R, B = random_ratings(self.N, self.M)
+        if sparse:
+            R, B = csr_matrix(R), csr_matrix(B)
+        scan = cls(self.N, self.M, R, B)
+        scan.build_model()
+        indexed = cls(self.N, self.M, R, B)
+        indexed.build_model()
+        indexed.build_index()
+        self.assertLess(scan.S.min(), 0)
+        rand = numpy.random.RandomState(1)
+        pairs = zip(rand.randint(self.N, size=50), rand.randint(self.M, size=50))
+        for k, f in self.KNN_PARAMS:
+            for u, i in pairs:
+                self.assertAlmostEqual(scan.nn_prediction_top_k(u, i, k),
+                                       indexed.nn_prediction_top_k(u, i, k), places=10,
+                                       msg='top k u={} i={} k={}'.format(u, i, k))
+                self.assertAlmostEqual(scan.nn_prediction_bs(u, i, k, f),
+                                       indexed.nn_prediction_bs(u, i, k, f), places=10,
+                                       msg='bs u={} i={} k={} f={}'.format(u, i, k, f))
+
+    def test_ub(self):
+        self.check(BaselineUBCF, False)
+
+    def test_ub_sparse(self):
+        self.check(BaselineUBCF, True)
+
+    def test_ib(self):
+        self.check(BaselineIBCF, False)
+
+    def test_ib_sparse(self):
+        self.check(BaselineIBCF, True)
+
+    def test_top_k(self):
+        """ The top k variant weights the k most similar peers that rated the item. """
+        CF = BaselineUBCF(5, 1, self.R, self.B)
+        CF.S = self.S
+        for index in [False, True]:
+            if index:
+                CF.build_index()
+            self.assertAlmostEqual(CF.nn_prediction_top_k(0, 0, 2), (0.9 - 0.7) / 1.6)
+            self.assertAlmostEqual(CF.nn_prediction_top_k(0, 0, 4), (0.9 + 0.4 - 0.7) / 1.8)
+
+    def test_sort(self):
+        """ The sort variant keeps its legacy selection, also with a neighbour index. """
+        CF = BaselineUBCF(5, 1, self.R, self.B)
+        CF.S = self.S
+        for index in [False, True]:
+            if index:
+                CF.build_index()
+            # peers 1 and 2, the negative similarity is not weighted
+            self.assertAlmostEqual(CF.nn_prediction_sort(0, 0, 2), 1.)
+            # peers 1, 2 and 3, peer 4 is more similar than the minimum and not swapped in
+            self.assertAlmostEqual(CF.nn_prediction_sort(0, 0, 3), (0.9 + 0.4) / 1.1)
+            self.assertAlmostEqual(CF.nn_prediction_sort(0, 0, 4), (0.9 + 0.4 - 0.7) / 1.8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Tests of the compilation cache of ``compile.py --cache`` in ``Compiler/cache.py``.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from program_test import ProgramTestCase
+from test_compile import PROGRAM, without_command_line
+
+# writes public input and private input at compile time
+INPUT_PROGRAM = PROGRAM + '''
+from recommender.io import InputFp
+IO = InputFp(0, native=True)
+IO.append_fp_array([3, 1, 4, 1, 5])
+IO.gen_input_fp()
+x = sint.get_input_from(0)
+print_ln('%s', x.reveal())
+print_ln('%s', public_input())
+program.public_input('2 7 1 8')
+'''
+
+# imports a module that is found with PYTHONPATH only
+MODULE_PROGRAM = '''
+from constants import VALUE
+print_ln('%s', (sint(VALUE) * sint(2)).reveal())
+'''
+
+RANDOM_PROGRAM = '''
+import random
+rand = random.Random(%s)
+print_ln('%%s', (sint(rand.randrange(2**30)) * sint(2)).reveal())
+'''
+
+# samples predictions with the generator of recommender.test
+SAMPLING_PROGRAM = '''
+from recommender.test import SPDZTest
+from recommender.io import InputFp
+IO = InputFp(0, native=True)
+T = SPDZTest(1, IO).small_data().mean_centered()
+T.buildUBplain()
+T.testPredictions([(2, 4)], 3)
+IO.gen_input_fp()
+'''
+
+
+class ProgramCacheTest(ProgramTestCase):
+    def compile_cached(self, name, source=None):
+        """ Compiles with the cache and returns the output and whether the cache was used. """
+        output = self.compile(name, source, options=['--cache'])
+        return output, 'Using cached compilation of %s' % name in output
+
+    def read_outputs(self, name):
+        return without_command_line(ProgramTestCase.read_outputs(self, name), name)
+
+    def remove_outputs(self, name):
+        for filename in ProgramTestCase.read_outputs(self, name):
+            os.remove(filename)
+
+    def assertOutputsEqual(self, outputs, expected):
+        self.assertEqual(sorted(outputs), sorted(expected))
+        for filename in expected:
+            self.assertTrue(outputs[filename] == expected[filename], '%s differs' % filename)
+
+    def test_hit(self):
+        """ A cache hit restores the same schedule, bytecode, public and private inputs. """
+        self.compile('inputs', INPUT_PROGRAM)
+        expected = self.read_outputs('inputs')
+        self.assertIn('Player-Data/Private-Input-0', expected)
+        self.assertTrue(expected['Programs/Public-Input/inputs'])
+        self.remove_outputs('inputs')
+        _, cached = self.compile_cached('inputs')
+        self.assertFalse(cached)
+        self.assertOutputsEqual(self.read_outputs('inputs'), expected)
+        self.remove_outputs('inputs')
+        _, cached = self.compile_cached('inputs')
+        self.assertTrue(cached)
+        self.assertOutputsEqual(self.read_outputs('inputs'), expected)
+
+    def test_tapes(self):
+        """ Unchanged tapes of a changed program are taken from the cache. """
+        self.compile_cached('tapes', PROGRAM)
+        self.write_source('tapes', PROGRAM + "print_ln('changed')\n")
+        output, cached = self.compile_cached('tapes')
+        self.assertFalse(cached)
+        self.assertIn('Using cached tape', output)
+        outputs = self.read_outputs('tapes')
+        self.compile('tapes')
+        self.assertOutputsEqual(outputs, self.read_outputs('tapes'))
+
+    def test_imported_module(self):
+        """ Changing a module found with PYTHONPATH invalidates the cache. """
+        # outside of the working directory
+        lib = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lib)
+        pythonpath = os.environ.get('PYTHONPATH')
+        os.environ['PYTHONPATH'] = lib
+        try:
+            with open(os.path.join(lib, 'constants.py'), 'w') as f:
+                f.write('VALUE = 3\n')
+            self.compile_cached('module', MODULE_PROGRAM)
+            _, cached = self.compile_cached('module')
+            self.assertTrue(cached)
+            outputs = self.read_outputs('module')
+            # the compiled module of the same second would be used
+            if os.path.exists(os.path.join(lib, 'constants.pyc')):
+                os.remove(os.path.join(lib, 'constants.pyc'))
+            with open(os.path.join(lib, 'constants.py'), 'w') as f:
+                f.write('VALUE = 4\n')
+            output, cached = self.compile_cached('module')
+            self.assertFalse(cached)
+            self.assertIn('outdated by %s' % os.path.join(lib, 'constants.py'), output)
+            self.assertNotEqual(self.read_outputs('module'), outputs)
+        finally:
+            if pythonpath is None:
+                del os.environ['PYTHONPATH']
+            else:
+                os.environ['PYTHONPATH'] = pythonpath
+
+    def test_unseeded_random(self):
+        """ Compilations with randomness from the operating system are not cached. """
+        output, _ = self.compile_cached('unseeded', RANDOM_PROGRAM % '')
+        self.assertIn('Not caching', output)
+        _, cached = self.compile_cached('unseeded')
+        self.assertFalse(cached)
+        self.assertFalse(os.path.exists('Programs/Cache/programs'))
+
+    def test_seeded_random(self):
+        self.compile_cached('seeded', RANDOM_PROGRAM % '1')
+        _, cached = self.compile_cached('seeded')
+        self.assertTrue(cached)
+
+    def test_sampling(self):
+        """ The samples of SPDZTest are the same in every compilation, so it is cached. """
+        output, _ = self.compile_cached('sampling', SAMPLING_PROGRAM)
+        self.assertNotIn('Not caching', output)
+        outputs = self.read_outputs('sampling')
+        self.remove_outputs('sampling')
+        _, cached = self.compile_cached('sampling')
+        self.assertTrue(cached)
+        self.assertOutputsEqual(self.read_outputs('sampling'), outputs)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,454 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Tests of the secure collaborative filters in ``recommender/collaborative_filter.py``,
+compiled and run with the emulator.
+"""
+
+import sys
+import unittest
+import numpy
+
+from program_test import ProgramTestCase
+from scipy.sparse import csr_matrix
+
+from recommender.baseline import BaselineUBCF, cosine_matrix, sparse_cosine_matrix
+
+R = [[0, 1, 3, 4, 0],
+     [2, 1, 0, 4, 0],
+     [0, 2, 3, 0, 3],
+     [5, 0, 2, 1, 0],
+     [4, 3, 0, 1, 4]]
+# new ratings of user 2
+R_NEW = [1, 0, 4, 2, 0]
+
+SAVE_LOAD_UPDATE = '''
+from recommender.collaborative_filter import UBCosineCF
+from recommender.io import InputFp
+program.bit_length = 84
+program.security = 40
+sfix.set_precision(14, 28)
+cfix.set_precision(14, 28)
+R = %r
+R_NEW = %r
+IO = InputFp(0, native=True)
+def append_rows(rows):
+    IO.append_fp_array([r * 2**sfix.f for row in rows for r in row])
+    IO.append_fp_array([r**2 * 2**sfix.f for row in rows for r in row])
+    IO.append_fp_array([int(r != 0) for row in rows for r in row])
+
+CF = UBCosineCF(5, 5)
+append_rows(R)
+for loader in CF.load_ratings_from, CF.load_ratings2_from, CF.load_bitratings_from:
+    for u in range(5):
+        loader(u, 0)
+CF.build_model()
+CF.save_model(ratings=True)
+
+# CF is not deleted, so CF2 starts with empty memory like another program
+CF2 = UBCosineCF(5, 5)
+print_ln('position %%s', CF2.load_model(0, ratings=True))
+append_rows([R_NEW])
+CF2.update_user(2, 0)
+for u in range(5):
+    for v in range(5):
+        print_str('%%s ', CF2.S[u][v].reveal())
+    print_ln('')
+IO.gen_input_fp()
+''' % (R, R_NEW)
+
+# user 2 has no ratings and item 5 has no ratings, so their similarities are undefined
+DENSE_R = [[1.5, 0, -2, 0.5, 1, 0],
+           [1, 2, -1, 0, 0, 0],
+           [0, 0, 0, 0, 0, 0],
+           [2, 0.5, -1.5, 1, -0.5, 0],
+           [0.5, -1, 0, 2, 1.5, 0]]
+
+# loads DENSE_R into the filter CF, the body follows
+DENSE = '''
+from recommender.collaborative_filter import *
+from recommender.io import InputFp
+program.bit_length = 84
+program.security = 40
+sfix.set_precision(14, 28)
+cfix.set_precision(14, 28)
+R = %r
+n, m = len(R), len(R[0])
+IO = InputFp(0, native=True)
+IO.append_fp_array([int(r * 2**sfix.f) for row in R for r in row])
+IO.append_fp_array([int(r**2 * 2**sfix.f) for row in R for r in row])
+IO.append_fp_array([int(r != 0) for row in R for r in row])
+CF = %%s
+for loader in CF.load_ratings_from, CF.load_ratings2_from, CF.load_bitratings_from:
+    for u in range(n):
+        loader(u, 0)
+''' % DENSE_R
+
+# the raw sums and the similarity of all pairs of the rows or columns
+COSINE_SUMS = '''
+for a in range(%s):
+    for b in range(a + 1, %s):
+        d, sa, sb = CF.cosine_sums(a, b)
+        print_ln('%%s %%s %%s %%s %%s %%s', a, b, d.reveal(), sa.reveal(), sb.reveal(),
+                 CF.cosine_inline(a, b).reveal())
+IO.gen_input_fp()
+'''
+
+# the similarities of all pairs in one batch, then the model built in batches of 3 pairs
+BATCH = '''
+pairs = [(u, v) for u in range(n) for v in range(u + 1, n)]
+s = batch_cosine([CF.cosine_sums(u, v) for u, v in pairs])
+for (u, v), s_uv in zip(pairs, s):
+    print_ln('%s %s %s', u, v, s_uv.reveal())
+CF.build_model()
+for u in range(n):
+    for v in range(n):
+        print_str('%s ', CF.S[u][v].reveal())
+    print_ln('')
+IO.gen_input_fp()
+'''
+
+INVSQRT_X = [0.25, 1, 2, 9, 30.5, 100, 1000]
+# the sums d, sa, sb of normalized similarities, with zero norms
+NORMALIZE_SUMS = [(3, 4, 9), (-1.5, 2.25, 1), (0.3, 0.5, 0.7), (50, 100, 64), (-7.5, 20, 6),
+                  (0, 0, 5), (0, 3, 0), (0, 0, 0)]
+
+# the inverse square roots of one vector, then the normalization of vectors of sums
+NORMALIZE = '''
+from recommender.collaborative_filter import cosine_normalize
+program.bit_length = 84
+program.security = 40
+sfix.set_precision(14, 28)
+cfix.set_precision(14, 28)
+def vector(values):
+    return sint.concat([sint(int(round(x * 2**sfix.f))) for x in values])
+x = vector(%r)
+for g in vectorize(sfix_invsqrt)(x, sfix.k, sfix.f, sfix.kappa).split():
+    print_str('%%s ', sfix(g).reveal())
+print_ln('')
+for s in cosine_normalize(*[sfix(vector(x)) for x in zip(*%r)]).v.split():
+    print_str('%%s ', sfix(s).reveal())
+print_ln('')
+''' % (INVSQRT_X, NORMALIZE_SUMS)
+
+PREDICTION_PARAMS = [(2, 4), (3, 6)]
+PREDICTION_SAMPLES = 8
+
+# predicts samples of the small dataset of SPDZTest in the loop at runtime
+SPDZ_PREDICTIONS = '''
+from recommender.test import SPDZTest
+from recommender.io import InputFp
+program.bit_length = 84
+program.security = 40
+sfix.set_precision(14, 28)
+cfix.set_precision(14, 28)
+IO = InputFp(0, native=True)
+T = SPDZTest(1, IO).small_data().mean_centered()
+T.buildUBplain()
+T.CF.print_model()
+T.testPredictions(%r, %d)
+IO.gen_input_fp()
+''' % (PREDICTION_PARAMS, PREDICTION_SAMPLES)
+
+# user 1 has no items in common with user 0 and no free entry, user 2 has no ratings
+SPARSE_R = [[1.5, 0, -2, 0, 0, 0.5, 0, 0],
+            [0, 2, 0, -1, 0, 0, 1, -0.5],
+            [0, 0, 0, 0, 0, 0, 0, 0],
+            [-1, 0.5, 2.5, 1, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, -1.5, 0, -2]]
+SPARSE_CAPACITY = 4
+
+MERGE = '''
+from recommender.collaborative_filter import SparseUBCosineCF
+from recommender.io import InputFp
+program.bit_length = 84
+program.security = 40
+sfix.set_precision(14, 28)
+cfix.set_precision(14, 28)
+R = %r
+n, m, c = len(R), len(R[0]), %d
+IO = InputFp(0, native=True)
+for row in R:
+    entries = [(i, r) for i, r in enumerate(row) if r != 0]
+    padding = [(m, 0)] * (c - len(entries))
+    IO.append_fp_array([x for i, r in entries + padding
+                        for x in (i, int(r * 2**sfix.f), int(r**2 * 2**sfix.f))] + [len(entries)])
+CF = SparseUBCosineCF(n, m, c)
+for u in range(n):
+    CF.load_ratings_from(u, 0)
+for u in range(n):
+    for v in range(u + 1, n):
+        d, su, sv = CF.cosine_sums_merge(u, v)
+        print_ln('%%s %%s %%s %%s %%s %%s', u, v, d.reveal(), su.reveal(), sv.reveal(),
+                 CF.cosine_inline(u, v).reveal())
+IO.gen_input_fp()
+''' % (SPARSE_R, SPARSE_CAPACITY)
+
+# positive and negative similarities for predictions, user 2 has no ratings
+ORAM_R = [[1.5, 0, -2, 0, 1, 0.5, 0, 0],
+          [1, 2, -1, 0, 0, 0, 0, 0],
+          [0, 0, 0, 0, 0, 0, 0, 0],
+          [2, 0.5, -1.5, 1, 0, 0, 0, 0],
+          [0.5, 0, 0, 0, 2, 1, 0, -1],
+          [1, 1, -0.5, 0, 0, 0, 1.5, 0]]
+KNN_PARAMS = [(1, 6), (2, 6), (3, 4)]
+
+# looks up all ratings in the ORAM and predicts the ratings of user 0
+ORAM = '''
+from recommender.collaborative_filter import SparseUBCosineCF
+from recommender.io import InputFp
+program.bit_length = 84
+program.security = 40
+sfix.set_precision(14, 28)
+cfix.set_precision(14, 28)
+R = %r
+n, m, c = len(R), len(R[0]), %d
+IO = InputFp(0, native=True)
+for row in R:
+    entries = [(i, r) for i, r in enumerate(row) if r != 0]
+    padding = [(m, 0)] * (c - len(entries))
+    IO.append_fp_array([x for i, r in entries + padding
+                        for x in (i, int(r * 2**sfix.f), int(r**2 * 2**sfix.f))] + [len(entries)])
+CF = SparseUBCosineCF(n, m, c, oram=True)
+for u in range(n):
+    CF.load_ratings_from(u, 0)
+CF.build_model()
+for u in range(n):
+    for i in range(m):
+        r, r2, b = CF.R_oram[u].get_entry(i)
+        print_str('%%s %%s %%s,', r.reveal(), r2.reveal(), b.reveal())
+    print_ln('')
+for u in range(n):
+    for v in range(n):
+        print_str('%%s ', CF.S[u][v].reveal())
+    print_ln('')
+for k, f in %r:
+    for i in range(m):
+        print_str('%%s ', CF.nn_prediction(0, i, k, f).reveal())
+    print_ln('')
+IO.gen_input_fp()
+''' % (ORAM_R, SPARSE_CAPACITY, KNN_PARAMS)
+
+
+THRESHOLDS = [0, 0.5]
+
+# predicts all ratings of DENSE_R with the k nearest neighbours and with thresholds
+PREDICTIONS = '''
+CF.build_model()
+for u in range(n):
+    for v in range(n):
+        print_str('%%s ', CF.S[u][v].reveal())
+    print_ln('')
+for k, f in %r:
+    @for_range(n)
+    def user_loop(u):
+        @for_range(m)
+        def item_loop(i):
+            print_str('%%s ', CF.nn_prediction(u, i, k, f).reveal())
+    print_ln('')
+for epsilon in %r:
+    @for_range(n)
+    def user_loop(u):
+        @for_range(m)
+        def item_loop(i):
+            S_u, B_i = CF.get_neighbourhood(u, i)
+            prediction = CF._threshold_prediction(sfix(epsilon), S_u, CF.R.get_column(i), B_i)
+            print_str('%%s ', prediction.reveal())
+    print_ln('')
+IO.gen_input_fp()
+''' % (KNN_PARAMS, THRESHOLDS)
+
+
+class UBCosineCFTest(ProgramTestCase):
+    def test_save_load_update(self):
+        """ A model loaded with its ratings can be updated like the original. """
+        self.compile('cf_update', SAVE_LOAD_UPDATE)
+        _, output = self.emulate('cf_update')
+        lines = output.splitlines()
+        lines = lines[lines.index('position -1') + 1:]
+        S = numpy.array([[float(s) for s in line.split()] for line in lines[-5:]])
+        ratings = numpy.array(R, dtype=float)
+        ratings[2] = R_NEW
+        expected = cosine_matrix(ratings, ratings != 0)
+        numpy.fill_diagonal(expected, 1)
+        self.assertTrue(numpy.allclose(S, expected, atol=0.01), '%s\n!=\n%s' % (S, expected))
+
+    def test_predictions(self):
+        """ The predictions with the vectorized neighbours equal the ones of the baseline
+        on the same model. """
+        self.compile('cf_predictions', DENSE % 'UBCosineCF(n, m)' + PREDICTIONS)
+        _, output = self.emulate('cf_predictions')
+        R = numpy.array(DENSE_R)
+        B = (R != 0).astype(int)
+        n, m = R.shape
+        lines = output.splitlines()[-(n + len(KNN_PARAMS) + len(THRESHOLDS)):]
+        S = numpy.array([[float(s) for s in line.split()] for line in lines[:n]])
+        expected = cosine_matrix(R, B)
+        numpy.fill_diagonal(expected, 1)
+        self.assertTrue(numpy.allclose(S, expected, atol=0.01), '%s\n!=\n%s' % (S, expected))
+        # the same model, so that the thresholds select the same neighbours
+        baseline = BaselineUBCF(n, m, R, B)
+        baseline.S = S
+        for (k, f), line in zip(KNN_PARAMS, lines[n:]):
+            predictions = [float(x) for x in line.split()]
+            expected = [baseline.nn_prediction_bs(u, i, k, f) for u in range(n) for i in range(m)]
+            self.assertTrue(numpy.allclose(predictions, expected, atol=0.01),
+                            'k={} f={}: {} != {}'.format(k, f, predictions, expected))
+        for epsilon, line in zip(THRESHOLDS, lines[n + len(KNN_PARAMS):]):
+            predictions = [float(x) for x in line.split()]
+            expected = []
+            for u in range(n):
+                for i in range(m):
+                    peers = [v for v in range(n) if v != u and B[v, i] and S[u, v] >= epsilon]
+                    norm = sum(S[u, peers])
+                    expected.append(R[peers, i].dot(S[u, peers]) / norm if norm else 0)
+            self.assertTrue(numpy.allclose(predictions, expected, atol=0.01),
+                            'epsilon={}: {} != {}'.format(epsilon, predictions, expected))
+
+
+class CosineSumsTest(ProgramTestCase):
+    def check_sums(self, output, R):
+        """ Checks the sums of the pairs of rows of ``R`` in the output exactly
+        and the similarities within the precision. """
+        B = (R != 0).astype(int)
+        S = cosine_matrix(R, B)
+        f = 14
+        pairs = 0
+        for line in output.splitlines():
+            a, b, d, sa, sb = [int(x) for x in line.split()[:5]]
+            self.assertEqual(d, int((R[a] * R[b]).sum() * 2**(2 * f)), line)
+            self.assertEqual(sa, int((R[a]**2 * B[b]).sum() * 2**f), line)
+            self.assertEqual(sb, int((R[b]**2 * B[a]).sum() * 2**f), line)
+            self.assertAlmostEqual(float(line.split()[5]), S[a, b], delta=0.01, msg=line)
+            pairs += 1
+        self.assertEqual(pairs, len(R) * (len(R) - 1) / 2)
+
+    def test_users(self):
+        """ The vectorized sums of the rows equal the NumPy baseline. """
+        self.compile('cf_sums_ub', DENSE % 'UBCosineCF(n, m)' + COSINE_SUMS % ('n', 'n'))
+        _, output = self.emulate('cf_sums_ub')
+        self.check_sums(output, numpy.array(DENSE_R))
+
+    def test_items(self):
+        """ The vectorized sums of the columns equal the NumPy baseline. """
+        self.compile('cf_sums_ib', DENSE % 'IBCosineCF(n, m)' + COSINE_SUMS % ('m', 'm'))
+        _, output = self.emulate('cf_sums_ib')
+        self.check_sums(output, numpy.array(DENSE_R).T)
+
+
+class BatchCosineTest(ProgramTestCase):
+    def test_batch(self):
+        """ The similarities normalized together equal the NumPy baseline, also undefined ones. """
+        self.compile('cf_batch', DENSE % 'UBCosineCF(n, m, batch_size=3)' + BATCH)
+        _, output = self.emulate('cf_batch')
+        R = numpy.array(DENSE_R)
+        expected = cosine_matrix(R, R != 0)
+        n = len(R)
+        lines = output.splitlines()
+        pairs = [line.split() for line in lines[:n * (n - 1) / 2]]
+        for u, v, s in pairs:
+            self.assertAlmostEqual(float(s), expected[int(u), int(v)], delta=0.01, msg=(u, v))
+        self.assertEqual(sorted((int(u), int(v)) for u, v, _ in pairs),
+                         [(u, v) for u in range(n) for v in range(u + 1, n)])
+        S = numpy.array([[float(s) for s in line.split()] for line in lines[-n:]])
+        numpy.fill_diagonal(expected, 1)
+        self.assertTrue(numpy.allclose(S, expected, atol=0.01), '%s\n!=\n%s' % (S, expected))
+
+
+class CosineNormalizeTest(ProgramTestCase):
+    def test_normalize(self):
+        """ The inverse square roots and the normalized similarities equal NumPy,
+        and zero norms give 0. """
+        self.compile('cf_normalize', NORMALIZE)
+        _, output = self.emulate('cf_normalize')
+        invsqrt, normalized = [[float(x) for x in line.split()] for line in output.splitlines()]
+        expected = 1 / numpy.sqrt(INVSQRT_X)
+        self.assertTrue(numpy.allclose(invsqrt, expected, atol=0.001),
+                        '%s != %s' % (invsqrt, expected))
+        d, sa, sb = numpy.array(NORMALIZE_SUMS, dtype=float).T
+        expected = numpy.zeros(len(d))
+        defined = d != 0
+        expected[defined] = d[defined] / numpy.sqrt(sa[defined] * sb[defined])
+        self.assertTrue(numpy.allclose(normalized, expected, atol=0.001),
+                        '%s != %s' % (normalized, expected))
+
+
+class SPDZTestTest(ProgramTestCase):
+    def test_predictions(self):
+        """ The errors of the predictions in the runtime loop equal the ones of BaselineTest
+        on the same samples and the same model. """
+        self.compile('cf_spdz_test', SPDZ_PREDICTIONS)
+        _, output = self.emulate('cf_spdz_test')
+        # without the progress before carriage returns
+        lines = [line.rsplit('\r', 1)[-1] for line in output.rstrip('\n').split('\n')]
+        start = lines.index('S') + 1
+        # recommender.test imports the config_mine.py of the directory like the compiler
+        sys.path.insert(0, self.directory)
+        try:
+            import recommender.test
+        finally:
+            sys.path.remove(self.directory)
+        T = recommender.test.BaselineTest(1).small_data().mean_centered()
+        T.CF = BaselineUBCF(T.n, T.m, T.R, T.B)
+        T.CF.S = numpy.array([[float(s) for s in line.split()] for line in lines[start:start + T.n]])
+        # the samples of SPDZTest in the same order
+        recommender.test.random.seed('cf_spdz_test-1')
+        for (k, f), line in zip(PREDICTION_PARAMS, lines[-len(PREDICTION_PARAMS):]):
+            sampling = recommender.test.random.sample(T.Rlist, PREDICTION_SAMPLES)
+            _, _, mae, rmse, _, _ = T._evaluate(k, f, sampling)
+            values = [float(x) for x in line.split()]
+            self.assertEqual(values[:2], [k, f])
+            self.assertAlmostEqual(values[2], mae, delta=0.01, msg=line)
+            self.assertAlmostEqual(values[3], rmse, delta=0.01, msg=line)
+
+
+class SparseUBCosineCFTest(ProgramTestCase):
+    def test_merge(self):
+        """ The sums of the merge intersection are exact and give the baseline similarities. """
+        self.compile('cf_merge', MERGE)
+        _, output = self.emulate('cf_merge')
+        R = numpy.array(SPARSE_R)
+        B = (R != 0).astype(int)
+        S = sparse_cosine_matrix(csr_matrix(R), csr_matrix(B)).toarray()
+        f = 14
+        pairs = 0
+        for line in output.splitlines():
+            u, v, d, su, sv = [int(x) for x in line.split()[:5]]
+            common = B[u] * B[v]
+            self.assertEqual(d, int((R[u] * R[v]).sum() * 2**(2 * f)), line)
+            self.assertEqual(su, int((R[u]**2 * common).sum() * 2**f), line)
+            self.assertEqual(sv, int((R[v]**2 * common).sum() * 2**f), line)
+            self.assertAlmostEqual(float(line.split()[5]), S[u, v], delta=0.01, msg=line)
+            pairs += 1
+        self.assertEqual(pairs, 10)
+
+    def test_oram(self):
+        """ The binary search finds every rating in the ORAM and the vectorized predictions
+        equal the ones of the baseline on the same model. """
+        self.compile('cf_oram', ORAM)
+        _, output = self.emulate('cf_oram')
+        R = numpy.array(ORAM_R)
+        lines = output.splitlines()[-(2 * len(R) + len(KNN_PARAMS)):]
+        for u, line in enumerate(lines[:len(R)]):
+            entries = [[float(x) for x in entry.split()] for entry in line.split(',')[:-1]]
+            self.assertEqual(len(entries), R.shape[1])
+            for i, (r, r2, b) in enumerate(entries):
+                self.assertEqual((r, r2, b), (R[u, i], R[u, i]**2, int(R[u, i] != 0)),
+                                 'u={} i={}'.format(u, i))
+        S = numpy.array([[float(s) for s in line.split()] for line in lines[len(R):2 * len(R)]])
+        expected = cosine_matrix(R, R != 0)
+        numpy.fill_diagonal(expected, 1)
+        self.assertTrue(numpy.allclose(S, expected, atol=0.01), '%s\n!=\n%s' % (S, expected))
+        # the same model, so that the thresholds select the same neighbours
+        baseline = BaselineUBCF(R.shape[0], R.shape[1], R, R != 0)
+        baseline.S = S
+        for (k, f), line in zip(KNN_PARAMS, lines[2 * len(R):]):
+            predictions = [float(x) for x in line.split()]
+            expected = [baseline.nn_prediction_bs(0, i, k, f) for i in range(R.shape[1])]
+            self.assertTrue(numpy.allclose(predictions, expected, atol=0.01),
+                            'k={} f={}: {} != {}'.format(k, f, predictions, expected))
+
+if __name__ == '__main__':
+    unittest.main()
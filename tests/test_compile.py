@@ -0,0 +1,98 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Tests of the options of ``compile.py`` that must not change the compiled program,
+and of the memory that the compiler needs.
+"""
+
+import os
+import unittest
+
+from program_test import ProgramTestCase
+
+# several tapes and basic blocks with opens to merge, vectors and memory accesses
+PROGRAM = '''
+program.bit_length = 84
+program.security = 40
+sfix.set_precision(14, 28)
+cfix.set_precision(14, 28)
+a = sint.Array(10)
+@for_range(10)
+def f(i):
+    a[i] = sint(i) * sint(i + 1)
+
+def thread():
+    x = [sint(i) for i in range(20)]
+    y = [x[i] * x[i + 1] for i in range(19)]
+    print_ln('thread %s', sum(y).reveal())
+t = MPCThread(thread, 'thread')
+t.start()
+t.join()
+
+v = sint(3, size=8) * sint(5, size=8)
+v.store_in_mem(100)
+b = sfix(1.5) < sfix(2.25)
+print_ln('%s %s %s', a[3].reveal(), sint.load_mem(107).reveal(), b.reveal())
+c = sfix.Array(4)
+for i in range(4):
+    c[i] = sfix(i) / sfix(3)
+@if_(b.reveal())
+def _():
+    print_ln('%s', (c[1] * c[2]).reveal())
+'''
+
+# 33 tapes
+THREADS = '''
+a = sint.Array(128)
+for t in range(32):
+    @for_range_multithread(2, 1, 4)
+    def f(i):
+        a[i + 4 * t] = sint(i) * sint(t)
+print_ln('%s', a[127].reveal())
+'''
+
+# prints the peak memory of the compiler in kB when it exits, unlike ru_maxrss
+# it does not include the memory of the test process before the compiler starts
+PEAK_MEMORY = '''
+import atexit, sys
+atexit.register(lambda: sys.stdout.write('peak memory %s\\n' % [line.split()[1]
+    for line in open('/proc/self/status') if line.startswith('VmHWM:')][0]))
+'''
+
+
+def without_command_line(outputs, name):
+    """ The schedule ends with the command line of the compiler, which is removed. """
+    schedule = 'Programs/Schedules/%s.sch' % name
+    outputs[schedule] = outputs[schedule].rsplit('\n', 2)[0]
+    return outputs
+
+
+class ParallelOptimizationTest(ProgramTestCase):
+    def test_jobs(self):
+        """ Optimizing the blocks in several processes gives the same bytecode. """
+        self.write_source('parallel', PROGRAM)
+        self.compile('parallel', options=['-j', '1'])
+        serial = without_command_line(self.read_outputs('parallel'), 'parallel')
+        for jobs in ['2', '4']:
+            self.compile('parallel', options=['-j', jobs])
+            parallel = without_command_line(self.read_outputs('parallel'), 'parallel')
+            self.assertEqual(sorted(parallel), sorted(serial))
+            for filename in serial:
+                self.assertTrue(parallel[filename] == serial[filename],
+                                '%s differs with -j %s' % (filename, jobs))
+
+
+class CompilerMemoryTest(ProgramTestCase):
+    def test_threads(self):
+        """ Tapes do not allocate memory for register values, so many threads stay small. """
+        if not os.path.exists('/proc/self/status'):
+            self.skipTest('no /proc/self/status')
+        output = self.compile('threads', THREADS, setup=PEAK_MEMORY)
+        self.assertEqual(sum(name.endswith('.bc') for name in self.read_outputs('threads')), 33)
+        peak = int(output.rsplit('peak memory ', 1)[1])
+        self.assertLess(peak, 64 * 1024)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Tests of the emulator in ``Compiler/emulator.py`` with small programs of known output.
+"""
+
+import collections
+import unittest
+
+from program_test import ProgramTestCase
+
+ARITHMETIC = '''
+a = cint(17)
+b = cint(5)
+print_ln('%s %s %s %s %s', a + b, a - b, a * b, a % b, a / b * b)
+print_ln('%s %s', a << 3, a >> 2)
+x = sint(17)
+y = sint(-5)
+print_ln('%s %s %s', (x + y).reveal(), (x * y).reveal(), (x - y * 2).reveal())
+print_ln('%s %s %s', (x < y).reveal(), (y < x).reveal(), (x == 17).reveal())
+r = regint(7) * regint(-3) + regint(100) / regint(7)
+print_ln('%s', r)
+print_ln('%s', cgf2n(0x1234) + cgf2n(0x00ff))
+print_ln('%s', (sfix(3.25) * sfix(-2) + sfix(1.5)).reveal())
+print_ln('%s', (sfix(7) / sfix(2)).reveal())
+'''
+
+VECTOR = '''
+a = cint.Array(4)
+b = sint.Array(4)
+for i in range(4):
+    a[i] = cint(i + 1)
+    b[i] = sint(i - 2)
+v = a.get_vector() * a.get_vector() + cint(2, size=4)
+v.store_in_mem(1000)
+s = b.get_vector() * a.get_vector() - b.get_vector() * b.get_vector()
+s.store_in_mem(2000)
+t = b.get_vector() < sint(0, size=4)
+t.store_in_mem(3000)
+o = b.get_vector().reveal()
+o.store_in_mem(4000)
+for i in range(4):
+    print_ln('%s %s %s %s', cint.load_mem(1000 + i), sint.load_mem(2000 + i).reveal(),
+             sint.load_mem(3000 + i).reveal(), cint.load_mem(4000 + i))
+'''
+
+MEMORY = '''
+a = sint.Array(10)
+c = cint.Array(10)
+r = regint.Array(10)
+@for_range(10)
+def f(i):
+    a[i] = sint(i) * sint(i)
+    c[i] = cint(i) + 100
+    r[i] = regint(i) * 2
+m = MemValue(sint(0))
+@for_range(10)
+def f(i):
+    m.write(m + a[i])
+print_ln('%s %s %s %s', m.read().reveal(), a[9].reveal(), c[3], r[4])
+'''
+
+MULTITHREAD = '''
+a = sint.Array(12)
+@for_range_multithread(3, 1, 12)
+def f(i):
+    a[i] = sint(i) * sint(i + 1)
+total = MemValue(sint(0))
+@for_range(12)
+def f(i):
+    total.write(total + a[i])
+print_ln('%s', total.read().reveal())
+'''
+
+THREADS = '''
+a = sint.Array(2)
+def thread():
+    i = get_arg()
+    a[i - 5] = sint(i) * sint(10)
+    print_ln('thread %s', i)
+t = MPCThread(thread, 'print')
+t.start(5)
+t.join()
+t.start(6)
+t.join()
+print_ln('%s %s', a[0].reveal(), a[1].reveal())
+'''
+
+INPUTS = '''
+from recommender.io import InputFp
+IO = InputFp(0, native=True)
+IO.append_fp_array([3, -1, 4])
+IO.gen_input_fp()
+x = [sint.get_raw_input_from(0) for i in range(3)]
+p = public_input()
+print_ln('%s %s', (x[0] * x[1] + x[2]).reveal(), p * 2)
+'''
+
+# a row at a compile-time address and rows at runtime addresses
+INPUT_ARRAY = '''
+from recommender.io import InputFp
+IO = InputFp(0, native=True)
+IO.append_fp_array(range(%(n)d))
+IO.append_fp_array([3 * i for i in range(2 * %(n)d)])
+IO.gen_input_fp()
+a = sint.Array(%(n)d).raw_input_from(0)
+M = sint.Matrix(2, %(n)d)
+@for_range(2)
+def f(i):
+    M[i].raw_input_from(0)
+print_ln('%%s %%s %%s', a[%(n)d - 1].reveal(), M[0][1].reveal(), M[1][%(n)d - 1].reveal())
+'''
+
+
+class EmulatorTest(ProgramTestCase):
+    def run_program(self, name, source):
+        self.compile(name, source)
+        return self.emulate(name)
+
+    def test_arithmetic(self):
+        _, output = self.run_program('arithmetic', ARITHMETIC)
+        lines = output.splitlines()
+        self.assertEqual(lines[:7], ['22 12 85 2 17', '136 4', '12 -85 27', '0 1 1', '-7',
+                                     '0x12cb', '-5.00000000'])
+        self.assertAlmostEqual(float(lines[7]), 3.5, places=4)
+        self.assertEqual(len(lines), 8)
+
+    def test_vector(self):
+        emulator, output = self.run_program('vector', VECTOR)
+        self.assertEqual(output, '3 -6 1 -2\n6 -3 1 -1\n11 0 0 0\n18 3 0 1\n')
+        sizes = set(size for tape in emulator.tapes for _, size, _, _ in tape.instructions)
+        self.assertIn(4, sizes)
+
+    def test_memory(self):
+        emulator, output = self.run_program('memory', MEMORY)
+        self.assertEqual(output, '285 81 103 8\n')
+        self.assertEqual(emulator.usage['modp', 'triple'], 10)
+
+    def test_multithread(self):
+        emulator, output = self.run_program('multithread', MULTITHREAD)
+        self.assertEqual(output, '572\n')
+        self.assertEqual(len(emulator.tapes), 2)
+        self.assertEqual(emulator.usage['modp', 'triple'], 12)
+
+    def test_threads(self):
+        _, output = self.run_program('threads', THREADS)
+        self.assertEqual(output, 'thread 5\nthread 6\n50 60\n')
+
+    def test_inputs(self):
+        self.compile('inputs', INPUTS)
+        with open('Programs/Public-Input/inputs', 'w') as f:
+            f.write('21\n')
+        emulator, output = self.emulate('inputs')
+        self.assertEqual(output, '1 42\n')
+        self.assertEqual(emulator.usage['modp', 'input', 0], 3)
+
+    def test_array_input(self):
+        """ An array is filled with one vectorized store, independent of its length. """
+        counts = []
+        for n in 10, 100:
+            self.compile('array_input', INPUT_ARRAY % {'n': n})
+            emulator, output = self.emulate('array_input')
+            self.assertEqual(output, '%d %d %d\n' % (n - 1, 3, 3 * (2 * n - 1)))
+            self.assertEqual(emulator.usage['modp', 'input', 0], 3 * n)
+            # rows at runtime addresses add one address after the other
+            counts.append(collections.Counter(name for name, _, _, _ in emulator.tapes[0].instructions
+                                              if name != 'ADDINT'))
+        self.assertEqual(counts[0], counts[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Tests of the dependency graphs in ``Compiler/graph.py``.
+"""
+
+import random
+import unittest
+
+from program_test import ProgramTestCase
+from test_compile import PROGRAM, without_command_line
+from Compiler.graph import SparseDiGraph, ArrayDiGraph, GraphError, topological_sort
+
+
+class ArrayDiGraphTest(unittest.TestCase):
+    def test_add_edge(self):
+        G = ArrayDiGraph(4)
+        G.add_edge(0, 2)
+        G.add_edge(0, 1, 5)
+        G.add_edge(3, 1)
+        self.assertEqual(G[0], [2, 1])
+        self.assertEqual(G.pred[1], [0, 3])
+        self.assertEqual(G.weights[(0, 1)], 5)
+        self.assertEqual(G.weights[(0, 2)], 1)
+        self.assertEqual(G.degree(0), 2)
+        self.assertEqual(G.degree(1), 0)
+
+    def test_add_existing_edge(self):
+        """ Adding an edge again only changes its weight. """
+        G = ArrayDiGraph(3)
+        G.add_edge(0, 1)
+        G.add_edge(0, 2)
+        G.add_edge(0, 1, 7)
+        self.assertEqual(G[0], [1, 2])
+        self.assertEqual(G.pred[1], [0])
+        self.assertEqual(G.weights[(0, 1)], 7)
+
+    def test_remove_edge(self):
+        G = ArrayDiGraph(4)
+        G.add_edges_from([(0, 1), (0, 2, 3), (0, 3), (1, 2)])
+        G.remove_edge(0, 2)
+        self.assertEqual(G[0], [1, 3])
+        self.assertEqual(G.pred[2], [1])
+        self.assertNotIn((0, 2), G.weights)
+        self.assertRaises(KeyError, lambda: G.weights[(0, 2)])
+        self.assertRaises(GraphError, G.remove_edge, 0, 2)
+        # the edge is added at the end again
+        G.add_edge(0, 2)
+        self.assertEqual(G[0], [1, 3, 2])
+        self.assertEqual(G.weights[(0, 2)], 1)
+
+    def test_remove_node(self):
+        G = ArrayDiGraph(4)
+        G.add_edges_from([(0, 1), (1, 2), (1, 3), (3, 1), (2, 3)])
+        G.add_node(1, stop=3, merges=[2])
+        G.remove_node(1)
+        self.assertEqual(G[0], [])
+        self.assertEqual(G[1], [])
+        self.assertEqual(G.pred[1], [])
+        self.assertEqual(G.pred[2], [])
+        self.assertEqual(G[3], [])
+        self.assertEqual(G.pred[3], [2])
+        self.assertEqual(G.get_attr(1, 'stop'), -1)
+        self.assertEqual(G.get_attr(1, 'merges'), None)
+
+    def test_remove_node_weights(self):
+        """ The weights of the edges of a removed node are removed, unlike in SparseDiGraph. """
+        G = ArrayDiGraph(3)
+        sparse = SparseDiGraph(3)
+        for graph in G, sparse:
+            graph.add_edges_from([(0, 1, 4), (1, 2, 5)])
+            graph.remove_node(1)
+        self.assertNotIn((0, 1), G.weights)
+        self.assertEqual(list(G.weights), [])
+        self.assertEqual(sparse.weights[(0, 1)], 4)
+
+    def test_attributes(self):
+        G = ArrayDiGraph(3)
+        self.assertEqual(G.get_attr(0, 'stop'), -1)
+        self.assertTrue(G.get_attr(0, 'is_source'))
+        G.add_node(0, is_source=False, merges=[])
+        G.set_attr(2, 'start', 1)
+        G.get_attr(0, 'merges').append(1)
+        self.assertFalse(G.get_attr(0, 'is_source'))
+        self.assertEqual(G.get_attr(0, 'merges'), [1])
+        self.assertEqual(G.get_attr(1, 'merges'), None)
+        self.assertEqual(G.get_attr(2, 'start'), 1)
+        self.assertRaises(Exception, G.set_attr, 0, 'color', 'red')
+        self.assertRaises(Exception, G.add_node, 3)
+
+    def test_weights_iteration(self):
+        G = ArrayDiGraph(3)
+        G.add_edges_from([(2, 0), (0, 1), (0, 2)])
+        self.assertEqual(list(G.weights), [(0, 1), (0, 2), (2, 0)])
+
+    def test_topological_sort(self):
+        G = ArrayDiGraph(5)
+        G.add_edges_from([(3, 1), (1, 0), (4, 0), (2, 4)])
+        order = topological_sort(G)
+        for i in range(5):
+            for j in G[i]:
+                self.assertLess(order.index(i), order.index(j))
+
+    def test_same_as_sparse(self):
+        """ Random operations give the same successors, predecessors, weights and
+        attributes as with SparseDiGraph. """
+        rand = random.Random(0)
+        n = 30
+        for _ in range(10):
+            graphs = SparseDiGraph(n), ArrayDiGraph(n)
+            for step in range(500):
+                r = rand.random()
+                i, j = rand.randrange(n), rand.randrange(n)
+                if r < 0.6:
+                    args = i, j, rand.randrange(10)
+                    for G in graphs:
+                        G.add_edge(*args)
+                elif r < 0.8:
+                    if j in graphs[0][i]:
+                        for G in graphs:
+                            G.remove_edge(i, j)
+                elif r < 0.9:
+                    for G in graphs:
+                        G.remove_node(i)
+                else:
+                    for G in graphs:
+                        G.set_attr(i, 'stop', j)
+                        G.set_attr(j, 'is_source', False)
+                self.check_same(*graphs)
+
+    def check_same(self, sparse, G):
+        for i in range(len(G)):
+            self.assertEqual(G[i], sparse[i])
+            self.assertEqual(G.pred[i], sparse.pred[i])
+            self.assertEqual(G.degree(i), sparse.degree(i))
+            for j in G[i]:
+                self.assertEqual(G.weights[(i, j)], sparse.weights[(i, j)])
+            for a in G.default_attributes:
+                self.assertEqual(G.get_attr(i, a), sparse.get_attr(i, a))
+
+
+class MergerGraphTest(ProgramTestCase):
+    def test_merger(self):
+        """ The instructions merged with ArrayDiGraph are the same as with SparseDiGraph. """
+        self.write_source('merge', PROGRAM)
+        self.compile('merge', options=['-a', 'array'])
+        array_outputs = without_command_line(self.read_outputs('merge'), 'merge')
+        self.compile('merge', options=['-a', 'sparse'], setup=
+                     'import Compiler.allocator, Compiler.graph\n'
+                     'Compiler.allocator.Merger.graph_class = Compiler.graph.SparseDiGraph')
+        sparse_outputs = without_command_line(self.read_outputs('merge'), 'merge')
+        self.assertEqual(open('array-merge-0').read(), open('sparse-merge-0').read())
+        self.assertEqual(sorted(array_outputs), sorted(sparse_outputs))
+        for filename in array_outputs:
+            self.assertTrue(array_outputs[filename] == sparse_outputs[filename],
+                            '%s differs' % filename)
+
+if __name__ == '__main__':
+    unittest.main()
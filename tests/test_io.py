@@ -0,0 +1,96 @@
+# (C) 2018 Thibaud Kehler.
+# MIT Licence
+# see https://opensource.org/licenses/MIT
+
+"""
+Tests of the private input writers in ``recommender/io.py``.
+
+The tests run in a temporary directory. The files in ``tests/data/gen_input_fp`` were 
+written by ``gen_input_fp.x`` for the values of ``InputFpTest`` and are the expected output 
+of every writer. ``gen_input_fp.x`` itself is only run if it was built in the main directory.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from recommender.io import InputFp, BUFFER_SIZE, get_prime
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gen_input_fp')
+
+def reference_bytes(values, prime):
+    """ The private input file of ``gen_input_fp.x`` for ``values``, value by value. """
+    limbs = (prime.bit_length() + 63) // 64
+    res = ''
+    for x in values:
+        x = x * 2**(64 * limbs) % prime
+        for i in range(8 * limbs):
+            res += chr(x >> (8 * i) & 0xff)
+    return res + '\0' * (8 * limbs) * (BUFFER_SIZE - len(values) % BUFFER_SIZE)
+
+
+class InputFpTest(unittest.TestCase):
+    PLAYER = 99
+    SIZES = [0, 1, BUFFER_SIZE - 1, BUFFER_SIZE, BUFFER_SIZE + 1, 5000]
+    CHUNK_SIZE = 10 * BUFFER_SIZE
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.directory, 'Player-Data'))
+        params = os.path.join('Player-Data', '2-128-40')
+        for filename in ['gen_input_fp.x', params]:
+            if os.path.exists(filename):
+                os.symlink(os.path.abspath(filename), os.path.join(self.directory, filename))
+        os.chdir(self.directory)
+        self.prime = get_prime()
+        self.random = random.Random(0)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def check(self, native, stream):
+        for n in self.SIZES:
+            values = [self.random.randint(-2**40, 2**40) for _ in range(n)]
+            IO = InputFp(self.PLAYER, stream=stream, chunk_size=self.CHUNK_SIZE, native=native)
+            IO.append_fp_array(values[:n // 2])
+            for value in values[n // 2:]:
+                IO.append_fp(value)
+            IO.gen_input_fp()
+            with open('Player-Data/Private-Input-{}'.format(self.PLAYER), 'rb') as input_file:
+                self.assertEqual(input_file.read(), self.expected(n), '{} values'.format(n))
+
+    def expected(self, n):
+        """ The output of ``gen_input_fp.x`` for the ``n`` values. """
+        with open(os.path.join(DATA, 'Private-Input-{}'.format(n)), 'rb') as expected_file:
+            return expected_file.read()
+
+    def check_gen_input_fp(self, stream):
+        if not os.path.exists('gen_input_fp.x'):
+            self.skipTest('gen_input_fp.x not built')
+        self.check(False, stream)
+
+    def test_reference(self):
+        """ The outputs of ``gen_input_fp.x`` are the values in Montgomery form, padded with zeros. """
+        for n in self.SIZES:
+            values = [self.random.randint(-2**40, 2**40) for _ in range(n)]
+            self.assertEqual(self.expected(n), reference_bytes(values, self.prime),
+                             '{} values'.format(n))
+
+    def test_native(self):
+        self.check(True, False)
+
+    def test_native_chunks(self):
+        self.check(True, True)
+
+    def test_gen_input_fp(self):
+        self.check_gen_input_fp(False)
+
+    def test_gen_input_fp_chunks(self):
+        self.check_gen_input_fp(True)
+
+if __name__ == '__main__':
+    unittest.main()